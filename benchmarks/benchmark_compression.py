@@ -0,0 +1,64 @@
+"""Compares the size and the load latency of model files per compression codec.
+
+Usage: python -m benchmarks.benchmark_compression [--repeat N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from common.utils.compression import available_codecs, compressed_dump, compressed_load
+
+
+def get_pipelines():
+    X, y = make_classification(n_samples=5000, n_features=50, n_informative=20, random_state=1)
+    return {
+        "random_forest": make_pipeline(
+            StandardScaler(), RandomForestClassifier(n_estimators=100, random_state=1)
+        ).fit(X, y),
+        "logistic_regression": make_pipeline(StandardScaler(), LogisticRegression()).fit(X, y),
+    }
+
+
+def main(repeat: int) -> None:
+    print("%-20s %-6s %12s %10s %10s" % ("pipeline", "codec", "size [kB]", "save [s]", "load [s]"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, pipeline in get_pipelines().items():
+            for codec in available_codecs():
+                path = os.path.join(tmp, "%s.%s.model" % (name, codec))
+                start = time.perf_counter()
+                with open(path, "wb") as fh:
+                    compressed_dump(pipeline, fh, codec)
+                save_time = time.perf_counter() - start
+
+                load_times = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    with open(path, "rb") as fh:
+                        compressed_load(fh)
+                    load_times.append(time.perf_counter() - start)
+                print(
+                    "%-20s %-6s %12.1f %10.4f %10.4f"
+                    % (
+                        name,
+                        codec,
+                        os.path.getsize(path) / 1024,
+                        save_time,
+                        float(np.median(load_times)),
+                    )
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args().repeat)
@@ -0,0 +1,105 @@
+"""Compares the throughput of the log record encodings on a single core.
+
+The client side of "pickle" is logging.handlers.SocketHandler, which pickles
+every record into its own frame, the client side of "pickle batch" and
+"compact" is a BatchingSocketHandler. The server side decodes the frames and
+creates the LogRecords, but does not log them.
+
+Usage: python -m benchmarks.benchmark_log_wire [--records N] [--batch-size N]
+"""
+
+import argparse
+import logging
+import logging.handlers
+import pickle
+import time
+from typing import List
+
+from common.utils.log_wire import CompactEncoder, HELLO, LogWireSession, VERSION, control_frame
+from common.utils.logging_ import BatchingSocketHandler
+
+
+def get_records(n_records: int) -> List[logging.LogRecord]:
+    # A few call sites, as in the log of a worker fitting models
+    sites = [
+        ("common.utils.backend", logging.DEBUG, "Saving model %d to %s"),
+        ("common.ensemble_builder", logging.INFO, "Ensemble %d has a score of %f"),
+        ("common.evaluation", logging.WARNING, "Run %d took %d seconds"),
+    ]
+    records = []
+    for i in range(n_records):
+        name, level, msg = sites[i % len(sites)]
+        args = (i, "/tmp/run_%d" % i) if "%s" in msg else (i, i / 7)
+        records.append(logging.LogRecord(name, level, __file__, 10 * i % 3, msg, args, None))
+    return records
+
+
+def split(records: List[logging.LogRecord], batch_size: int) -> List[List[logging.LogRecord]]:
+    batches = []
+    for start in range(0, len(records), batch_size):
+        end = start + batch_size
+        batches.append(records[start:end])
+    return batches
+
+
+def main(n_records: int, batch_size: int) -> None:
+    records = get_records(n_records)
+    batches = split(records, batch_size)
+    socket_handler = logging.handlers.SocketHandler("localhost", 0)
+    batching_handler = BatchingSocketHandler("localhost", 0)
+
+    def encode_pickle() -> List[bytes]:
+        return [socket_handler.makePickle(record)[4:] for record in records]
+
+    def encode_pickle_batch() -> List[bytes]:
+        return [
+            pickle.dumps([batching_handler.make_dict(record) for record in batch], 4)
+            for batch in batches
+        ]
+
+    def encode_compact() -> List[bytes]:
+        # Every connection starts with a new encoder
+        encoder = CompactEncoder()
+        return [
+            encoder.encode([batching_handler.make_dict(record) for record in batch])[4:]
+            for batch in batches
+        ]
+
+    print("%-14s %14s %18s %18s" % ("encoding", "bytes/record", "encode [rec/s]", "decode [rec/s]"))
+    for encoding, encode in [
+        ("pickle", encode_pickle),
+        ("pickle batch", encode_pickle_batch),
+        ("compact", encode_compact),
+    ]:
+        start = time.perf_counter()
+        frames = encode()
+        encode_time = time.perf_counter() - start
+
+        session = LogWireSession()
+        if encoding == "compact":
+            session.handle_frame(
+                control_frame(HELLO, {"version": VERSION, "encodings": ["compact"]})[4:]
+            )
+        start = time.perf_counter()
+        for frame in frames:
+            for record_dict in session.handle_frame(frame)[0]:
+                logging.makeLogRecord(record_dict)
+        decode_time = time.perf_counter() - start
+
+        print(
+            "%-14s %14.1f %18.0f %18.0f"
+            % (
+                encoding,
+                sum(len(frame) for frame in frames) / n_records,
+                n_records / encode_time,
+                n_records / decode_time,
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    main(args.records, args.batch_size)
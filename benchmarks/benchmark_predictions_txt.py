@@ -0,0 +1,65 @@
+"""Compares Backend.save_predictions_as_txt with the former value by value writer.
+
+Usage: python -m benchmarks.benchmark_predictions_txt [--rows N] [--columns N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from common.utils.backend import create
+
+
+def save_predictions_as_txt_loop(predictions: np.ndarray, filepath: str, precision: int) -> None:
+    format_string = "{:.%dg} " % precision
+    with open(filepath, "w") as output_file:
+        for row in predictions:
+            if not isinstance(row, np.ndarray) and not isinstance(row, list):
+                row = [row]
+            for val in row:
+                output_file.write(format_string.format(float(val)))
+            output_file.write("\n")
+
+
+def main(rows: int, columns: int, precision: int) -> None:
+    predictions = np.random.random((rows, columns))
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = create(
+            temporary_directory=os.path.join(tmp, "tmp"),
+            output_directory=os.path.join(tmp, "output"),
+            prefix="benchmark",
+        )
+
+        start = time.perf_counter()
+        save_predictions_as_txt_loop(predictions, os.path.join(tmp, "loop.predict"), precision)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        backend.save_predictions_as_txt(predictions, "test", 1, precision)
+        vectorized_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        backend.save_predictions_as_txt(predictions, "test", 2, precision, binary_sidecar=True)
+        sidecar_time = time.perf_counter() - start
+
+        with open(os.path.join(tmp, "loop.predict"), "rb") as fh:
+            expected = fh.read()
+        with open(os.path.join(tmp, "output", "test_1.predict"), "rb") as fh:
+            assert fh.read() == expected, "Outputs differ"
+
+        print("%d x %d predictions, precision %d" % (rows, columns, precision))
+        print("value by value: %8.3f s" % loop_time)
+        print("vectorized:     %8.3f s (%.1fx)" % (vectorized_time, loop_time / vectorized_time))
+        print("with sidecar:   %8.3f s" % sidecar_time)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--columns", type=int, default=10)
+    parser.add_argument("--precision", type=int, default=6)
+    args = parser.parse_args()
+    main(args.rows, args.columns, args.precision)
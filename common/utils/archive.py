@@ -0,0 +1,247 @@
+import io
+import json
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import time
+from types import TracebackType
+from typing import Any, BinaryIO, Dict, IO, List, Optional, Type, cast
+
+import numpy as np
+
+from .compression import check_codec, open_compressed_reader, open_compressed_writer
+from .storage import Storage, StorageStat, matches_prefix
+
+
+__all__ = ["ArchiveReader", "ArchiveStorage", "ArchiveWriter"]
+
+
+# An archive starts with MAGIC and a format version, padded to ALIGNMENT.
+# The entries follow, each starting at a multiple of ALIGNMENT, so that arrays
+# and out-of-band buffers mapped from the archive are aligned. A json index of
+# the entries follows the last entry and the archive ends with a trailer
+# holding the offset and length of the index.
+MAGIC = b"AMLA"
+VERSION = 1
+ALIGNMENT = 64
+TRAILER = struct.Struct("<QQ4sB")
+
+
+class ArchiveWriter(object):
+    """Packs many small files into a single archive file.
+
+    Every entry can be compressed with one of compression.available_codecs().
+    Entries which are not compressed can be memory-mapped by ArchiveReader.
+    The archive is written to a temporary file, which is only renamed to
+    its final path when the writer is closed without an error.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index = {}  # type: Dict[str, Dict[str, Any]]
+        self._fh = cast(
+            BinaryIO,
+            tempfile.NamedTemporaryFile(
+                "wb", dir=os.path.dirname(os.path.abspath(path)), delete=False
+            ),
+        )
+        self._fh.write(MAGIC + bytes([VERSION]))
+        self._align()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._fh.close()
+            os.remove(self._fh.name)
+
+    def _align(self) -> None:
+        self._fh.write(b"\0" * (-self._fh.tell() % ALIGNMENT))
+
+    def _add(self, name: str, source: IO[bytes], codec: str, mtime: float) -> None:
+        check_codec(codec)
+        if name in self._index:
+            raise ValueError("Duplicate archive entry %s" % name)
+        offset = self._fh.tell()
+        stream = open_compressed_writer(self._fh, codec)
+        shutil.copyfileobj(source, stream, 2**20)
+        stream.close()
+        self._index[name] = {
+            "offset": offset,
+            "length": self._fh.tell() - offset,
+            "codec": codec,
+            "mtime": mtime,
+        }
+        self._align()
+
+    def add(
+        self, name: str, data: bytes, codec: str = "none", mtime: Optional[float] = None
+    ) -> None:
+        """Adds an entry with the given content."""
+        self._add(name, io.BytesIO(data), codec, time.time() if mtime is None else mtime)
+
+    def add_file(self, name: str, file_path: str, codec: str = "none") -> None:
+        """Adds an entry with the content of a file, keeping its modification time."""
+        with open(file_path, "rb") as fh:
+            self._add(name, fh, codec, os.fstat(fh.fileno()).st_mtime)
+
+    def close(self) -> None:
+        index = json.dumps(self._index, sort_keys=True).encode("utf-8")
+        offset = self._fh.tell()
+        self._fh.write(index)
+        self._fh.write(TRAILER.pack(offset, len(index), MAGIC, VERSION))
+        self._fh.close()
+        os.rename(self._fh.name, self.path)
+
+
+class ArchiveReader(object):
+    """Random access to the entries of an archive written by ArchiveWriter.
+
+    The archive is memory-mapped, so uncompressed entries are served as views
+    of the mapping without reading or copying them. The mapping is private:
+    modifying a view never changes the archive.
+
+    When pickled, only the path is kept and the archive is mapped again by
+    the receiving process.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open()
+
+    def _open(self) -> None:
+        with open(self.path, "rb") as fh:
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_COPY)
+        if self._mmap[: len(MAGIC)] != MAGIC or len(self._mmap) < TRAILER.size:
+            raise ValueError("%s is not an archive" % self.path)
+        start = len(self._mmap) - TRAILER.size
+        offset, length, magic, version = TRAILER.unpack(self._mmap[start:])
+        if magic != MAGIC:
+            raise ValueError("%s is not an archive or it is truncated" % self.path)
+        if version != VERSION:
+            raise ValueError("Unsupported archive format version %d" % version)
+        end = offset + length
+        self._index = json.loads(
+            bytes(self._mmap[offset:end]).decode("utf-8")
+        )  # type: Dict[str, Dict[str, Any]]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"path": self.path}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.path = state["path"]
+        self._open()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def names(self, prefix: str = "") -> List[str]:
+        return sorted(name for name in self._index if name.startswith(prefix))
+
+    def _entry(self, name: str) -> Dict[str, Any]:
+        try:
+            return self._index[name]
+        except KeyError:
+            raise FileNotFoundError("%s is not in archive %s" % (name, self.path))
+
+    def stat(self, name: str) -> StorageStat:
+        entry = self._entry(name)
+        return StorageStat(int(entry["length"]), float(entry["mtime"]))
+
+    def view(self, name: str) -> memoryview:
+        """
+        Returns a view of the raw bytes of an entry. For compressed entries,
+        these are the compressed bytes.
+        """
+        entry = self._entry(name)
+        start = entry["offset"]
+        end = start + entry["length"]
+        return memoryview(self._mmap)[start:end]
+
+    def is_compressed(self, name: str) -> bool:
+        return bool(self._entry(name)["codec"] != "none")
+
+    def read(self, name: str) -> bytes:
+        """Returns the decompressed content of an entry."""
+        data = bytes(self.view(name))
+        if not self.is_compressed(name):
+            return data
+        return open_compressed_reader(cast(BinaryIO, io.BytesIO(data))).read()
+
+    def open(self, name: str) -> BinaryIO:
+        """Returns a seekable file object reading the decompressed content of an entry."""
+        return cast(BinaryIO, io.BytesIO(self.read(name)))
+
+    def load_array(self, name: str) -> np.ndarray:
+        """
+        Loads an array saved with np.save. Arrays of uncompressed entries are
+        read-only views of the mapped archive. Entries which are not in the
+        npy format are unpickled, like legacy prediction files.
+        """
+        if self.is_compressed(name):
+            data = self.read(name)
+            if not data.startswith(np.lib.format.MAGIC_PREFIX):
+                return cast(np.ndarray, pickle.loads(data))
+            return cast(np.ndarray, np.load(io.BytesIO(data), allow_pickle=False))
+
+        view = self.view(name)
+        if bytes(view[: len(np.lib.format.MAGIC_PREFIX)]) != np.lib.format.MAGIC_PREFIX:
+            return cast(np.ndarray, pickle.loads(view))
+        # The header length follows the magic string and the version
+        major = view[len(np.lib.format.MAGIC_PREFIX)]
+        length_format = "<H" if major == 1 else "<I"
+        start = len(np.lib.format.MAGIC_PREFIX) + 2
+        end = start + struct.calcsize(length_format)
+        (header_length,) = struct.unpack(length_format, view[start:end])
+        header = io.BytesIO(bytes(view[: end + header_length]))
+        version = np.lib.format.read_magic(header)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+        array = np.frombuffer(view, dtype=dtype, count=int(np.prod(shape)), offset=header.tell())
+        # The mapping is private, but arrays of an archive are read-only
+        # (memoryview.toreadonly requires Python >= 3.8)
+        array.flags.writeable = False
+        return cast(np.ndarray, array.reshape(shape, order="F" if fortran_order else "C"))
+
+    def close(self) -> None:
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Loaded arrays still use the mapping, which is released together
+            # with the last of them
+            pass
+
+
+class ArchiveStorage(Storage):
+    """Read-only Storage serving the entries of an archive."""
+
+    def __init__(self, reader: ArchiveReader):
+        self.reader = reader
+
+    def put_atomic(self, key: str, data: bytes) -> None:
+        raise ValueError("Archive %s is read-only" % self.reader.path)
+
+    def get(self, key: str) -> bytes:
+        return self.reader.read(key)
+
+    def list_prefix(self, prefix: str) -> List[str]:
+        return [name for name in self.reader.names(prefix) if matches_prefix(name, prefix)]
+
+    def delete(self, key: str) -> None:
+        raise ValueError("Archive %s is read-only" % self.reader.path)
+
+    def stat(self, key: str) -> StorageStat:
+        return self.reader.stat(key)
@@ -0,0 +1,96 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, List, Optional, Set
+
+from .process_local import ProcessLocalState
+
+
+__all__ = ["AsyncWriter"]
+
+
+class AsyncWriter(ProcessLocalState):
+    """Executes write operations on a background thread.
+
+    Submitting a write returns a future right away. At most max_pending writes
+    are queued or running at any time, further submissions block until one
+    of them finished, which bounds the memory held by queued artifacts.
+
+    Exceptions of failed writes are set on their future and re-raised by the
+    next call to flush. Pending writes are not transferred to other processes.
+    """
+
+    _config_attributes = ("max_pending", "n_threads")
+
+    def __init__(self, max_pending: int = 8, n_threads: int = 1):
+        self.max_pending = max_pending
+        self.n_threads = n_threads
+        self._reset()
+
+    def _reset(self) -> None:
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pending: Set[Future[Any]] = set()
+        self._errors: List[BaseException] = []
+
+    @property
+    def n_pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> "Future[Any]":
+        self._semaphore.acquire()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.n_threads, thread_name_prefix="AsyncWriter"
+                )
+            try:
+                future = self._executor.submit(self._run, fn, *args, **kwargs)
+            except BaseException:
+                self._semaphore.release()
+                raise
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        # Errors are recorded before the future completes, so that a flush
+        # waiting for the future is guaranteed to see them
+        try:
+            return fn(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._errors.append(e)
+            raise
+        finally:
+            self._semaphore.release()
+
+    def _done(self, future: "Future[Any]") -> None:
+        with self._lock:
+            self._pending.discard(future)
+        if future.cancelled():
+            self._semaphore.release()
+
+    def flush(self) -> None:
+        """
+        Blocks until all submitted writes finished and re-raises the exception
+        of the first write that failed since the last flush.
+        """
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+        with self._lock:
+            errors, self._errors = self._errors, []
+        if len(errors) > 0:
+            raise errors[0]
+
+    def shutdown(self) -> None:
+        """
+        Waits for all submitted writes and stops the background thread.
+        """
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -1,28 +1,94 @@
-import glob
+import fcntl
+import functools
+import io
+import json
 import os
 import pickle
-import re
 import shutil
 import tempfile
 import time
 import uuid
 import warnings
-from typing import Dict, List, Optional, Tuple, TypeVar, Union, cast
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, as_completed
+from types import TracebackType
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NoReturn,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 
 import numpy as np
 
 from sklearn.pipeline import Pipeline
 
 
+from .archive import ArchiveReader, ArchiveStorage, ArchiveWriter
+from .async_writer import AsyncWriter
+from .compression import check_codec, compressed_dump
+from .ensemble_history import EnsembleHistory, EnsembleRetentionPolicy, EnsembleSnapshot
 from .logging_ import PicklableClientLogger, get_named_client_logger
+from .model_cache import LoadedModel, ModelCache
+from .node_cache import NodeLocalCache
+from .num_run_allocator import NumRunAllocator
+from .out_of_band import (
+    dump_out_of_band,
+    get_buffers_filename,
+    load_out_of_band_with_size,
+    supports_out_of_band,
+)
+from .prediction_store import PredictionStore
+from .run_index import RunIndex, parse_run_dir
+from .run_metadata import (
+    CHECKSUM_ALGORITHM,
+    CorruptArtifactError,
+    HashingWriter,
+    VERIFY_MODES,
+    array_metadata,
+    available_checksum_algorithms,
+    check_checksum_algorithm,
+    checksum,
+    file_checksum,
+    read_run_metadata,
+    verify_artifact,
+    verify_data,
+    write_run_metadata,
+)
+from .run_pruner import (
+    PeriodicTask,
+    PrunePolicy,
+    is_model_artifact,
+    is_prediction_artifact,
+    select_runs_to_prune,
+)
+from .storage import LocalStorage, Storage, fsync_directory, fsync_file
+from .watcher import BackendWatcher, WATCH_KINDS
 from ..ensemble_building.abstract_ensemble import AbstractEnsemble
 
 
-__all__ = ["Backend"]
+__all__ = ["ArchiveBackend", "Backend"]
 
 
 DATAMANAGER_TYPE = TypeVar("DATAMANAGER_TYPE")
+READ_TYPE = TypeVar("READ_TYPE")
 PIPELINE_IDENTIFIER_TYPE = Tuple[int, int, float]
+# What Backend.export_archive can pack into an archive
+ARCHIVE_CONTENTS = ("models", "predictions", "ensembles", "metadata", "datamanager")
+# How often and after how many seconds, doubling every time, the targets are
+# verified again when they do not match their digest (see load_targets_ensemble)
+TARGETS_DIGEST_RETRIES = 5
+TARGETS_DIGEST_RETRY_DELAY = 0.05
 
 
 def create(
@@ -31,6 +97,20 @@ def create(
     prefix: str,
     delete_tmp_folder_after_terminate: bool = True,
     delete_output_folder_after_terminate: bool = True,
+    consolidate_predictions: bool = False,
+    model_cache_size: Optional[int] = None,
+    max_pending_writes: int = 8,
+    compression: str = "none",
+    out_of_band_buffers: bool = False,
+    ensemble_checkpoint_interval: int = 1,
+    ensemble_retention: Optional[EnsembleRetentionPolicy] = None,
+    num_run_block_size: int = 1,
+    storage: Optional[Storage] = None,
+    cache_directory: Optional[str] = None,
+    cache_max_bytes: int = 2**30,
+    checksum_algorithm: str = CHECKSUM_ALGORITHM,
+    verify_on_load: Optional[str] = None,
+    fsync: bool = False,
 ) -> "Backend":
     context = BackendContext(
         temporary_directory,
@@ -38,8 +118,25 @@ def create(
         delete_tmp_folder_after_terminate,
         delete_output_folder_after_terminate,
         prefix=prefix,
+        cache_directory=cache_directory,
+        cache_max_bytes=cache_max_bytes,
+    )
+    backend = Backend(
+        context,
+        prefix,
+        consolidate_predictions=consolidate_predictions,
+        model_cache_size=model_cache_size,
+        max_pending_writes=max_pending_writes,
+        compression=compression,
+        out_of_band_buffers=out_of_band_buffers,
+        ensemble_checkpoint_interval=ensemble_checkpoint_interval,
+        ensemble_retention=ensemble_retention,
+        num_run_block_size=num_run_block_size,
+        storage=storage,
+        checksum_algorithm=checksum_algorithm,
+        verify_on_load=verify_on_load,
+        fsync=fsync,
     )
-    backend = Backend(context, prefix)
 
     return backend
 
@@ -65,7 +162,27 @@ def get_randomized_directory_name(
     return temporary_directory
 
 
+def _get_num_workers(n_jobs: int) -> int:
+    """
+    Translates n_jobs into a number of workers, following the convention of
+    joblib: -1 means one worker per processor, -2 one less and so on.
+    """
+    if n_jobs == 0:
+        raise ValueError("n_jobs must not be 0, use a positive number or -1 for all processors")
+    if n_jobs > 0:
+        return n_jobs
+    return max((os.cpu_count() or 1) + 1 + n_jobs, 1)
+
+
 class BackendContext(object):
+    """Directories used by the backends of one run.
+
+    The temporary directory is usually shared by all workers. If a
+    cache_directory on node-local storage is given, backends keep copies of
+    the predictions and small metadata files they read or write there, see
+    NodeLocalCache, using at most cache_max_bytes per node.
+    """
+
     def __init__(
         self,
         temporary_directory: str,
@@ -73,6 +190,8 @@ class BackendContext(object):
         delete_tmp_folder_after_terminate: bool,
         delete_output_folder_after_terminate: bool,
         prefix: str,
+        cache_directory: Optional[str] = None,
+        cache_max_bytes: int = 2**30,
     ):
 
         # Check that the names of tmp_dir and output_dir is not the same.
@@ -91,6 +210,8 @@ class BackendContext(object):
             prefix=self._prefix,
         )
         self._output_directory = output_directory
+        self._cache_directory = cache_directory
+        self.cache_max_bytes = cache_max_bytes
         # Logging happens via PicklableClientLogger
         # For this reason we need a port to communicate with the server
         # When the backend is created, this port is not available
@@ -118,6 +239,19 @@ class BackendContext(object):
         # make sure that tilde does not appear on the path.
         return os.path.expanduser(os.path.expandvars(self._temporary_directory))
 
+    @property
+    def cache_directory(self) -> Optional[str]:
+        """
+        Node-local directory of this context, within the given cache
+        directory, so that several runs can share the latter.
+        """
+        if self._cache_directory is None:
+            return None
+        return os.path.join(
+            os.path.expanduser(os.path.expandvars(self._cache_directory)),
+            "%s_%s" % (self._prefix, os.path.basename(self.temporary_directory.rstrip(os.sep))),
+        )
+
     def create_directories(self, exist_ok: bool = False) -> None:
         # No Exception is raised if self.temporary_directory already exists.
         # This allows to continue the search, also, an error will be raised if
@@ -157,6 +291,9 @@ class BackendContext(object):
                     "Please make sure that the specified tmp dir did not "
                     "previously exist."
                 )
+            if self.cache_directory is not None:
+                # Only the cache of this node can be reached from here
+                shutil.rmtree(self.cache_directory, ignore_errors=True)
             try:
                 shutil.rmtree(self.temporary_directory)
             except Exception:
@@ -177,9 +314,79 @@ class Backend(object):
     These are:
     * start time
     * true targets of the ensemble
+
+    If consolidate_predictions is True, the predictions of every saved run are
+    additionally appended to one PredictionStore per subset, from which the
+    predictions of many runs can be read as a single array.
+
+    If model_cache_size is given, loaded models and cv_models are kept in an
+    in-process LRU cache of at most this many bytes (estimated by the size of
+    their pickles), see ModelCache.
+
+    Runs can be saved asynchronously by a background writer, which queues at
+    most max_pending_writes runs. Using the backend as a context manager, or
+    calling flush, guarantees that all of them were written.
+
+    Models and cv_models are pickled with the given compression codec, one of
+    compression.available_codecs(). The codec is recorded in the header of
+    each file, so files written with any codec can be loaded.
+
+    If out_of_band_buffers is True, models are pickled with protocol 5 and
+    their large buffers, such as the data of numpy arrays, are written to an
+    aligned side file which is memory-mapped on load instead of being copied.
+
+    Every saved ensemble is recorded in an EnsembleHistory. The full ensemble
+    object is only kept for the latest ensemble and for checkpoints, i.e.
+    every ensemble_checkpoint_interval-th ensemble index, as far as the
+    ensemble_retention policy allows.
+
+    num_runs are allocated through a NumRunAllocator shared by all backends of
+    the same directory, which reserves num_run_block_size num_runs at a time.
+
+    The start times, the ensemble targets, the datamanager, the ensembles and
+    the pointers to the latest ensembles are kept in a Storage, by default a
+    LocalStorage of the internals directory. The runs, with their metadata
+    and predictions, and the ensemble history always stay in the internals
+    directory, as they are memory-mapped, locked and appended to. All
+    processes using the same backend must therefore share both the internals
+    directory and the storage, so a backend whose storage is private to its
+    process, like an InMemoryStorage, can not be pickled.
+
+    The artifacts of every run and every ensemble are hashed with the given
+    checksum_algorithm while they are written, and their sizes and checksums
+    are recorded in the run metadata and the ensemble history. If
+    verify_on_load is "size" or "full", models, predictions and ensembles
+    are checked against them before they are loaded, and a damaged file
+    raises a CorruptArtifactError instead of failing somewhere in pickle.
+    fsck checks all runs and ensembles at once. If fsync is True, runs and
+    the values of the default LocalStorage are flushed to disk before they
+    are published.
     """
 
-    def __init__(self, context: BackendContext, prefix: str):
+    # Class level default, so that the cache is also disabled for backends
+    # which were not created through __init__
+    model_cache = None  # type: Optional[ModelCache]
+    node_cache = None  # type: Optional[NodeLocalCache]
+    _pruning_task = None  # type: Optional[PeriodicTask]
+    verify_on_load = None  # type: Optional[str]
+
+    def __init__(
+        self,
+        context: BackendContext,
+        prefix: str,
+        consolidate_predictions: bool = False,
+        model_cache_size: Optional[int] = None,
+        max_pending_writes: int = 8,
+        compression: str = "none",
+        out_of_band_buffers: bool = False,
+        ensemble_checkpoint_interval: int = 1,
+        ensemble_retention: Optional[EnsembleRetentionPolicy] = None,
+        num_run_block_size: int = 1,
+        storage: Optional[Storage] = None,
+        checksum_algorithm: str = CHECKSUM_ALGORITHM,
+        verify_on_load: Optional[str] = None,
+        fsync: bool = False,
+    ):
         # When the backend is created, this port is not available
         # When the port is available in the main process, we
         # call the setup_logger with this port and update self.logger
@@ -202,6 +409,100 @@ class Backend(object):
 
         self.internals_directory = os.path.join(self.temporary_directory, f".{self.prefix}")
         self._make_internals_directory()
+        self.fsync = fsync
+        self.storage = (
+            storage if storage is not None else LocalStorage(self.internals_directory, fsync=fsync)
+        )
+        if context.cache_directory is not None:
+            self.node_cache = NodeLocalCache(context.cache_directory, context.cache_max_bytes)
+        self.run_index = RunIndex(
+            runs_directory=self.get_runs_directory(),
+            index_path=self.get_run_index_filename(),
+        )
+        self.num_run_allocator = NumRunAllocator(
+            os.path.join(self.internals_directory, "num_run.counter"),
+            block_size=num_run_block_size,
+        )
+        self.consolidate_predictions = consolidate_predictions
+        self._prediction_stores = {}  # type: Dict[str, PredictionStore]
+        if model_cache_size is not None:
+            self.model_cache = ModelCache(max_bytes=model_cache_size)
+        self.async_writer = AsyncWriter(max_pending=max_pending_writes)
+        check_codec(compression)
+        self.compression = compression
+        if out_of_band_buffers and not supports_out_of_band():
+            raise ValueError("Out-of-band buffers require pickle protocol 5 (Python >= 3.8)")
+        self.out_of_band_buffers = out_of_band_buffers
+        self.ensemble_checkpoint_interval = ensemble_checkpoint_interval
+        self.ensemble_retention = (
+            ensemble_retention if ensemble_retention is not None else EnsembleRetentionPolicy()
+        )
+        self.ensemble_history = EnsembleHistory(self.get_ensemble_history_filename())
+        check_checksum_algorithm(checksum_algorithm)
+        self.checksum_algorithm = checksum_algorithm
+        if verify_on_load is not None and verify_on_load not in VERIFY_MODES:
+            raise ValueError(
+                "Unknown verify mode %s, choose from %s" % (verify_on_load, VERIFY_MODES)
+            )
+        self.verify_on_load = verify_on_load
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # A copy in another process would write ensembles to its own copy of
+        # the storage, but move the pointers and the history of this one
+        if not self.storage.shared:
+            raise pickle.PicklingError(
+                "A Backend with a %s can not be passed to other processes, use a storage "
+                "shared between processes like a LocalStorage instead"
+                % type(self.storage).__name__
+            )
+        return self.__dict__
+
+    def __enter__(self) -> "Backend":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        try:
+            self.stop_pruning()
+            self.flush()
+        finally:
+            self.async_writer.shutdown()
+
+    def flush(self) -> None:
+        """
+        Blocks until all runs saved asynchronously are published, re-raising
+        the exception of a failed write.
+        """
+        self.async_writer.flush()
+
+    def _read_cached(self, file_path: str, read: Callable[[str], READ_TYPE]) -> READ_TYPE:
+        """Reads a file through the node-local cache, if there is one."""
+        if self.node_cache is not None:
+            try:
+                return read(self.node_cache.get_path(file_path))
+            except FileNotFoundError:
+                # The copy was evicted by another process in the meantime
+                pass
+        return read(file_path)
+
+    def _write_through(self, files: Dict[str, bytes]) -> None:
+        """
+        Stores files which were just written into the node-local cache, from
+        the bytes written to them, so that the shared copies are not read back.
+        """
+        if self.node_cache is None:
+            return
+        for file_path, data in files.items():
+            try:
+                self.node_cache.put(file_path, data)
+            except OSError as e:
+                # The cache is an optimization, failing to fill it is no error
+                if self.logger is not None:
+                    self.logger.debug("Could not cache %s: %s" % (file_path, e))
 
     def setup_logger(self, port: int) -> None:
         self.logger = get_named_client_logger(
@@ -230,10 +531,13 @@ class Backend(object):
             if self.logger is not None:
                 self.logger.debug("_make_internals_directory: %s" % e)
 
-    def _get_start_time_filename(self, seed: Union[str, int]) -> str:
+    def _get_start_time_key(self, seed: Union[str, int]) -> str:
         if isinstance(seed, str):
             seed = int(seed)
-        return os.path.join(self.internals_directory, "start_time_%d" % seed)
+        return "start_time_%d" % seed
+
+    def _get_start_time_filename(self, seed: Union[str, int]) -> str:
+        return os.path.join(self.internals_directory, self._get_start_time_key(seed))
 
     def save_start_time(self, seed: str) -> str:
         self._make_internals_directory()
@@ -244,21 +548,17 @@ class Backend(object):
         if not isinstance(start_time, float):
             raise ValueError("Start time must be a float, but is %s." % type(start_time))
 
-        if os.path.exists(filepath):
+        if self.storage.exists(self._get_start_time_key(seed)):
             raise ValueError(
                 "{filepath} already exist. Different seeds should be provided for different jobs."
             )
 
-        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(filepath), delete=False) as fh:
-            fh.write(str(start_time))
-            tempname = fh.name
-        os.rename(tempname, filepath)
+        self.storage.put_atomic(self._get_start_time_key(seed), str(start_time).encode("ascii"))
 
         return filepath
 
     def load_start_time(self, seed: int) -> float:
-        with open(self._get_start_time_filename(seed), "r") as fh:
-            start_time = float(fh.read())
+        start_time = float(self.storage.get(self._get_start_time_key(seed)).decode("ascii"))
         return start_time
 
     def get_smac_output_directory(self) -> str:
@@ -270,41 +570,148 @@ class Backend(object):
     def _get_targets_ensemble_filename(self) -> str:
         return os.path.join(self.internals_directory, "true_targets_ensemble.npy")
 
+    def _get_targets_ensemble_key(self) -> str:
+        return "true_targets_ensemble.npy"
+
+    def _get_targets_ensemble_digest_key(self) -> str:
+        return "true_targets_ensemble.digest.json"
+
+    def _read_targets_ensemble_digest(self) -> Optional[Dict[str, Any]]:
+        try:
+            return dict(json.loads(self.storage.get(self._get_targets_ensemble_digest_key())))
+        except (FileNotFoundError, ValueError, TypeError):
+            return None
+
     def save_targets_ensemble(self, targets: np.ndarray) -> str:
+        """
+        Saves the targets of the ensemble data, unless the saved targets are
+        the same or have more data points.
+
+        Next to the targets, a small digest with their shape, dtype, size and
+        checksum is saved. The saved targets are compared to the new ones by
+        their digest, so every worker calling this only reads the digest
+        instead of loading and comparing the whole targets.
+        """
         self._make_internals_directory()
         if not isinstance(targets, np.ndarray):
             raise ValueError("Targets must be of type np.ndarray, but is %s" % type(targets))
 
         filepath = self._get_targets_ensemble_filename()
-
-        # Try to open the file without locking it, this will reduce the
-        # number of times where we erroneously keep a lock on the ensemble
-        # targets file although the process already was killed
-        try:
-            existing_targets = np.load(filepath, allow_pickle=True)
-            if existing_targets.shape[0] > targets.shape[0] or (
-                existing_targets.shape == targets.shape and np.allclose(existing_targets, targets)
+        targets = targets.astype(np.float32)
+        buffer = io.BytesIO()
+        np.save(buffer, targets)
+        data = buffer.getvalue()
+
+        digest = self._read_targets_ensemble_digest()
+        if digest is not None:
+            if digest["shape"][0] > targets.shape[0]:
+                return filepath
+            if (
+                digest["shape"] == list(targets.shape)
+                and digest["dtype"] == str(targets.dtype)
+                and digest["checksum_algorithm"] in available_checksum_algorithms()
+                and checksum(data, digest["checksum_algorithm"]) == digest["checksum"]
             ):
-
                 return filepath
-        except Exception:
-            pass
-
-        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(filepath), delete=False) as fh_w:
-            np.save(fh_w, targets.astype(np.float32))
-            tempname = fh_w.name
-
-        os.rename(tempname, filepath)
+        else:
+            # Targets saved without digest have to be loaded for the comparison.
+            # Try to open the file without locking it, this will reduce the
+            # number of times where we erroneously keep a lock on the ensemble
+            # targets file although the process already was killed
+            try:
+                existing_targets = np.load(
+                    io.BytesIO(self.storage.get(self._get_targets_ensemble_key())),
+                    allow_pickle=True,
+                )
+                if existing_targets.shape[0] > targets.shape[0] or (
+                    existing_targets.shape == targets.shape
+                    and np.allclose(existing_targets, targets)
+                ):
+                    return filepath
+            except Exception:
+                pass
+
+        # The digest identifies the targets by their content, so that an exact
+        # comparison is possible even if checksums are disabled for the runs
+        algorithm = self.checksum_algorithm if self.checksum_algorithm != "none" else "blake2b"
+        self.storage.put_atomic(self._get_targets_ensemble_key(), data)
+        self.storage.put_atomic(
+            self._get_targets_ensemble_digest_key(),
+            json.dumps(
+                {
+                    "shape": list(targets.shape),
+                    "dtype": str(targets.dtype),
+                    "size": len(data),
+                    "checksum": checksum(data, algorithm),
+                    "checksum_algorithm": algorithm,
+                },
+                sort_keys=True,
+            ).encode("utf-8"),
+        )
+        local_path = self.storage.local_path(self._get_targets_ensemble_key())
+        if local_path is not None:
+            self._write_through({local_path: data})
 
         return filepath
 
-    def load_targets_ensemble(self) -> np.ndarray:
-        filepath = self._get_targets_ensemble_filename()
+    def load_targets_ensemble(self, mmap: bool = False) -> np.ndarray:
+        """
+        Loads the targets of the ensemble data.
 
-        with open(filepath, "rb") as fh:
-            targets = np.load(fh, allow_pickle=True)
+        Parameters
+        ----------
+        mmap: bool
+            If True and the storage keeps the targets in a file, a read-only
+            memory-mapped view of the file is returned, so that the targets
+            are only paged in when accessed
 
-        return targets
+        Returns
+        -------
+        targets: np.ndarray
+        """
+        digest = None if self.verify_on_load is None else self._read_targets_ensemble_digest()
+        delay = TARGETS_DIGEST_RETRY_DELAY
+        for _ in range(TARGETS_DIGEST_RETRIES):
+            try:
+                return self._load_targets_ensemble(digest, mmap)
+            except CorruptArtifactError:
+                # save_targets_ensemble replaces the targets before their
+                # digest, so a concurrent save can pair the new targets with
+                # the old digest. Verify again once the digest was replaced
+                new_digest = self._read_targets_ensemble_digest()
+                if new_digest == digest:
+                    time.sleep(delay)
+                    delay *= 2
+                digest = new_digest
+        return self._load_targets_ensemble(digest, mmap)
+
+    def _load_targets_ensemble(self, digest: Optional[Dict[str, Any]], mmap: bool) -> np.ndarray:
+        key = self._get_targets_ensemble_key()
+        local_path = self.storage.local_path(key)
+        if local_path is not None:
+            if digest is not None:
+                verify_artifact(
+                    local_path, digest, digest["checksum_algorithm"], cast(str, self.verify_on_load)
+                )
+            targets = self._read_cached(
+                local_path,
+                lambda file_path: np.load(
+                    file_path, mmap_mode="r" if mmap else None, allow_pickle=not mmap
+                ),
+            )
+        else:
+            data = self.storage.get(key)
+            if digest is not None:
+                verify_data(
+                    data,
+                    digest,
+                    digest["checksum_algorithm"],
+                    cast(str, self.verify_on_load),
+                    name=key,
+                )
+            targets = np.load(io.BytesIO(data), allow_pickle=True)
+
+        return cast(np.ndarray, targets)
 
     def _get_datamanager_pickle_filename(self) -> str:
         return os.path.join(self.internals_directory, "datamanager.pkl")
@@ -313,21 +720,19 @@ class Backend(object):
         self._make_internals_directory()
         filepath = self._get_datamanager_pickle_filename()
 
-        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(filepath), delete=False) as fh:
-            pickle.dump(datamanager, fh, -1)
-            tempname = fh.name
-        os.rename(tempname, filepath)
+        self.storage.put_atomic("datamanager.pkl", pickle.dumps(datamanager, -1))
 
         return filepath
 
     def load_datamanager(self) -> DATAMANAGER_TYPE:
-        filepath = self._get_datamanager_pickle_filename()
-        with open(filepath, "rb") as fh:
-            return cast(DATAMANAGER_TYPE, pickle.load(fh))
+        return cast(DATAMANAGER_TYPE, pickle.loads(self.storage.get("datamanager.pkl")))
 
     def get_runs_directory(self) -> str:
         return os.path.join(self.internals_directory, "runs")
 
+    def get_run_index_filename(self) -> str:
+        return os.path.join(self.internals_directory, "runs.index")
+
     def get_numrun_directory(self, seed: int, num_run: int, budget: float) -> str:
         return os.path.join(self.internals_directory, "runs", "%d_%d_%s" % (seed, num_run, budget))
 
@@ -356,21 +761,19 @@ class Backend(object):
         """
 
         # If there are other num_runs, their name would be runs/<seed>_<num_run>_<budget>
-        other_num_runs = [
-            int(os.path.basename(run_dir).split("_")[1])
-            for run_dir in glob.glob(os.path.join(self.internals_directory, "runs", "*"))
-            if self._is_run_dir(os.path.basename(run_dir))
-        ]
-        if len(other_num_runs) > 0:
-            # We track the number of runs from two forefronts:
-            # The physically available num_runs (which might be deleted or a crash could happen)
-            # From a internally kept attribute. The later should be sufficient, but we
-            # want to be robust against multiple backend copies on different workers
-            self.active_num_run = max([self.active_num_run] + other_num_runs)
-
-        # We are interested in the next run id
-        if not peek:
-            self.active_num_run += 1
+        # The run index keeps track of them without listing the runs directory
+        # We track the number of runs from two forefronts:
+        # The physically available num_runs (which might be deleted or a crash could happen)
+        # From a internally kept attribute. The later should be sufficient, but we
+        # want to be robust against multiple backend copies on different workers
+        floor = max(self.active_num_run, self.run_index.get_max_num_run())
+
+        # We are interested in the next run id. It is allocated atomically,
+        # so that concurrent workers never get the same num_run
+        if peek:
+            self.active_num_run = max(floor, self.num_run_allocator.peek())
+        else:
+            self.active_num_run = self.num_run_allocator.allocate(floor)
         return self.active_num_run
 
     @staticmethod
@@ -389,8 +792,7 @@ class Backend(object):
             whether the provided run directory matches the run_dir_pattern
             signifying that it is a run directory
         """
-        run_dir_pattern = r"\d+_\d+_\d+"
-        return bool(re.match(run_dir_pattern, run_dir))
+        return parse_run_dir(run_dir) is not None
 
     def get_model_filename(self, seed: int, idx: int, budget: float) -> str:
         return "%s.%s.%s.model" % (seed, idx, budget)
@@ -399,41 +801,168 @@ class Backend(object):
         return "%s.%s.%s.cv_model" % (seed, idx, budget)
 
     def list_all_models(self, seed: int) -> List[str]:
-        runs_directory = self.get_runs_directory()
-        model_files = glob.glob(
-            os.path.join(glob.escape(runs_directory), "%d_*" % seed, "%s.*.*.model" % seed)
-        )
+        model_files = []
+        for entry in self.run_index.list_entries(seed):
+            idx, budget = entry["num_run"], entry["budget"]
+            model_file_name = self.get_model_filename(seed, idx, budget)
+            if model_file_name in entry["artifacts"]:
+                model_files.append(
+                    os.path.join(self.get_numrun_directory(seed, idx, budget), model_file_name)
+                )
         return model_files
 
-    def load_models_by_identifiers(
-        self, identifiers: List[PIPELINE_IDENTIFIER_TYPE]
-    ) -> Dict[PIPELINE_IDENTIFIER_TYPE, Pipeline]:
-        models = {}
+    def watch(
+        self,
+        kind: Sequence[str] = WATCH_KINDS,
+        poll_interval: float = 0.5,
+        include_existing: bool = False,
+    ) -> BackendWatcher:
+        """
+        Watches the backend for new runs and ensembles.
 
-        for identifier in identifiers:
-            seed, idx, budget = identifier
-            models[identifier] = self.load_model_by_seed_and_id_and_budget(seed, idx, budget)
+        Parameters
+        ----------
+        kind: Sequence[str]
+            What to watch, "runs", "ensembles" or both
+        poll_interval: float
+            Seconds between two checks if inotify is not available
+        include_existing: bool
+            Whether runs and ensembles saved before the call are reported as well
 
-        return models
+        Returns
+        -------
+        watcher: BackendWatcher
+            Iterating over it yields a WatchEvent per new run or ensemble.
+            watcher.poll(timeout) returns the events since the last call and
+            watcher.events(timeout) stops after timeout seconds without events.
+        """
+        return BackendWatcher(
+            self.internals_directory,
+            self.get_runs_directory(),
+            kind=kind,
+            poll_interval=poll_interval,
+            include_existing=include_existing,
+        )
+
+    def list_runs(self, seed: Optional[int] = None) -> List[PIPELINE_IDENTIFIER_TYPE]:
+        """
+        Lists the identifiers of all the runs stored in the runs directory.
+
+        Parameters
+        ----------
+        seed: Optional[int]
+            If given, only the runs of this seed are returned
+
+        Returns
+        -------
+        identifiers: List[Tuple[int, int, float]]
+            sorted (seed, num_run, budget) identifiers of the stored runs
+        """
+        return self.run_index.list_runs(seed)
+
+    def iter_models_by_identifiers(
+        self,
+        identifiers: List[PIPELINE_IDENTIFIER_TYPE],
+        cv: bool = False,
+        n_jobs: int = 1,
+        executor: Optional[Executor] = None,
+    ) -> Iterator[Tuple[PIPELINE_IDENTIFIER_TYPE, Pipeline]]:
+        """
+        Loads the models of the given identifiers and yields each of them as
+        soon as it is loaded, so that the first models can already be used
+        while the later ones are still being read.
+
+        Parameters
+        ----------
+        identifiers: List[Tuple[int, int, float]]
+            (seed, num_run, budget) of the models to load
+        cv: bool
+            Whether to load the cv_models instead of the models
+        n_jobs: int
+            Number of threads used to load the models. -1 means using one
+            thread per processor, -2 one less and so on. Ignored if an
+            executor is given.
+        executor: Optional[concurrent.futures.Executor]
+            Executor used to load the models. A ProcessPoolExecutor can be
+            given to unpickle the models outside of the calling process.
+
+        Returns
+        -------
+        Iterator of (identifier, model), in the order in which the models
+        finished loading if loaded in parallel, in the order of the
+        identifiers otherwise.
+        """
+        load = (
+            self.load_cv_model_by_seed_and_id_and_budget
+            if cv
+            else self.load_model_by_seed_and_id_and_budget
+        )  # type: Callable[[int, int, float], Pipeline]
+        # Validated here, as the models are only loaded once iterating starts
+        num_workers = _get_num_workers(n_jobs)
+        return self._iter_models(identifiers, load, num_workers, executor)
+
+    @staticmethod
+    def _iter_models(
+        identifiers: List[PIPELINE_IDENTIFIER_TYPE],
+        load: Callable[[int, int, float], Pipeline],
+        num_workers: int,
+        executor: Optional[Executor],
+    ) -> Iterator[Tuple[PIPELINE_IDENTIFIER_TYPE, Pipeline]]:
+        if executor is None and num_workers == 1:
+            for identifier in identifiers:
+                seed, idx, budget = identifier
+                yield identifier, load(seed, idx, budget)
+            return
+
+        own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=num_workers)
+        futures = {executor.submit(load, *identifier): identifier for identifier in identifiers}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # Do not keep on loading if the consumer stopped iterating
+            for future in futures:
+                future.cancel()
+            if own_executor:
+                executor.shutdown(wait=False)
+
+    def load_models_by_identifiers(
+        self,
+        identifiers: List[PIPELINE_IDENTIFIER_TYPE],
+        n_jobs: int = 1,
+        executor: Optional[Executor] = None,
+    ) -> Dict[PIPELINE_IDENTIFIER_TYPE, Pipeline]:
+        models = dict(
+            self.iter_models_by_identifiers(identifiers, n_jobs=n_jobs, executor=executor)
+        )
+        return {identifier: models[identifier] for identifier in identifiers}
 
     def load_model_by_seed_and_id_and_budget(self, seed: int, idx: int, budget: float) -> Pipeline:
         model_directory = self.get_numrun_directory(seed, idx, budget)
 
         model_file_name = "%s.%s.%s.model" % (seed, idx, budget)
         model_file_path = os.path.join(model_directory, model_file_name)
-        with open(model_file_path, "rb") as fh:
-            return pickle.load(fh)
+        if self.model_cache is not None:
+            return self.model_cache.get(
+                (seed, idx, budget, "model"),
+                model_file_path,
+                self._load_sized_pipeline,
+                side_files=[get_buffers_filename(model_file_path)],
+            )
+        return self._load_pipeline(model_file_path)
 
     def load_cv_models_by_identifiers(
-        self, identifiers: List[PIPELINE_IDENTIFIER_TYPE]
+        self,
+        identifiers: List[PIPELINE_IDENTIFIER_TYPE],
+        n_jobs: int = 1,
+        executor: Optional[Executor] = None,
     ) -> Dict[PIPELINE_IDENTIFIER_TYPE, Pipeline]:
-        models = {}
-
-        for identifier in identifiers:
-            seed, idx, budget = identifier
-            models[identifier] = self.load_cv_model_by_seed_and_id_and_budget(seed, idx, budget)
-
-        return models
+        models = dict(
+            self.iter_models_by_identifiers(identifiers, cv=True, n_jobs=n_jobs, executor=executor)
+        )
+        return {identifier: models[identifier] for identifier in identifiers}
 
     def load_cv_model_by_seed_and_id_and_budget(
         self, seed: int, idx: int, budget: float
@@ -442,8 +971,368 @@ class Backend(object):
 
         model_file_name = "%s.%s.%s.cv_model" % (seed, idx, budget)
         model_file_path = os.path.join(model_directory, model_file_name)
+        if self.model_cache is not None:
+            return self.model_cache.get(
+                (seed, idx, budget, "cv_model"),
+                model_file_path,
+                self._load_sized_pipeline,
+                side_files=[get_buffers_filename(model_file_path)],
+            )
+        return self._load_pipeline(model_file_path)
+
+    def _load_pipeline(self, model_file_path: str) -> Pipeline:
+        return self._load_sized_pipeline(model_file_path).model
+
+    def _load_sized_pipeline(self, model_file_path: str) -> LoadedModel:
+        """Loads a pipeline together with its size for the model cache."""
+        self._verify_artifact(model_file_path)
         with open(model_file_path, "rb") as fh:
-            return pickle.load(fh)
+            return LoadedModel(*load_out_of_band_with_size(fh, model_file_path))
+
+    def _save_pipeline(self, pipeline: Pipeline, model_file_path: str) -> Dict[str, Optional[str]]:
+        """Saves a pipeline and returns the checksums of the files written."""
+        if self.out_of_band_buffers:
+            # The files are written by dump_out_of_band and hashed afterwards
+            dump_out_of_band(pipeline, model_file_path, self.compression)
+            return {}
+        with open(model_file_path, "wb") as fh:
+            writer = HashingWriter(cast(BinaryIO, fh), self.checksum_algorithm)
+            compressed_dump(pipeline, cast(BinaryIO, writer), self.compression)
+        return {os.path.basename(model_file_path): writer.hexdigest()}
+
+    def _get_ensemble_members(
+        self, keep_ensembles: int
+    ) -> Tuple[Set[PIPELINE_IDENTIFIER_TYPE], Dict[PIPELINE_IDENTIFIER_TYPE, float]]:
+        """
+        Returns the members of the keep_ensembles latest ensembles and, for
+        every run which was part of an ensemble, when it last was.
+        """
+        snapshots = sorted(self.ensemble_history.list_snapshots(), key=lambda s: s.time)
+        last_used = {}  # type: Dict[PIPELINE_IDENTIFIER_TYPE, float]
+        for snapshot in snapshots:
+            for identifier in snapshot.identifiers:
+                last_used[identifier] = snapshot.time
+
+        members = set()  # type: Set[PIPELINE_IDENTIFIER_TYPE]
+        if keep_ensembles > 0:
+            for snapshot in snapshots[-keep_ensembles:]:
+                members.update(snapshot.identifiers)
+            if len(snapshots) == 0 and os.path.exists(self.get_ensemble_dir()):
+                # Ensembles saved without history
+                try:
+                    ensemble = self.load_ensemble(-1)
+                except (IndexError, FileNotFoundError):
+                    ensemble = None
+                if ensemble is not None:
+                    members.update(
+                        (int(seed), int(num_run), float(budget))
+                        for seed, num_run, budget in ensemble.get_selected_model_identifiers()
+                    )
+        return members, last_used
+
+    def prune_runs(self, policy: PrunePolicy) -> List[PIPELINE_IDENTIFIER_TYPE]:
+        """
+        Deletes runs, or some of their artifacts, until the runs directory
+        satisfies the limits of the policy.
+
+        Runs are removed with the same protocol as they are published: the
+        run directory is first renamed out of the runs directory, then a
+        tombstone is appended to the run index and only afterwards the files
+        are deleted. Concurrent readers therefore either see a complete run
+        or none. When only some artifacts are deleted, the run metadata and
+        afterwards the run index are updated to list the remaining ones. The
+        predictions of pruned runs are removed from the prediction stores.
+
+        Parameters
+        ----------
+        policy: PrunePolicy
+            Limits to enforce and what to delete
+
+        Returns
+        -------
+        identifiers: List[Tuple[int, int, float]]
+            (seed, num_run, budget) of the pruned runs
+        """
+        protected, last_used = self._get_ensemble_members(policy.keep_ensembles)
+        selected = select_runs_to_prune(self.run_index.list_entries(), policy, protected, last_used)
+
+        for (seed, num_run, budget), artifacts in selected:
+            run_directory = self.get_numrun_directory(seed, num_run, budget)
+            if policy.artifacts != "models":
+                # Readers fall back to the .npy files until these are deleted
+                for subset in ("ensemble", "valid", "test"):
+                    self.get_prediction_store(subset).remove((seed, num_run, budget))
+            if policy.artifacts == "all":
+                trash = tempfile.mkdtemp(dir=self.internals_directory, prefix="tmp_prune_")
+                try:
+                    os.rename(run_directory, os.path.join(trash, os.path.basename(run_directory)))
+                except FileNotFoundError:
+                    pass
+                self.run_index.append(self.run_index.make_tombstone(seed, num_run, budget))
+                shutil.rmtree(trash, ignore_errors=True)
+                continue
+
+            # The metadata is replaced atomically before any artifact it lists
+            # is deleted and before the run index lists the remaining ones
+            metadata = self.get_run_metadata(seed, num_run, budget)
+            if metadata is not None:
+                for name in artifacts:
+                    metadata["artifacts"].pop(name, None)
+                if policy.artifacts == "models":
+                    metadata["has_model"] = metadata["has_cv_model"] = False
+                else:
+                    metadata["predictions"] = {}
+                metadata["pruned"] = sorted(set(metadata.get("pruned", [])) | set(artifacts))
+                metadata_file_name = self.get_run_metadata_filename(seed, num_run, budget)
+                write_run_metadata(os.path.join(run_directory, metadata_file_name), metadata)
+            for name in artifacts:
+                try:
+                    os.remove(os.path.join(run_directory, name))
+                except FileNotFoundError:
+                    pass
+            entry = self.run_index.get(seed, num_run, budget)
+            if entry is not None:
+                self.run_index.append(
+                    self.run_index.make_entry(
+                        seed,
+                        num_run,
+                        budget,
+                        artifacts={
+                            name: size
+                            for name, size in entry["artifacts"].items()
+                            if name not in artifacts
+                        },
+                        mtime=entry["mtime"],
+                    )
+                )
+
+        if self.logger is not None and len(selected) > 0:
+            self.logger.debug("Pruned %d runs: %s" % (len(selected), selected))
+        return [identifier for identifier, _ in selected]
+
+    def start_pruning(self, policy: PrunePolicy, interval: float = 60.0) -> None:
+        """
+        Calls prune_runs(policy) every interval seconds on a background thread,
+        until stop_pruning is called or the backend is used as a context manager
+        and exits. Replaces a previously started pruning.
+        """
+        self.stop_pruning()
+        self._pruning_task = PeriodicTask(
+            functools.partial(self.prune_runs, policy), interval, on_error=self._on_pruning_error
+        )
+        self._pruning_task.start()
+
+    def stop_pruning(self) -> None:
+        if self._pruning_task is not None:
+            self._pruning_task.stop()
+            self._pruning_task = None
+
+    def _on_pruning_error(self, error: BaseException) -> None:
+        if self.logger is not None:
+            self.logger.warning("Pruning the runs directory failed: %s" % error)
+        else:
+            warnings.warn("Pruning the runs directory failed: %s" % error)
+
+    def get_run_metadata_filename(self, seed: int, idx: int, budget: float) -> str:
+        return "%s.%s.%s.metadata.json" % (seed, idx, budget)
+
+    def get_run_metadata(self, seed: int, idx: int, budget: float) -> Optional[Dict[str, Any]]:
+        """
+        Returns the metadata written next to the artifacts of a run, without
+        touching the artifacts themselves.
+
+        The metadata holds the size and checksum of every artifact, the shape
+        and dtype of the predictions, whether a model and a cv model were
+        saved, the compression used, when the run was saved and how long
+        saving took. Returns None if the run was saved without metadata.
+        """
+        file_path = os.path.join(
+            self.get_numrun_directory(seed, idx, budget),
+            self.get_run_metadata_filename(seed, idx, budget),
+        )
+        if self.node_cache is None:
+            return read_run_metadata(file_path)
+        try:
+            return self._read_cached(
+                file_path, functools.partial(read_run_metadata, missing_ok=False)
+            )
+        except FileNotFoundError:
+            return None
+
+    def scan_runs(
+        self, seed: Optional[int] = None
+    ) -> Dict[PIPELINE_IDENTIFIER_TYPE, Optional[Dict[str, Any]]]:
+        """
+        Returns the metadata of all runs, see get_run_metadata.
+
+        Parameters
+        ----------
+        seed: Optional[int]
+            If given, only the runs of this seed are scanned
+
+        Returns
+        -------
+        metadata: Dict[Tuple[int, int, float], Optional[Dict[str, Any]]]
+            Metadata by run identifier, None for runs saved without metadata
+        """
+        return {
+            (_seed, num_run, budget): self.get_run_metadata(_seed, num_run, budget)
+            for _seed, num_run, budget in self.list_runs(seed)
+        }
+
+    def _verify_artifact(self, file_path: str) -> None:
+        """
+        Checks an artifact of a run, and the side file of its out-of-band
+        buffers, against the run metadata if verify_on_load is set.
+        """
+        if self.verify_on_load is None:
+            return
+        run_directory, name = os.path.split(file_path)
+        identifier = parse_run_dir(os.path.basename(run_directory))
+        if identifier is None:
+            return
+        metadata = self.get_run_metadata(*identifier)
+        if metadata is None:
+            # Saved without metadata, there is nothing to compare to
+            return
+        for artifact in (name, get_buffers_filename(name)):
+            if artifact in metadata["artifacts"]:
+                verify_artifact(
+                    os.path.join(run_directory, artifact),
+                    metadata["artifacts"][artifact],
+                    metadata["checksum_algorithm"],
+                    self.verify_on_load,
+                )
+
+    def get_quarantine_directory(self) -> str:
+        return os.path.join(self.internals_directory, "quarantine")
+
+    def _get_run_entries(self) -> List[Dict[str, Any]]:
+        return self.run_index.list_entries()
+
+    def _get_run_entry(self, seed: int, num_run: int, budget: float) -> Optional[Dict[str, Any]]:
+        return self.run_index.get(seed, num_run, budget)
+
+    def _verify_run_artifact(
+        self, file_path: str, expected: Dict[str, Any], algorithm: str, mode: str
+    ) -> None:
+        verify_artifact(file_path, expected, algorithm, mode)
+
+    def _check_run(self, entry: Dict[str, Any], mode: str) -> List[str]:
+        seed, num_run, budget = RunIndex.identifier(entry)
+        run_directory = self.get_numrun_directory(seed, num_run, budget)
+        metadata_file_name = self.get_run_metadata_filename(seed, num_run, budget)
+        try:
+            metadata = self.get_run_metadata(seed, num_run, budget)
+        except ValueError:
+            return ["The metadata of %s is unreadable" % run_directory]
+        if metadata is None:
+            if metadata_file_name in entry["artifacts"]:
+                return ["The metadata of %s is missing" % run_directory]
+            # Saved without metadata
+            return []
+
+        problems = []
+        for name, expected in sorted(metadata["artifacts"].items()):
+            try:
+                self._verify_run_artifact(
+                    os.path.join(run_directory, name),
+                    expected,
+                    metadata["checksum_algorithm"],
+                    mode,
+                )
+            except CorruptArtifactError as e:
+                problems.append(str(e))
+        if len(problems) > 0 and self._get_run_entry(seed, num_run, budget) is None:
+            # The run was pruned while we were checking it
+            return []
+        return problems
+
+    def _quarantine_run(self, seed: int, num_run: int, budget: float) -> None:
+        run_directory = self.get_numrun_directory(seed, num_run, budget)
+        os.makedirs(self.get_quarantine_directory(), exist_ok=True)
+        try:
+            os.rename(
+                run_directory,
+                os.path.join(
+                    self.get_quarantine_directory(),
+                    "%s.%s" % (os.path.basename(run_directory), uuid.uuid4().hex),
+                ),
+            )
+        except FileNotFoundError:
+            pass
+        self.run_index.append(self.run_index.make_tombstone(seed, num_run, budget))
+
+    def fsck(
+        self, mode: str = "full", quarantine: bool = True, n_jobs: int = -1
+    ) -> Dict[str, List[str]]:
+        """
+        Checks all runs and stored ensembles against the sizes and checksums
+        recorded when they were saved.
+
+        Parameters
+        ----------
+        mode: str
+            "size" only compares the sizes of the files, "full" also hashes them
+        quarantine: bool
+            If True, corrupt runs are moved out of the runs directory into the
+            quarantine directory, so that they are no longer listed or loaded.
+            Corrupt ensembles are moved to the quarantine/ prefix of the storage
+        n_jobs: int
+            Number of threads checking runs in parallel, -1 means one per
+            processor, -2 one less and so on
+
+        Returns
+        -------
+        problems: Dict[str, List[str]]
+            For every corrupt run directory and ensemble, given by its path
+            relative to the internals directory, what is wrong with it
+        """
+        if mode not in VERIFY_MODES:
+            raise ValueError("Unknown verify mode %s, choose from %s" % (mode, VERIFY_MODES))
+        num_workers = _get_num_workers(n_jobs)
+        self.flush()
+
+        problems = {}  # type: Dict[str, List[str]]
+        entries = self._get_run_entries()
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            for entry, run_problems in zip(
+                entries, executor.map(functools.partial(self._check_run, mode=mode), entries)
+            ):
+                if len(run_problems) == 0:
+                    continue
+                identifier = RunIndex.identifier(entry)
+                run_directory = self.get_numrun_directory(*identifier)
+                problems[os.path.relpath(run_directory, self.internals_directory)] = run_problems
+                if quarantine:
+                    self._quarantine_run(*identifier)
+
+        for snapshot in self.ensemble_history.list_snapshots():
+            if not self.ensemble_history.is_stored(snapshot.seed, snapshot.idx):
+                continue
+            key = self._get_ensemble_key(snapshot.seed, snapshot.idx)
+            try:
+                data = self.storage.get(key)
+                self._verify_ensemble(key, data, mode)
+            except FileNotFoundError:
+                # Unless the retention policy removed it in the meantime
+                if self.ensemble_history.is_stored(snapshot.seed, snapshot.idx):
+                    problems[key] = ["%s is missing" % key]
+                continue
+            except CorruptArtifactError as e:
+                problems[key] = [str(e)]
+                if quarantine:
+                    self.storage.put_atomic("quarantine/" + key, data)
+                    self.storage.delete(key)
+                    self.ensemble_history.mark_removed(snapshot.seed, snapshot.idx)
+
+        if len(problems) > 0:
+            message = "fsck found %d corrupt runs and ensembles: %s" % (len(problems), problems)
+            if self.logger is not None:
+                self.logger.warning(message)
+            else:
+                warnings.warn(message)
+        return problems
 
     def save_numrun_to_dir(
         self,
@@ -455,30 +1344,127 @@ class Backend(object):
         ensemble_predictions: Optional[np.ndarray],
         valid_predictions: Optional[np.ndarray],
         test_predictions: Optional[np.ndarray],
-    ) -> None:
+        asynchronous: bool = False,
+    ) -> Optional["Future[Any]"]:
+        """
+        Publishes the artifacts of a run into its run directory.
+
+        The artifacts are written into a temporary directory, which is then
+        renamed to the run directory, so that readers never see a partially
+        written run.
+
+        Parameters
+        ----------
+        seed: int
+            Seed of the run
+        idx: int
+            num_run of the run
+        budget: float
+            Budget of the run
+        model: Optional[Pipeline]
+            Fitted pipeline
+        cv_model: Optional[Pipeline]
+            Fitted cross-validation pipeline
+        ensemble_predictions: Optional[np.ndarray]
+            Predictions on the data used to build the ensemble
+        valid_predictions: Optional[np.ndarray]
+            Predictions on the validation data
+        test_predictions: Optional[np.ndarray]
+            Predictions on the test data
+        asynchronous: bool
+            If True, the run is written by a background thread and a future
+            is returned right away. The models must not be modified until the
+            future is done. Blocks if too many writes are pending.
+
+        Returns
+        -------
+        future: Optional[concurrent.futures.Future]
+            The future of the write if asynchronous is True, None otherwise
+        """
+        if asynchronous:
+            # Predictions are cheap to copy, so the caller is free to reuse them
+            return self.async_writer.submit(
+                self.save_numrun_to_dir,
+                seed,
+                idx,
+                budget,
+                model,
+                cv_model,
+                *(
+                    None if preds is None else np.array(preds, copy=True)
+                    for preds in (ensemble_predictions, valid_predictions, test_predictions)
+                ),
+            )
+
         runs_directory = self.get_runs_directory()
-        tmpdir = tempfile.mkdtemp(dir=runs_directory)
+        started = time.time()
+        # The temporary directory lives outside of the runs directory, so that
+        # only the final rename modifies the runs directory (see RunIndex)
+        tmpdir = tempfile.mkdtemp(dir=self.internals_directory, prefix="tmp_run_")
+        checksums = {}  # type: Dict[str, Optional[str]]
         if model is not None:
             file_path = os.path.join(tmpdir, self.get_model_filename(seed, idx, budget))
-            with open(file_path, "wb") as fh:
-                pickle.dump(model, fh, -1)
+            checksums.update(self._save_pipeline(model, file_path))
 
         if cv_model is not None:
             file_path = os.path.join(tmpdir, self.get_cv_model_filename(seed, idx, budget))
-            with open(file_path, "wb") as fh:
-                pickle.dump(cv_model, fh, -1)
+            checksums.update(self._save_pipeline(cv_model, file_path))
 
+        predictions = {}  # type: Dict[str, Dict[str, Any]]
+        # Small files the ensemble builder reads, kept for the node-local cache
+        cached = {}  # type: Dict[str, bytes]
         for preds, subset in (
             (ensemble_predictions, "ensemble"),
             (valid_predictions, "valid"),
             (test_predictions, "test"),
         ):
             if preds is not None:
-                file_path = os.path.join(
-                    tmpdir, self.get_prediction_filename(subset, seed, idx, budget)
-                )
-                with open(file_path, "wb") as fh:
-                    pickle.dump(preds.astype(np.float32), fh, -1)
+                preds = preds.astype(np.float32)
+                file_name = self.get_prediction_filename(subset, seed, idx, budget)
+                buffer = io.BytesIO()
+                np.save(buffer, preds, allow_pickle=False)
+                data = buffer.getvalue()
+                with open(os.path.join(tmpdir, file_name), "wb") as fh:
+                    fh.write(data)
+                checksums[file_name] = checksum(data, self.checksum_algorithm)
+                predictions[subset] = array_metadata(preds)
+                if self.node_cache is not None:
+                    cached[file_name] = data
+
+        artifacts = {}  # type: Dict[str, int]
+        for artifact in os.scandir(tmpdir):
+            artifacts[artifact.name] = artifact.stat().st_size
+            if artifact.name not in checksums:
+                checksums[artifact.name] = file_checksum(artifact.path, self.checksum_algorithm)
+
+        # The metadata is published together with the artifacts it describes
+        metadata_file_name = self.get_run_metadata_filename(seed, idx, budget)
+        cached[metadata_file_name] = write_run_metadata(
+            os.path.join(tmpdir, metadata_file_name),
+            {
+                "seed": seed,
+                "num_run": idx,
+                "budget": budget,
+                "artifacts": {
+                    name: {"size": size, "checksum": checksums[name]}
+                    for name, size in artifacts.items()
+                },
+                "checksum_algorithm": self.checksum_algorithm,
+                "has_model": model is not None,
+                "has_cv_model": cv_model is not None,
+                "predictions": predictions,
+                "compression": self.compression,
+                "out_of_band_buffers": self.out_of_band_buffers,
+                "started": started,
+                "save_duration": time.time() - started,
+            },
+        )
+        artifacts[metadata_file_name] = os.path.getsize(os.path.join(tmpdir, metadata_file_name))
+        if self.fsync:
+            for name in artifacts:
+                fsync_file(os.path.join(tmpdir, name))
+            fsync_directory(tmpdir)
+
         try:
             os.rename(tmpdir, self.get_numrun_directory(seed, idx, budget))
         except OSError:
@@ -489,54 +1475,348 @@ class Backend(object):
                 )
                 os.rename(tmpdir, self.get_numrun_directory(seed, idx, budget))
                 shutil.rmtree(os.path.join(runs_directory, tmpdir + ".old"))
+        if self.fsync:
+            fsync_directory(runs_directory)
+
+        self.run_index.append(
+            self.run_index.make_entry(seed, idx, budget, artifacts=artifacts, mtime=time.time())
+        )
+        if self.consolidate_predictions:
+            # The run is published already, the stores only speed up loading
+            # predictions. Runs missing from a store are read from their .npy
+            for preds, subset in (
+                (ensemble_predictions, "ensemble"),
+                (valid_predictions, "valid"),
+                (test_predictions, "test"),
+            ):
+                if preds is None:
+                    continue
+                try:
+                    self.get_prediction_store(subset).append(
+                        (seed, idx, budget), preds.astype(np.float32)
+                    )
+                except ValueError as e:
+                    # E.g. the predictions have a different shape than the
+                    # ones already in the store
+                    if self.logger is not None:
+                        self.logger.warning(
+                            "Could not consolidate the %s predictions of run %s: %s"
+                            % (subset, (seed, idx, budget), e)
+                        )
+        run_directory = self.get_numrun_directory(seed, idx, budget)
+        self._write_through(
+            {os.path.join(run_directory, name): data for name, data in cached.items()}
+        )
+        return None
 
     def get_ensemble_dir(self) -> str:
         return os.path.join(self.internals_directory, "ensembles")
 
-    def load_ensemble(self, seed: int) -> Optional[AbstractEnsemble]:
-        ensemble_dir = self.get_ensemble_dir()
+    def get_ensemble_history_filename(self) -> str:
+        return os.path.join(self.internals_directory, "ensembles.history")
 
-        if not os.path.exists(ensemble_dir):
-            if self.logger is not None:
-                self.logger.warning("Directory %s does not exist" % ensemble_dir)
-            else:
-                warnings.warn("Directory %s does not exist" % ensemble_dir)
+    def get_ensemble_filename(self, seed: int, idx: int) -> str:
+        return os.path.join(self.internals_directory, *self._get_ensemble_key(seed, idx).split("/"))
+
+    def _get_ensemble_key(self, seed: int, idx: int) -> str:
+        return "ensembles/%s.%s.ensemble" % (str(seed), str(idx).zfill(10))
+
+    def _load_ensemble_key(self, key: str) -> AbstractEnsemble:
+        data = self.storage.get(key)
+        if self.verify_on_load is not None:
+            self._verify_ensemble(key, data, self.verify_on_load)
+        return cast(AbstractEnsemble, pickle.loads(data))
+
+    def _verify_ensemble(self, key: str, data: bytes, mode: str) -> None:
+        # Keys are ensembles/<seed>.<idx>.ensemble
+        seed, idx = os.path.basename(key).split(".")[:2]
+        snapshot = self.ensemble_history.get(int(seed), int(idx))
+        if snapshot is None or snapshot.size is None:
+            # Saved without checksum
+            return
+        verify_data(
+            data,
+            {"size": snapshot.size, "checksum": snapshot.checksum},
+            snapshot.checksum_algorithm or "none",
+            mode,
+            name=key,
+        )
+
+    def get_latest_ensemble_filename(self, seed: int = -1) -> str:
+        """
+        Returns the file pointing to the latest ensemble of the given seed, or
+        to the latest ensemble of any seed if seed is negative.
+        """
+        return os.path.join(self.internals_directory, self._get_latest_ensemble_key(seed))
+
+    def _get_latest_ensemble_key(self, seed: int) -> str:
+        if seed < 0:
+            return "ensembles.latest"
+        return "ensembles.%d.latest" % seed
+
+    def _read_latest_ensemble(self, seed: int) -> Optional[Dict[str, int]]:
+        try:
+            pointer = json.loads(self.storage.get(self._get_latest_ensemble_key(seed)))
+            pointer = {
+                "seed": int(pointer["seed"]),
+                "idx": int(pointer["idx"]),
+                "generation": int(pointer["generation"]),
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if seed >= 0 and pointer["seed"] != seed:
             return None
+        return pointer
 
-        if seed >= 0:
-            indices_files = glob.glob(
-                os.path.join(glob.escape(ensemble_dir), "%s.*.ensemble" % seed)
-            )
-            indices_files.sort()
-        else:
-            indices_files = os.listdir(ensemble_dir)
-            indices_files = [os.path.join(ensemble_dir, f) for f in indices_files]
-            indices_files.sort(key=lambda f: time.ctime(os.path.getmtime(f)))
+    def _write_latest_ensemble(self, seed: int, pointer: Dict[str, int]) -> None:
+        self.storage.put_atomic(
+            self._get_latest_ensemble_key(seed), json.dumps(pointer).encode("utf-8")
+        )
 
-        with open(indices_files[-1], "rb") as fh:
-            ensemble_members_run_numbers = cast(AbstractEnsemble, pickle.load(fh))
+    def _update_latest_ensemble(self, seed: int, idx: int) -> None:
+        # The generation is read and incremented under a lock, as ensemble
+        # builders of several seeds might save their ensembles concurrently
+        with open(os.path.join(self.internals_directory, "ensembles.lock"), "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                generation = self.get_ensemble_generation() + 1
+                pointer = {"seed": seed, "idx": idx, "generation": generation}
+                previous = self._read_latest_ensemble(seed)
+                if previous is None or previous["idx"] <= idx:
+                    self._write_latest_ensemble(seed, pointer)
+                self._write_latest_ensemble(-1, pointer)
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def get_ensemble_generation(self, seed: int = -1) -> int:
+        """
+        Returns a counter which increases whenever the latest ensemble of the
+        given seed (of any seed if seed is negative) changes, 0 if no ensemble
+        was saved yet. Comparing it is a cheap way to poll for new ensembles.
+        """
+        pointer = self._read_latest_ensemble(seed)
+        return 0 if pointer is None else pointer["generation"]
+
+    def load_ensemble(self, seed: int) -> Optional[AbstractEnsemble]:
+        pointer = self._read_latest_ensemble(seed)
+        if pointer is not None:
+            try:
+                key = self._get_ensemble_key(pointer["seed"], pointer["idx"])
+                return self._load_ensemble_key(key)
+            except FileNotFoundError:
+                # The pointer is stale, e.g. the ensemble was removed by hand
+                pass
+
+        # Ensembles saved before the latest pointer existed are found by listing
+        # the storage. Ensembles which are no longer the latest ones might be
+        # removed while we are looking for the latest one, so we retry
+        for attempt in range(3):
+            try:
+                if seed >= 0:
+                    keys = self.storage.list_prefix("ensembles/%s." % seed)
+                else:
+                    keys = self.storage.list_prefix("ensembles/")
+                keys = [key for key in keys if key.endswith(".ensemble")]
+                if len(keys) == 0:
+                    message = "No ensemble found in %s" % self.get_ensemble_dir()
+                    if self.logger is not None:
+                        self.logger.warning(message)
+                    else:
+                        warnings.warn(message)
+                    return None
+                if seed < 0:
+                    keys.sort(key=lambda key: (self.storage.stat(key).mtime, key))
+
+                ensemble_members_run_numbers = self._load_ensemble_key(keys[-1])
+                break
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
 
         return ensemble_members_run_numbers
 
-    def save_ensemble(self, ensemble: AbstractEnsemble, idx: int, seed: int) -> None:
+    def load_ensemble_by_idx(self, seed: int, idx: int) -> Optional[AbstractEnsemble]:
+        """
+        Loads the full ensemble object saved with the given seed and index.
+
+        Returns None if the object is no longer stored, i.e. if the ensemble
+        was neither a checkpoint nor the latest one or if it was removed by the
+        retention policy. Its snapshot is available through load_ensemble_snapshot.
+        """
+        if not self.ensemble_history.is_stored(seed, idx):
+            return None
         try:
-            os.makedirs(self.get_ensemble_dir())
+            return self._load_ensemble_key(self._get_ensemble_key(seed, idx))
+        except FileNotFoundError:
+            return None
+
+    def load_ensemble_snapshot(self, seed: int, idx: int) -> Optional[EnsembleSnapshot]:
+        """
+        Returns the snapshot (identifiers, weights and validation performance)
+        of the ensemble saved with the given seed and index, None if there is none.
+        """
+        return self.ensemble_history.get(seed, idx)
+
+    def get_ensemble_history(self, seed: Optional[int] = None) -> List[EnsembleSnapshot]:
+        """
+        Returns the snapshots of all saved ensembles, sorted by seed and index.
+        """
+        return self.ensemble_history.list_snapshots(seed)
+
+    def _make_ensemble_snapshot(
+        self, ensemble: AbstractEnsemble, idx: int, seed: int
+    ) -> EnsembleSnapshot:
+        identifiers = [
+            (int(_seed), int(num_run), float(budget))
+            for _seed, num_run, budget in ensemble.get_selected_model_identifiers()
+        ]
+        # Identifiers stand in for the models, so that no model has to be loaded
+        models = {identifier: identifier for identifier in identifiers}  # type: Dict[Any, Any]
+        try:
+            weights_by_identifier = {
+                identifier: float(weight)
+                for weight, identifier in ensemble.get_models_with_weights(models)
+            }  # type: Optional[Dict[PIPELINE_IDENTIFIER_TYPE, float]]
         except Exception:
-            pass
+            weights_by_identifier = None
+        try:
+            validation_performance = float(
+                ensemble.get_validation_performance()
+            )  # type: Optional[float]
+        except Exception:
+            validation_performance = None
+
+        return EnsembleSnapshot(
+            seed=seed,
+            idx=idx,
+            identifiers=identifiers,
+            weights=(
+                None
+                if weights_by_identifier is None
+                else [weights_by_identifier.get(identifier, 0.0) for identifier in identifiers]
+            ),
+            validation_performance=validation_performance,
+            checkpoint=idx % self.ensemble_checkpoint_interval == 0,
+            time=time.time(),
+        )
 
-        filepath = os.path.join(
-            self.get_ensemble_dir(), "%s.%s.ensemble" % (str(seed), str(idx).zfill(10))
+    def save_ensemble(self, ensemble: AbstractEnsemble, idx: int, seed: int) -> None:
+        data = pickle.dumps(ensemble)
+        self.storage.put_atomic(self._get_ensemble_key(seed, idx), data)
+
+        snapshot = self._make_ensemble_snapshot(ensemble, idx, seed)._replace(
+            size=len(data),
+            checksum=checksum(data, self.checksum_algorithm),
+            checksum_algorithm=self.checksum_algorithm,
         )
-        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(filepath), delete=False) as fh:
-            pickle.dump(ensemble, fh)
-            tempname = fh.name
-        os.rename(tempname, filepath)
+        # Watchers are woken by the history, so it is appended once the
+        # ensemble is stored
+        self.ensemble_history.add_snapshot(snapshot)
+        self._update_latest_ensemble(seed, idx)
+        # Only the latest ensemble and the retained checkpoints are kept in full
+        for removable_idx in self.ensemble_history.select_removable(seed, self.ensemble_retention):
+            self.storage.delete(self._get_ensemble_key(seed, removable_idx))
+            self.ensemble_history.mark_removed(seed, removable_idx)
 
     def get_prediction_filename(
         self, subset: str, automl_seed: Union[str, int], idx: int, budget: float
     ) -> str:
         return "predictions_%s_%s_%s_%s.npy" % (subset, automl_seed, idx, budget)
 
+    def get_prediction_store_dir(self) -> str:
+        return os.path.join(self.internals_directory, "predictions")
+
+    def get_prediction_store(self, subset: str) -> PredictionStore:
+        if subset not in self._prediction_stores:
+            self._prediction_stores[subset] = PredictionStore(
+                os.path.join(self.get_prediction_store_dir(), subset)
+            )
+        return self._prediction_stores[subset]
+
+    def load_predictions_by_identifiers(
+        self, subset: str, identifiers: List[PIPELINE_IDENTIFIER_TYPE]
+    ) -> np.ndarray:
+        """
+        Loads the predictions of several runs on a subset as a single array,
+        as expected by AbstractEnsemble.fit.
+
+        The predictions are read from the consolidated prediction store of the
+        subset. Runs that are not part of it (for example because they were
+        saved without consolidate_predictions) are read from their run directory.
+
+        Parameters
+        ----------
+        subset: str
+            One of ensemble, valid or test
+        identifiers: List[Tuple[int, int, float]]
+            (seed, num_run, budget) of the runs
+
+        Returns
+        -------
+        predictions: array of shape = [n_identifiers, n_data_points, n_targets]
+        """
+        if len(identifiers) == 0:
+            # Also if nothing was stored yet, which leaves the shape unknown
+            return np.empty((0,))
+        store = self.get_prediction_store(subset)
+        if all(identifier in store for identifier in identifiers):
+            return store.get(identifiers)
+        return cast(
+            np.ndarray,
+            np.stack(
+                [
+                    self.load_predictions(subset, seed, idx, budget)
+                    for seed, idx, budget in identifiers
+                ]
+            ),
+        )
+
+    def load_predictions(
+        self, subset: str, seed: int, idx: int, budget: float, mmap: bool = True
+    ) -> np.ndarray:
+        """
+        Loads the predictions of a run on a given subset.
+
+        Parameters
+        ----------
+        subset: str
+            One of ensemble, valid or test
+        seed: int
+            Seed of the run
+        idx: int
+            num_run of the run
+        budget: float
+            Budget of the run
+        mmap: bool
+            If True, a read-only memory-mapped view of the file is returned,
+            so that the predictions are only paged in when accessed.
+
+        Returns
+        -------
+        predictions: np.ndarray
+            The predictions as stored by save_numrun_to_dir
+        """
+        file_path = os.path.join(
+            self.get_numrun_directory(seed, idx, budget),
+            self.get_prediction_filename(subset, seed, idx, budget),
+        )
+        self._verify_artifact(file_path)
+        return self._read_cached(
+            file_path, functools.partial(self._load_predictions_file, mmap=mmap)
+        )
+
+    @staticmethod
+    def _load_predictions_file(file_path: str, mmap: bool) -> np.ndarray:
+        with open(file_path, "rb") as fh:
+            magic = fh.read(len(np.lib.format.MAGIC_PREFIX))
+            if magic != np.lib.format.MAGIC_PREFIX:
+                # Predictions used to be pickled into a file with a .npy suffix
+                fh.seek(0)
+                return cast(np.ndarray, pickle.load(fh))
+        if mmap:
+            return cast(np.ndarray, np.load(file_path, mmap_mode="r", allow_pickle=False))
+        return cast(np.ndarray, np.load(file_path, allow_pickle=False))
+
     def save_predictions_as_txt(
         self,
         predictions: np.ndarray,
@@ -544,7 +1824,32 @@ class Backend(object):
         idx: int,
         precision: int,
         prefix: Optional[str] = None,
+        binary_sidecar: bool = False,
+        block_size: int = 10000,
     ) -> None:
+        """
+        Writes predictions to the output directory as text, one row per line
+        and every value formatted as "{:.<precision>g} ".
+
+        Parameters
+        ----------
+        predictions: np.ndarray
+            Predictions of shape [n_data_points] or [n_data_points, n_targets],
+            or nested lists of the same shape
+        subset: str
+            Name of the subset the predictions were made on
+        idx: int
+            Identifier of the predictions, part of the file name
+        precision: int
+            Number of significant digits of each value
+        prefix: Optional[str]
+            Prefix of the file name
+        binary_sidecar: bool
+            If True, the predictions are also saved in the .npy format next
+            to the text file, which is much faster to read back
+        block_size: int
+            Number of rows formatted at once, bounds the memory of the formatted text
+        """
         if not self.output_directory:
             return
         # Write prediction scores in prescribed format
@@ -552,20 +1857,45 @@ class Backend(object):
             self.output_directory,
             ("%s_" % prefix if prefix else "") + "%s_%s.predict" % (subset, str(idx)),
         )
+        try:
+            predictions = np.asarray(predictions)
+        except ValueError:
+            # Rows of different lengths are written one by one
+            predictions = np.asarray(predictions, dtype=object)
 
-        format_string = "{:.%dg} " % precision
         with tempfile.NamedTemporaryFile(
             "w", dir=os.path.dirname(filepath), delete=False
         ) as output_file:
-            for row in predictions:
-                if not isinstance(row, np.ndarray) and not isinstance(row, list):
-                    row = [row]
-                for val in row:
-                    output_file.write(format_string.format(float(val)))
-                output_file.write("\n")
+            if predictions.ndim in (1, 2) and predictions.dtype.kind in "biuf":
+                # Format whole blocks of rows with a single %-formatting call,
+                # "%.<precision>g" formats floats exactly like "{:.<precision>g}"
+                values = predictions if predictions.ndim == 2 else predictions[:, np.newaxis]
+                row_format = "%%.%dg " % precision * values.shape[1] + "\n"
+                for start in range(0, values.shape[0], block_size):
+                    stop = start + block_size
+                    block = values[start:stop]
+                    output_file.write(
+                        row_format * block.shape[0] % tuple(block.astype(float).ravel().tolist())
+                    )
+            else:
+                format_string = "{:.%dg} " % precision
+                for row in predictions:
+                    if not isinstance(row, np.ndarray) and not isinstance(row, list):
+                        row = [row]
+                    for val in row:
+                        output_file.write(format_string.format(float(val)))
+                    output_file.write("\n")
             tempname = output_file.name
         os.rename(tempname, filepath)
 
+        if binary_sidecar:
+            with tempfile.NamedTemporaryFile(
+                "wb", dir=os.path.dirname(filepath), delete=False
+            ) as fh:
+                np.save(fh, predictions, allow_pickle=False)
+                tempname = fh.name
+            os.rename(tempname, filepath + ".npy")
+
     def write_txt_file(self, filepath: str, data: str, name: str) -> None:
         with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(filepath), delete=False) as fh:
             fh.write(data)
@@ -573,3 +1903,341 @@ class Backend(object):
         os.rename(tempname, filepath)
         if self.logger is not None:
             self.logger.debug("Created %s file %s" % (name, filepath))
+
+    def export_archive(
+        self,
+        path: str,
+        include: Sequence[str] = ARCHIVE_CONTENTS,
+        compression: str = "none",
+    ) -> str:
+        """
+        Packs the content of the backend into a single archive file, which
+        can be copied around as a whole and opened with Backend.open_archive.
+
+        Parameters
+        ----------
+        path: str
+            File to write the archive to. It is written to a temporary file
+            first and only appears once complete
+        include: Sequence[str]
+            What to pack, any of "models", "predictions", "ensembles",
+            "metadata" (run metadata, start times and ensemble targets) and
+            "datamanager"
+        compression: str
+            Codec used for the pickles and json files, one of
+            compression.available_codecs(). Predictions and out-of-band buffers
+            are never compressed, so that they can be memory-mapped from the
+            archive
+
+        Returns
+        -------
+        path: str
+            The path of the archive
+        """
+        unknown = set(include) - set(ARCHIVE_CONTENTS)
+        if len(unknown) > 0:
+            raise ValueError(
+                "Unknown archive contents %s, choose from %s" % (sorted(unknown), ARCHIVE_CONTENTS)
+            )
+        check_codec(compression)
+        self.flush()
+
+        def category(name: str) -> str:
+            if is_model_artifact(name):
+                return "models"
+            if is_prediction_artifact(name):
+                return "predictions"
+            return "metadata"
+
+        keys = []  # type: List[str]
+        if "metadata" in include:
+            keys.extend(self.storage.list_prefix("start_time_"))
+            keys.append(self._get_targets_ensemble_key())
+            keys.append(self._get_targets_ensemble_digest_key())
+        if "datamanager" in include:
+            keys.append("datamanager.pkl")
+        if "ensembles" in include:
+            keys.extend(self.storage.list_prefix("ensembles/"))
+            seeds = set(snapshot.seed for snapshot in self.ensemble_history.list_snapshots())
+            keys.extend(self._get_latest_ensemble_key(seed) for seed in [-1] + sorted(seeds))
+
+        with ArchiveWriter(path) as writer:
+            for key in keys:
+                try:
+                    mtime = self.storage.stat(key).mtime
+                    data = self.storage.get(key)
+                except FileNotFoundError:
+                    continue
+                codec = "none" if key.endswith(".npy") else compression
+                writer.add(key, data, codec, mtime=mtime)
+
+            if "ensembles" in include:
+                # The history lives next to the storage
+                try:
+                    writer.add_file(
+                        "ensembles.history", self.get_ensemble_history_filename(), compression
+                    )
+                except FileNotFoundError:
+                    pass
+
+            entries = []
+            for entry in self.run_index.list_entries():
+                run_dir = self.get_numrun_directory(
+                    entry["seed"], entry["num_run"], entry["budget"]
+                )
+                artifacts = {}
+                for name, size in sorted(entry["artifacts"].items()):
+                    if category(name) not in include:
+                        continue
+                    codec = (
+                        "none"
+                        if category(name) == "predictions" or name.endswith(".buffers")
+                        else compression
+                    )
+                    try:
+                        writer.add_file(
+                            "runs/%s/%s" % (os.path.basename(run_dir), name),
+                            os.path.join(run_dir, name),
+                            codec,
+                        )
+                    except FileNotFoundError:
+                        # The run was pruned while exporting
+                        continue
+                    artifacts[name] = size
+                if len(artifacts) > 0:
+                    entries.append(dict(entry, artifacts=artifacts))
+            writer.add(
+                "runs.index",
+                "".join(json.dumps(entry, sort_keys=True) + "\n" for entry in entries).encode(
+                    "utf-8"
+                ),
+            )
+        return path
+
+    @staticmethod
+    def open_archive(path: str) -> "ArchiveBackend":
+        """Opens an archive written by export_archive as a read-only backend."""
+        return ArchiveBackend(path)
+
+
+class _ReadOnlyPart(object):
+    """Stands in for the parts of a Backend which only exist to write runs.
+
+    Any use of it raises the same ValueError as the writing methods of an
+    ArchiveBackend, instead of an AttributeError.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        raise ValueError("Archive %s is read-only" % self.__dict__.get("path"))
+
+
+class ArchiveBackend(Backend):
+    """Read-only Backend serving an archive written by Backend.export_archive.
+
+    The archive is memory-mapped. Predictions and out-of-band model buffers
+    are served as views of the mapping, so only the parts which are accessed
+    are read from disk, and models, ensembles and metadata are read from the
+    archive index without listing any directory. All methods writing to the
+    backend raise a ValueError, fsck can only check the archive with
+    quarantine=False.
+    """
+
+    def __init__(self, path: str):
+        self.logger = None
+        self.prefix = ""
+        self.active_num_run = 1
+        # Files of the backend are addressed by their path relative to the
+        # internals directory, which is the archive itself
+        self.internals_directory = path
+        self.archive = ArchiveReader(path)
+        self.storage = ArchiveStorage(self.archive)
+        read_only = cast(Any, _ReadOnlyPart(path))
+        self.context = read_only
+        self.run_index = read_only
+        self.num_run_allocator = read_only
+        self.async_writer = read_only
+        self._prediction_stores = {}
+        self.checksum_algorithm = CHECKSUM_ALGORITHM
+        self.fsync = False
+        self.consolidate_predictions = False
+        self.compression = "none"
+        self.out_of_band_buffers = False
+        self.ensemble_checkpoint_interval = 1
+        self.ensemble_retention = EnsembleRetentionPolicy()
+        self.ensemble_history = EnsembleHistory(None)
+        if "ensembles.history" in self.archive:
+            self.ensemble_history.apply_events(self.archive.read("ensembles.history"))
+        self._run_entries = {}  # type: Dict[PIPELINE_IDENTIFIER_TYPE, Dict[str, Any]]
+        for line in self.archive.read("runs.index").splitlines():
+            entry = json.loads(line.decode("utf-8"))
+            identifier = RunIndex.identifier(entry)
+            self._run_entries[identifier] = entry
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.archive.close()
+
+    def flush(self) -> None:
+        pass
+
+    @property
+    def output_directory(self) -> Optional[str]:
+        return None
+
+    @property
+    def temporary_directory(self) -> str:
+        return os.path.dirname(self.internals_directory)
+
+    def _read_only(self) -> NoReturn:
+        raise ValueError("Archive %s is read-only" % self.internals_directory)
+
+    def setup_logger(self, port: int) -> None:
+        self.logger = get_named_client_logger(name=__name__, port=port)
+
+    def _get_archive_name(self, file_path: str) -> str:
+        return os.path.relpath(file_path, self.internals_directory).replace(os.sep, "/")
+
+    def list_runs(self, seed: Optional[int] = None) -> List[PIPELINE_IDENTIFIER_TYPE]:
+        return [
+            identifier
+            for identifier in sorted(self._run_entries)
+            if seed is None or identifier[0] == seed
+        ]
+
+    def _get_run_entries(self) -> List[Dict[str, Any]]:
+        return [self._run_entries[identifier] for identifier in self.list_runs()]
+
+    def _get_run_entry(self, seed: int, num_run: int, budget: float) -> Optional[Dict[str, Any]]:
+        return self._run_entries.get((seed, num_run, budget))
+
+    def _verify_run_artifact(
+        self, file_path: str, expected: Dict[str, Any], algorithm: str, mode: str
+    ) -> None:
+        name = self._get_archive_name(file_path)
+        if name not in self.archive:
+            raise CorruptArtifactError("%s is missing" % file_path)
+        verify_data(self.archive.read(name), expected, algorithm, mode, name=file_path)
+
+    def list_all_models(self, seed: int) -> List[str]:
+        model_files = []
+        for _seed, idx, budget in self.list_runs(seed):
+            model_file_name = self.get_model_filename(seed, idx, budget)
+            if model_file_name in self._run_entries[(_seed, idx, budget)]["artifacts"]:
+                model_files.append(
+                    os.path.join(self.get_numrun_directory(seed, idx, budget), model_file_name)
+                )
+        return model_files
+
+    def _load_sized_pipeline(self, model_file_path: str) -> LoadedModel:
+        name = self._get_archive_name(model_file_path)
+        buffers_name = get_buffers_filename(name)
+        side_file = self.archive.view(buffers_name) if buffers_name in self.archive else None
+        with self.archive.open(name) as fh:
+            return LoadedModel(
+                *load_out_of_band_with_size(fh, model_file_path, side_file=side_file)
+            )
+
+    def get_run_metadata(self, seed: int, idx: int, budget: float) -> Optional[Dict[str, Any]]:
+        name = self._get_archive_name(
+            os.path.join(
+                self.get_numrun_directory(seed, idx, budget),
+                self.get_run_metadata_filename(seed, idx, budget),
+            )
+        )
+        if name not in self.archive:
+            return None
+        return cast(Dict[str, Any], json.loads(self.archive.read(name).decode("utf-8")))
+
+    def load_predictions_by_identifiers(
+        self, subset: str, identifiers: List[PIPELINE_IDENTIFIER_TYPE]
+    ) -> np.ndarray:
+        if len(identifiers) == 0:
+            return np.empty((0,))
+        return cast(
+            np.ndarray,
+            np.stack(
+                [
+                    self.load_predictions(subset, seed, idx, budget)
+                    for seed, idx, budget in identifiers
+                ]
+            ),
+        )
+
+    def load_predictions(
+        self, subset: str, seed: int, idx: int, budget: float, mmap: bool = True
+    ) -> np.ndarray:
+        name = self._get_archive_name(
+            os.path.join(
+                self.get_numrun_directory(seed, idx, budget),
+                self.get_prediction_filename(subset, seed, idx, budget),
+            )
+        )
+        predictions = self.archive.load_array(name)
+        return predictions if mmap else np.array(predictions)
+
+    def watch(self, *args: Any, **kwargs: Any) -> NoReturn:
+        raise ValueError("Archive %s does not change and can not be watched" % self.archive.path)
+
+    def save_start_time(self, *args: Any, **kwargs: Any) -> NoReturn:
+        self._read_only()
+
+    def save_targets_ensemble(self, *args: Any, **kwargs: Any) -> NoReturn:
+        self._read_only()
+
+    def load_targets_ensemble(self, mmap: bool = False) -> np.ndarray:
+        targets = self.archive.load_array(self._get_targets_ensemble_key())
+        return targets if mmap else np.array(targets)
+
+    def save_datamanager(self, *args: Any, **kwargs: Any) -> NoReturn:
+        self._read_only()
+
+    def get_next_num_run(self, *args: Any, **kwargs: Any) -> NoReturn:
+        self._read_only()
+
+    def save_numrun_to_dir(self, *args: Any, **kwargs: Any) -> NoReturn:
+        self._read_only()
+
+    def save_ensemble(self, *args: Any, **kwargs: Any) -> NoReturn:
+        self._read_only()
+
+    def save_predictions_as_txt(self, *args: Any, **kwargs: Any) -> NoReturn:
+        self._read_only()
+
+    def write_txt_file(self, *args: Any, **kwargs: Any) -> NoReturn:
+        self._read_only()
+
+    def get_prediction_store(self, subset: str) -> NoReturn:
+        raise ValueError(
+            "Archive %s keeps the predictions of every run and has no prediction stores"
+            % self.internals_directory
+        )
+
+    def prune_runs(self, *args: Any, **kwargs: Any) -> NoReturn:
+        self._read_only()
+
+    def start_pruning(self, *args: Any, **kwargs: Any) -> NoReturn:
+        self._read_only()
+
+    def export_archive(self, *args: Any, **kwargs: Any) -> NoReturn:
+        self._read_only()
+
+    def fsck(
+        self, mode: str = "full", quarantine: bool = True, n_jobs: int = -1
+    ) -> Dict[str, List[str]]:
+        """Checks the archive like Backend.fsck. Corrupt runs and ensembles can
+        only be reported, not quarantined, so quarantine must be False."""
+        if quarantine:
+            self._read_only()
+        return super().fsck(mode, quarantine=False, n_jobs=n_jobs)
@@ -0,0 +1,223 @@
+import io
+import lzma
+import pickle
+import zlib
+from typing import Any, BinaryIO, Callable, Dict, List, Tuple, cast
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+__all__ = [
+    "available_codecs",
+    "check_codec",
+    "compressed_dump",
+    "compressed_load",
+    "open_compressed_reader",
+    "open_compressed_writer",
+    "read_codec",
+]
+
+
+# Compressed files start with MAGIC, a format version and the name of the codec.
+# Uncompressed files are plain pickles, which start with the pickle PROTO opcode
+MAGIC = b"AMLC"
+VERSION = 1
+
+CODEC_TYPE = Tuple[Callable[[BinaryIO, int], BinaryIO], Callable[[BinaryIO], BinaryIO], int]
+
+
+class _CompressingWriter(io.RawIOBase):
+    """Write-only file object feeding a zlib-style compressor into a file."""
+
+    def __init__(self, fh: BinaryIO, compressor: Any):
+        self._fh = fh
+        self._compressor = compressor
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        self._fh.write(self._compressor.compress(data))
+        return memoryview(data).nbytes
+
+    def close(self) -> None:
+        if not self.closed:
+            self._fh.write(self._compressor.flush())
+        super().close()
+
+
+class _DecompressingReader(io.RawIOBase):
+    """Read-only file object decompressing a zlib-style stream from a file."""
+
+    def __init__(self, fh: BinaryIO, decompressor: Any, chunk_size: int = 2**20):
+        self._fh = fh
+        self._decompressor = decompressor
+        self._chunk_size = chunk_size
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        while len(self._buffer) == 0 and not self._decompressor.eof:
+            chunk = self._fh.read(self._chunk_size)
+            if len(chunk) == 0:
+                raise EOFError("Compressed file ended before the end-of-stream marker")
+            self._buffer = self._decompressor.decompress(chunk)
+        n = min(len(buffer), len(self._buffer))
+        buffer[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def _zlib_writer(fh: BinaryIO, level: int) -> BinaryIO:
+    return cast(BinaryIO, io.BufferedWriter(_CompressingWriter(fh, zlib.compressobj(level))))
+
+
+def _zlib_reader(fh: BinaryIO) -> BinaryIO:
+    return cast(BinaryIO, io.BufferedReader(_DecompressingReader(fh, zlib.decompressobj())))
+
+
+def _lzma_writer(fh: BinaryIO, level: int) -> BinaryIO:
+    return cast(BinaryIO, lzma.LZMAFile(fh, "wb", preset=level))
+
+
+def _lzma_reader(fh: BinaryIO) -> BinaryIO:
+    return cast(BinaryIO, lzma.LZMAFile(fh, "rb"))
+
+
+def _zstd_writer(fh: BinaryIO, level: int) -> BinaryIO:
+    compressor = zstandard.ZstdCompressor(level=level)
+    return cast(BinaryIO, compressor.stream_writer(fh, closefd=False))
+
+
+def _zstd_reader(fh: BinaryIO) -> BinaryIO:
+    reader = zstandard.ZstdDecompressor().stream_reader(fh, closefd=False)
+    return cast(BinaryIO, io.BufferedReader(reader))
+
+
+def _lz4_writer(fh: BinaryIO, level: int) -> BinaryIO:
+    return cast(BinaryIO, lz4.frame.LZ4FrameFile(fh, "wb", compression_level=level))
+
+
+def _lz4_reader(fh: BinaryIO) -> BinaryIO:
+    return cast(BinaryIO, lz4.frame.LZ4FrameFile(fh, "rb"))
+
+
+# name -> (writer, reader, default level)
+_CODECS: Dict[str, CODEC_TYPE] = {
+    "zlib": (_zlib_writer, _zlib_reader, 6),
+    "lzma": (_lzma_writer, _lzma_reader, 6),
+}
+if zstandard is not None:
+    _CODECS["zstd"] = (_zstd_writer, _zstd_reader, 3)
+if lz4 is not None:
+    _CODECS["lz4"] = (_lz4_writer, _lz4_reader, 0)
+
+
+def available_codecs() -> List[str]:
+    """
+    Returns the names of the codecs usable in this environment. zstd and lz4
+    are only available if the zstandard and lz4 packages are installed.
+    """
+    return ["none"] + sorted(_CODECS)
+
+
+def check_codec(codec: str) -> None:
+    if codec != "none" and codec not in _CODECS:
+        raise ValueError(
+            "Unknown or unavailable compression codec %s, choose one of %s"
+            % (codec, available_codecs())
+        )
+
+
+class _Uncloseable(io.RawIOBase):
+    """Passes writes through to a file, without closing it on close."""
+
+    def __init__(self, fh: BinaryIO):
+        self._fh = fh
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        return self._fh.write(data)
+
+
+def open_compressed_writer(fh: BinaryIO, codec: str = "none") -> BinaryIO:
+    """
+    Writes the header of the given codec into fh and returns a stream which
+    compresses everything written to it into fh. Closing the stream finishes
+    the compressed data but leaves fh open.
+    """
+    check_codec(codec)
+    if codec == "none":
+        return cast(BinaryIO, _Uncloseable(fh))
+
+    name = codec.encode("ascii")
+    fh.write(MAGIC + bytes([VERSION, len(name)]) + name)
+    writer, _, level = _CODECS[codec]
+    return writer(fh, level)
+
+
+def open_compressed_reader(fh: BinaryIO) -> BinaryIO:
+    """
+    Reads the header of a file written through open_compressed_writer and
+    returns a stream of the decompressed data.
+    """
+    codec = read_codec(fh)
+    if codec == "none":
+        return fh
+    _, reader, _ = _CODECS[codec]
+    return reader(fh)
+
+
+def compressed_dump(obj: Any, fh: BinaryIO, codec: str = "none") -> None:
+    """
+    Pickles obj into the binary file fh, compressed with the given codec.
+
+    Parameters
+    ----------
+    obj: Any
+        Object to pickle
+    fh: BinaryIO
+        File opened for writing in binary mode
+    codec: str
+        One of available_codecs(). With none, a plain pickle is written
+    """
+    stream = open_compressed_writer(fh, codec)
+    pickle.dump(obj, stream, -1)
+    stream.close()
+
+
+def read_codec(fh: BinaryIO) -> str:
+    """
+    Reads the header of a file written by compressed_dump and returns its codec. The file
+    is positioned at the start of the (compressed) pickle afterwards.
+    """
+    start = fh.tell()
+    if fh.read(len(MAGIC)) != MAGIC:
+        fh.seek(start)
+        return "none"
+    version, length = fh.read(2)
+    if version != VERSION:
+        raise ValueError("Unsupported compressed file format version %d" % version)
+    codec = fh.read(length).decode("ascii")
+    check_codec(codec)
+    return codec
+
+
+def compressed_load(fh: BinaryIO) -> Any:
+    """
+    Unpickles an object written by compressed_dump, detecting its codec from the file header.
+    Plain pickles are read as well.
+    """
+    return pickle.load(open_compressed_reader(fh))
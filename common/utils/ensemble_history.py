@@ -0,0 +1,178 @@
+import json
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+
+__all__ = ["EnsembleHistory", "EnsembleRetentionPolicy", "EnsembleSnapshot"]
+
+
+class EnsembleSnapshot(NamedTuple):
+    """Compact record of one ensemble built by the ensemble builder."""
+
+    seed: int
+    idx: int
+    identifiers: List[Tuple[int, int, float]]
+    # Weight of each identifier, None if the ensemble does not expose its weights
+    weights: Optional[List[float]]
+    validation_performance: Optional[float]
+    # Checkpoints keep their full ensemble object until a retention policy removes it
+    checkpoint: bool
+    time: float
+    # Size and checksum of the pickled ensemble object, None for ensembles
+    # saved by older versions or without checksums
+    size: Optional[int] = None
+    checksum: Optional[str] = None
+    checksum_algorithm: Optional[str] = None
+
+
+class EnsembleRetentionPolicy(NamedTuple):
+    """Which checkpointed ensemble objects to keep on disk.
+
+    A checkpoint is kept if it is among the keep_last most recent checkpoints
+    or among the keep_best checkpoints with the best validation performance.
+    The latest ensemble is always kept. If both are None, everything is kept.
+    """
+
+    keep_last: Optional[int] = None
+    keep_best: Optional[int] = None
+    greater_is_better: bool = True
+
+
+class EnsembleHistory(object):
+    """Append-only history of the ensembles saved through a Backend.
+
+    Every line of the history file is a json event, either the snapshot of
+    a saved ensemble or the removal of the full ensemble object of a
+    snapshot. Snapshots are kept in memory, keyed by (seed, idx), and new
+    events are read incrementally, so that any snapshot can be looked up
+    without touching the ensemble objects.
+
+    With path None, the history is read-only and only holds the events
+    passed to apply_events.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._snapshots: Dict[Tuple[int, int], EnsembleSnapshot] = {}
+        # Snapshots whose full ensemble object is still stored
+        self._stored: Set[Tuple[int, int]] = set()
+        self._latest: Dict[int, int] = {}
+        self._offset = 0
+
+    def _append(self, event: Dict[str, Any]) -> None:
+        if self.path is None:
+            raise ValueError("The ensemble history is read-only")
+        line = (json.dumps(event) + "\n").encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def _apply(self, event: Dict[str, Any]) -> None:
+        key = (int(event["seed"]), int(event["idx"]))
+        if event["type"] == "snapshot":
+            self._snapshots[key] = EnsembleSnapshot(
+                seed=key[0],
+                idx=key[1],
+                identifiers=[
+                    (int(seed), int(num_run), float(budget))
+                    for seed, num_run, budget in event["identifiers"]
+                ],
+                weights=event["weights"],
+                validation_performance=event["validation_performance"],
+                checkpoint=event["checkpoint"],
+                time=event["time"],
+                size=event.get("size"),
+                checksum=event.get("checksum"),
+                checksum_algorithm=event.get("checksum_algorithm"),
+            )
+            self._stored.add(key)
+            self._latest[key[0]] = max(self._latest.get(key[0], key[1]), key[1])
+        elif event["type"] == "removed":
+            self._stored.discard(key)
+
+    def refresh(self) -> None:
+        if self.path is None:
+            return
+        try:
+            with open(self.path, "rb") as fh:
+                fh.seek(self._offset)
+                data = fh.read()
+        except FileNotFoundError:
+            return
+        self._offset += self.apply_events(data)
+
+    def apply_events(self, data: bytes) -> int:
+        """
+        Applies the complete lines of data, which were read from a history
+        file, and returns their length in bytes.
+        """
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            self._apply(json.loads(line.decode("utf-8")))
+        return end
+
+    def add_snapshot(self, snapshot: EnsembleSnapshot) -> None:
+        event = dict(snapshot._asdict(), type="snapshot")
+        self._append(event)
+        self.refresh()
+
+    def mark_removed(self, seed: int, idx: int) -> None:
+        self._append({"type": "removed", "seed": seed, "idx": idx})
+        self.refresh()
+
+    def get(self, seed: int, idx: int) -> Optional[EnsembleSnapshot]:
+        self.refresh()
+        return self._snapshots.get((seed, idx))
+
+    def is_stored(self, seed: int, idx: int) -> bool:
+        self.refresh()
+        return (seed, idx) in self._stored
+
+    def latest(self, seed: int) -> Optional[EnsembleSnapshot]:
+        self.refresh()
+        if seed not in self._latest:
+            return None
+        return self._snapshots[(seed, self._latest[seed])]
+
+    def list_snapshots(self, seed: Optional[int] = None) -> List[EnsembleSnapshot]:
+        self.refresh()
+        return [
+            self._snapshots[key]
+            for key in sorted(self._snapshots)
+            if seed is None or key[0] == seed
+        ]
+
+    def select_removable(self, seed: int, policy: EnsembleRetentionPolicy) -> List[int]:
+        """
+        Returns the indices of the stored ensemble objects of a seed that are
+        not retained by the policy. Apart from the latest ensemble, only
+        checkpoints are retained.
+        """
+        self.refresh()
+        latest = self._latest.get(seed)
+        stored = [
+            self._snapshots[key]
+            for key in sorted(self._stored)
+            if key[0] == seed and key[1] != latest
+        ]
+        checkpoints = [snapshot for snapshot in stored if snapshot.checkpoint]
+
+        if policy.keep_last is None and policy.keep_best is None:
+            retained = set(snapshot.idx for snapshot in checkpoints)
+        else:
+            retained = set()
+            if policy.keep_last is not None:
+                start = max(len(checkpoints) - policy.keep_last, 0)
+                retained.update(snapshot.idx for snapshot in checkpoints[start:])
+            if policy.keep_best is not None:
+                scored = [
+                    (snapshot.validation_performance, snapshot.idx)
+                    for snapshot in checkpoints
+                    if snapshot.validation_performance is not None
+                ]
+                scored.sort(reverse=policy.greater_is_better)
+                n_best = policy.keep_best
+                retained.update(idx for _, idx in scored[:n_best])
+        return [snapshot.idx for snapshot in stored if snapshot.idx not in retained]
@@ -0,0 +1,242 @@
+import platform
+import struct
+import sys
+from typing import Callable, Optional, Union
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8
+    shared_memory = None  # type: ignore[assignment]
+
+
+__all__ = ["LogRing", "supports_log_rings"]
+
+
+# A ring starts with the positions of the producer (head) and the consumer
+# (tail), each on its own cache line, and the flag the consumer sets when it
+# waits for a notification. Positions count the bytes written and consumed
+# since the ring was created. Each position is preceded by a sequence number,
+# which is odd while the position is being stored, so that a reader can tell
+# a torn read of the 8 bytes apart and read again (a seqlock). Frames follow,
+# each a 4-byte length and the payload, aligned to FRAME_ALIGNMENT. A frame
+# never wraps around the end of the ring: if it does not fit in front of the
+# end, WRAP marks the rest of the ring as unused and the frame starts at the
+# beginning. Payloads larger than a frame are split into fragments, each but
+# the last with the MORE bit set in its length.
+POSITION = struct.Struct("<Q")
+FLAG = struct.Struct("<I")
+LENGTH = struct.Struct("<I")
+HEAD_OFFSET = 0
+TAIL_OFFSET = 64
+WAITING_OFFSET = 128
+DATA_OFFSET = 192
+FRAME_ALIGNMENT = 8
+WRAP = 0xFFFFFFFF
+MORE = 0x80000000
+# Attempts to load a position while its writer is storing it
+MAX_POSITION_RETRIES = 10000
+# Machines on which the stores of one process become visible to another in
+# the order they were made, which the ring relies on instead of locks
+ORDERED_STORE_MACHINES = ("x86_64", "amd64", "i386", "i686", "x86")
+
+
+def supports_log_rings() -> bool:
+    return shared_memory is not None and platform.machine().lower() in ORDERED_STORE_MACHINES
+
+
+def _frame_size(length: int) -> int:
+    return (LENGTH.size + length + FRAME_ALIGNMENT - 1) // FRAME_ALIGNMENT * FRAME_ALIGNMENT
+
+
+class LogRing(object):
+    """A single-producer, single-consumer ring buffer of log frames in shared memory.
+
+    The client process creating the ring is the producer, the log server
+    attaching to it by name the consumer. Both only share the name of the
+    ring, not a lock: the producer only moves the head, after writing a frame,
+    and the consumer only moves the tail, after handling a frame. Positions
+    are stored and loaded under a seqlock, so a position is never read half
+    written. Beyond that, this relies on the stores of one process becoming
+    visible to the other in order, which holds on x86 only: elsewhere, the
+    consumer could see a head before the frame it publishes. Where
+    supports_log_rings is false, create and attach therefore refuse to work
+    and clients keep sending over the socket.
+
+    When the consumer finds the ring empty, it sets the waiting flag. The
+    producer clears it after writing the next frame and tells write's caller
+    to notify the consumer, e.g. with a frame over a socket. The notification
+    only lowers the latency. x86 may still reorder the store of the flag or
+    the head after the following load on the other side, so both sides can
+    miss each other and a notification gets lost. The consumer must therefore
+    also poll its rings periodically, which is what guarantees that every
+    frame is read: the log server polls every ring_poll_interval (50 ms).
+    """
+
+    def __init__(self, memory: "shared_memory.SharedMemory", owner: bool):
+        self.memory = memory
+        self.owner = owner
+        self.capacity = (memory.size - DATA_OFFSET) // FRAME_ALIGNMENT * FRAME_ALIGNMENT
+        # Larger frames may not fit in front of the end of an empty ring, nor
+        # behind its beginning, and are written as fragments
+        self.max_payload_size = (
+            self.capacity // 2 // FRAME_ALIGNMENT * FRAME_ALIGNMENT - LENGTH.size
+        )
+        assert memory.buf is not None
+        self._buf = memory.buf  # type: memoryview
+        # Each side keeps its own position, the other one is read from the ring
+        self._head = self._load_position(HEAD_OFFSET)
+        self._tail = self._load_position(TAIL_OFFSET)
+        # The consumer joins fragments here until the last one arrived
+        self._fragments = bytearray()
+
+    @property
+    def name(self) -> str:
+        return str(self.memory.name)
+
+    @classmethod
+    def create(cls, size: int) -> "LogRing":
+        """Creates a ring of size bytes, of which a few are used for the positions."""
+        if not supports_log_rings():
+            raise ValueError(
+                "Log rings require multiprocessing.shared_memory (Python >= 3.8) and an x86 "
+                "machine"
+            )
+        if size < DATA_OFFSET + 4 * FRAME_ALIGNMENT:
+            raise ValueError("A log ring needs at least %d bytes" % (DATA_OFFSET + 32))
+        memory = shared_memory.SharedMemory(create=True, size=size)
+        assert memory.buf is not None
+        memory.buf[:DATA_OFFSET] = bytes(DATA_OFFSET)
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "LogRing":
+        """Attaches to the ring created by another process on the same host."""
+        if not supports_log_rings():
+            raise ValueError(
+                "Log rings require multiprocessing.shared_memory (Python >= 3.8) and an x86 "
+                "machine"
+            )
+        if sys.version_info >= (3, 13):
+            memory = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            memory = shared_memory.SharedMemory(name=name)
+            # Only the creator may unlink the ring, but attaching registers
+            # it with the resource tracker of this process as well
+            from multiprocessing import resource_tracker
+
+            resource_tracker.unregister(memory._name, "shared_memory")  # type: ignore
+        return cls(memory, owner=False)
+
+    def _read(self, format: struct.Struct, offset: int) -> int:
+        return int(format.unpack_from(self._buf, offset)[0])
+
+    def _load_position(self, offset: int) -> int:
+        for _ in range(MAX_POSITION_RETRIES):
+            sequence = self._read(POSITION, offset)
+            if sequence % 2 == 0:
+                position = self._read(POSITION, offset + POSITION.size)
+                # Unchanged, so the position was not stored meanwhile
+                if self._read(POSITION, offset) == sequence:
+                    return position
+        # A store takes a few instructions, the writer died in the middle of
+        # it. Its position was stored completely or not at all
+        return self._read(POSITION, offset + POSITION.size)
+
+    def _store_position(self, offset: int, position: int) -> None:
+        # Each position has a single writer, which owns its sequence number
+        sequence = self._read(POSITION, offset)
+        POSITION.pack_into(self._buf, offset, sequence + 1)
+        POSITION.pack_into(self._buf, offset + POSITION.size, position)
+        POSITION.pack_into(self._buf, offset, sequence + 2)
+
+    def write(self, payload: Union[bytes, memoryview], more: bool = False) -> Optional[bool]:
+        """
+        Appends a frame to the ring. Returns None if the ring is full, else
+        whether the consumer waits and needs to be notified. Payloads larger
+        than max_payload_size have to be split, with more set for all but the
+        last fragment, which the consumer joins again.
+        """
+        if len(payload) > self.max_payload_size:
+            raise ValueError("Frame of %d bytes does not fit into the log ring" % len(payload))
+        size = _frame_size(len(payload))
+        tail = self._load_position(TAIL_OFFSET)
+        position = self._head % self.capacity
+        padding = 0 if position + size <= self.capacity else self.capacity - position
+        if self._head + padding + size - tail > self.capacity:
+            return None
+
+        if padding > 0:
+            LENGTH.pack_into(self._buf, DATA_OFFSET + position, WRAP)
+            position = 0
+        start = DATA_OFFSET + position + LENGTH.size
+        end = start + len(payload)
+        LENGTH.pack_into(self._buf, DATA_OFFSET + position, len(payload) | (MORE if more else 0))
+        self._buf[start:end] = payload
+        self._head += padding + size
+        # Publish the frame
+        self._store_position(HEAD_OFFSET, self._head)
+
+        if self._read(FLAG, WAITING_OFFSET):
+            FLAG.pack_into(self._buf, WAITING_OFFSET, 0)
+            return True
+        return False
+
+    def is_empty(self) -> bool:
+        return self._load_position(TAIL_OFFSET) == self._head
+
+    def read(self, handle: Callable[[memoryview], None]) -> int:
+        """
+        Passes each payload in the ring to handle and returns their number.
+        The payloads are views, which are only valid during the call. Once the
+        ring is empty, the waiting flag is set.
+        """
+        n_frames = 0
+        while True:
+            head = self._load_position(HEAD_OFFSET)
+            if head == self._tail:
+                FLAG.pack_into(self._buf, WAITING_OFFSET, 1)
+                # The producer may have written a frame before seeing the flag
+                if self._load_position(HEAD_OFFSET) == self._tail:
+                    return n_frames
+                FLAG.pack_into(self._buf, WAITING_OFFSET, 0)
+                continue
+
+            while self._tail < head:
+                position = self._tail % self.capacity
+                length = self._read(LENGTH, DATA_OFFSET + position)
+                if length == WRAP:
+                    self._tail += self.capacity - position
+                    continue
+                more = length & MORE
+                length &= ~MORE
+                start = DATA_OFFSET + position + LENGTH.size
+                end = start + length
+                if more or self._fragments:
+                    self._fragments += self._buf[start:end]
+                self._tail += _frame_size(length)
+                if more:
+                    self._store_position(TAIL_OFFSET, self._tail)
+                    continue
+                if self._fragments:
+                    payload = memoryview(self._fragments)
+                else:
+                    payload = self._buf[start:end]
+                with payload:
+                    try:
+                        handle(payload)
+                    finally:
+                        self._fragments = bytearray()
+                        # Free the frame for the producer
+                        self._store_position(TAIL_OFFSET, self._tail)
+                n_frames += 1
+
+    def close(self) -> None:
+        """Closes the ring, the process which created it also removes it."""
+        self._buf = None  # type: ignore[assignment]
+        self.memory.close()
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,508 @@
+import hashlib
+import hmac
+import json
+import logging
+import multiprocessing
+import operator
+import pickle
+import socket
+import struct
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from .log_ring import LogRing
+
+
+__all__ = [
+    "ClientLevels",
+    "CompactDecoder",
+    "CompactEncoder",
+    "LogWireSession",
+    "WIRE_ENCODINGS",
+    "Welcome",
+    "negotiate",
+]
+
+
+# Log frames are a 4-byte big-endian length followed by the payload. The
+# payload of a SocketHandler frame is a pickled LogRecord dict, the payload of
+# a BatchingSocketHandler frame a pickled list of them. All other payloads
+# start with CONTROL_PREFIX and the kind of the frame, which a pickle never
+# starts with.
+FRAME_LENGTH = struct.Struct(">L")
+CONTROL_PREFIX = b"\x00LG"
+KIND_OFFSET = len(CONTROL_PREFIX)
+HEADER_SIZE = KIND_OFFSET + 1
+HELLO = b"H"
+WELCOME = b"W"
+RECORDS = b"R"
+# Sent by the server whenever the level of a client logger changes
+LEVELS = b"L"
+# Sent by a client to change the levels of client loggers, signed with the
+# key of the server's ClientLevels
+SET_LEVELS = b"S"
+# Sent by a client to wake up the server after writing to the ring it offered
+NOTIFY = b"N"
+VERSION = 1
+WIRE_ENCODINGS = ("pickle", "compact")
+
+# A compact record is RECORD followed by the definition of its site, if the
+# site is new, and the utf-8 encoded msg, exc_text and stack_info and the
+# pickled extra fields. Lengths of -1 stand for None. The site number of a
+# record with a definition is marked with NEW_SITE.
+RECORD = struct.Struct("<Idddiiii")
+LENGTH = struct.Struct("<I")
+NEW_SITE = 0x80000000
+# Sites beyond MAX_SITES are sent with every record and are not numbered
+MAX_SITES = 2**16
+INLINE_SITE = 0x7FFFFFFF
+TEXT_ENCODING = "utf-8"
+TEXT_ERRORS = "surrogatepass"
+
+# The fields of a LogRecord in this version of Python. The fields which are
+# the same for all records of a logging call in a thread form its site, which
+# is sent once per connection and then referred to by its number.
+STANDARD_FIELDS = frozenset(logging.makeLogRecord({}).__dict__)
+VALUE_FIELDS = ("created", "msecs", "relativeCreated")
+TEXT_FIELDS = ("msg", "exc_text", "stack_info")
+# Formatted into msg and exc_text by the client
+FORMATTED_FIELDS = ("args", "exc_info")
+SITE_FIELDS = tuple(sorted(STANDARD_FIELDS.difference(VALUE_FIELDS, TEXT_FIELDS, FORMATTED_FIELDS)))
+_get_site = operator.itemgetter(*SITE_FIELDS)
+_get_values = operator.itemgetter(*VALUE_FIELDS)
+
+
+def make_frame(payload: bytes) -> bytes:
+    return FRAME_LENGTH.pack(len(payload)) + payload
+
+
+def control_frame(kind: bytes, message: Dict[str, Any]) -> bytes:
+    """Returns a frame of the given kind holding a json message."""
+    return make_frame(CONTROL_PREFIX + kind + json.dumps(message).encode("utf-8"))
+
+
+NOTIFY_FRAME = control_frame(NOTIFY, {})
+
+
+def frame_kind(payload: Union[bytes, memoryview]) -> Optional[bytes]:
+    """Returns the kind of a control frame, or None for a pickle frame."""
+    if bytes(payload[:KIND_OFFSET]) != CONTROL_PREFIX:
+        return None
+    return bytes(payload[KIND_OFFSET:HEADER_SIZE])
+
+
+def parse_control(payload: Union[bytes, memoryview]) -> Dict[str, Any]:
+    """Returns the json message of a control frame."""
+    message = json.loads(bytes(payload[HEADER_SIZE:]).decode("utf-8"))
+    if not isinstance(message, dict):
+        raise ValueError("Invalid log control frame %r" % message)
+    return message
+
+
+def sign_levels(levels: Dict[str, Optional[int]], key: bytes) -> str:
+    """Returns the signature of the levels of a SET_LEVELS message."""
+    data = json.dumps(levels, sort_keys=True).encode("utf-8")
+    return hmac.new(key, data, hashlib.sha256).hexdigest()
+
+
+def parse_levels(message: Dict[str, Any]) -> Dict[str, Optional[int]]:
+    """Returns the levels of a LEVELS, SET_LEVELS or WELCOME message."""
+    levels = message.get("levels", {})
+    if not isinstance(levels, dict) or not all(
+        isinstance(name, str) and (level is None or isinstance(level, int))
+        for name, level in levels.items()
+    ):
+        raise ValueError("Invalid log levels %r" % levels)
+    return levels
+
+
+def recv_frame(sock: socket.socket, retry_timeouts: bool = False) -> bytes:
+    """
+    Receives the payload of a single frame from a blocking socket.
+
+    With retry_timeouts, a timeout of the socket, e.g. the send timeout of a
+    SocketHandler, does not interrupt the frame and recv_frame keeps waiting.
+    """
+
+    def recv_exactly(n_bytes: int) -> bytes:
+        data = b""
+        while len(data) < n_bytes:
+            try:
+                chunk = sock.recv(n_bytes - len(data))
+            except socket.timeout:
+                if retry_timeouts:
+                    continue
+                raise
+            if not chunk:
+                raise ConnectionError("The log server closed the connection")
+            data += chunk
+        return data
+
+    (length,) = FRAME_LENGTH.unpack(recv_exactly(FRAME_LENGTH.size))
+    return recv_exactly(length)
+
+
+class Welcome(NamedTuple):
+    """What the log server answered to the HELLO frame of a client."""
+
+    encoding: str
+    # The levels of the client loggers named in the HELLO frame
+    levels: Dict[str, int]
+    # Whether the server reads the records from the offered ring
+    ring: bool
+
+
+def negotiate(
+    sock: socket.socket,
+    encodings: Tuple[str, ...] = WIRE_ENCODINGS,
+    loggers: Tuple[str, ...] = (),
+    ring: Optional[str] = None,
+) -> Welcome:
+    """
+    Offers encodings, and optionally the name of a LogRing, to the log server
+    on a new connection and returns its answer: the encoding the server chose,
+    the levels it publishes for the client loggers sending over the
+    connection and whether it attached to the ring.
+
+    Raises ConnectionError or ValueError if the server does not answer with
+    a WELCOME frame, e.g. because it only understands pickle frames and
+    closed the connection. The client then connects again and sends pickle
+    frames without negotiating.
+    """
+    hello = {
+        "version": VERSION,
+        "encodings": list(encodings),
+        "loggers": list(loggers),
+    }  # type: Dict[str, Any]
+    if ring is not None:
+        hello["ring"] = ring
+    sock.sendall(control_frame(HELLO, hello))
+    payload = recv_frame(sock)
+    if frame_kind(payload) != WELCOME:
+        raise ValueError("The log server did not welcome the client")
+    message = parse_control(payload)
+    encoding = message.get("encoding")
+    if encoding not in encodings:
+        raise ValueError("The log server chose the unknown encoding %s" % encoding)
+    levels = {name: level for name, level in parse_levels(message).items() if level is not None}
+    return Welcome(str(encoding), levels, bool(message.get("ring", False)))
+
+
+def _encode_text(text: Optional[str]) -> Optional[bytes]:
+    if text is None:
+        return None
+    return text.encode(TEXT_ENCODING, TEXT_ERRORS)
+
+
+class CompactEncoder(object):
+    """Encodes record dicts into compact RECORDS frames for one connection.
+
+    Record dicts are prepared like for pickling: msg is the formatted message,
+    args and exc_info are None. The site of a record is pickled only the first
+    time it is seen on the connection, later records refer to it by number, so
+    that the repeated strings of a record, such as its pathname, function and
+    thread name, are not sent again. An encoder must therefore be used for a
+    single connection, from its start, and frames must not be dropped.
+    """
+
+    def __init__(self, max_sites: int = MAX_SITES):
+        self.max_sites = max_sites
+        self._sites = {}  # type: Dict[Tuple[Any, ...], int]
+
+    def encode(self, records: List[Dict[str, Any]]) -> bytes:
+        """Returns a frame with the records."""
+        parts = [CONTROL_PREFIX + RECORDS]
+        for record in records:
+            site = _get_site(record)
+            site_id = self._sites.get(site)
+            definition = None
+            if site_id is None:
+                definition = pickle.dumps(dict(zip(SITE_FIELDS, site)), 4)
+                if len(self._sites) < self.max_sites:
+                    self._sites[site] = len(self._sites)
+                    site_id = self._sites[site] | NEW_SITE
+                else:
+                    site_id = INLINE_SITE | NEW_SITE
+
+            msg = _encode_text(record["msg"])
+            exc_text = _encode_text(record["exc_text"])
+            stack_info = _encode_text(record["stack_info"])
+            extras = b""
+            if len(record) > len(STANDARD_FIELDS):
+                extra_fields = {
+                    key: value
+                    for key, value in record.items()
+                    if key not in STANDARD_FIELDS and key != "message"
+                }
+                if extra_fields:
+                    extras = pickle.dumps(extra_fields, 4)
+
+            parts.append(
+                RECORD.pack(
+                    site_id,
+                    *_get_values(record),
+                    -1 if msg is None else len(msg),
+                    -1 if exc_text is None else len(exc_text),
+                    -1 if stack_info is None else len(stack_info),
+                    len(extras),
+                )
+            )
+            if definition is not None:
+                parts.append(LENGTH.pack(len(definition)))
+                parts.append(definition)
+            for text in (msg, exc_text, stack_info):
+                if text:
+                    parts.append(text)
+            parts.append(extras)
+        return make_frame(b"".join(parts))
+
+
+def _check_truncated(end: int, size: int) -> None:
+    if end > size:
+        raise ValueError("Truncated log records frame")
+
+
+class CompactDecoder(object):
+    """Decodes the RECORDS frames of one connection into record dicts."""
+
+    def __init__(self) -> None:
+        self._sites = []  # type: List[Dict[str, Any]]
+
+    def decode(self, payload: Union[bytes, memoryview]) -> List[Dict[str, Any]]:
+        records = []
+        offset = HEADER_SIZE
+        size = len(payload)
+        while offset < size:
+            _check_truncated(offset + RECORD.size, size)
+            (
+                site_id,
+                created,
+                msecs,
+                relative_created,
+                *lengths,
+                extras_length,
+            ) = RECORD.unpack_from(payload, offset)
+            offset += RECORD.size
+
+            if site_id & NEW_SITE:
+                site_id &= ~NEW_SITE
+                if site_id != INLINE_SITE and site_id != len(self._sites):
+                    raise ValueError("Log record defines the site %d out of order" % site_id)
+                _check_truncated(offset + LENGTH.size, size)
+                (length,) = LENGTH.unpack_from(payload, offset)
+                start = offset + LENGTH.size
+                offset = start + length
+                _check_truncated(offset, size)
+                site = pickle.loads(payload[start:offset])
+                if site_id != INLINE_SITE:
+                    self._sites.append(site)
+            elif site_id < len(self._sites):
+                site = self._sites[site_id]
+            else:
+                raise ValueError("Log record refers to the unknown site %d" % site_id)
+
+            _check_truncated(
+                offset + sum(max(length, 0) for length in lengths) + extras_length, size
+            )
+            record = dict(site)
+            record["created"] = created
+            record["msecs"] = msecs
+            record["relativeCreated"] = relative_created
+            record["args"] = None
+            record["exc_info"] = None
+            for field, length in zip(TEXT_FIELDS, lengths):
+                if length < 0:
+                    record[field] = None
+                    continue
+                start = offset
+                offset = start + length
+                record[field] = str(payload[start:offset], TEXT_ENCODING, TEXT_ERRORS)
+            if extras_length > 0:
+                start = offset
+                offset = start + extras_length
+                record.update(pickle.loads(payload[start:offset]))
+            records.append(record)
+        return records
+
+
+class ClientLevels(object):
+    """The levels a log server publishes to its client loggers.
+
+    Records of client loggers are logged by the server under logname, or
+    under their own name if logname is None, so the level of a client logger
+    is the effective level of that server logger, as configured by
+    setup_logger. set_levels overrides the level of single client loggers at
+    runtime, e.g. to turn on debugging for one worker only.
+
+    Receivers subscribe the session of each connection together with a
+    function sending a frame on the connection. Whenever the level of a client
+    logger changes, a LEVELS frame is sent to the sessions of that logger.
+
+    SET_LEVELS frames are only accepted if they are signed with key, by
+    default the multiprocessing authkey of the process creating the levels.
+    A log server process inherits the authkey of the process which started
+    it, so only that process, and the processes it starts in turn, can
+    change the levels, not any client which can connect to the server.
+    """
+
+    def __init__(self, logname: Optional[str] = None, key: Optional[bytes] = None):
+        self.logname = logname
+        self.key = key if key is not None else bytes(multiprocessing.current_process().authkey)
+        self._lock = threading.Lock()
+        self._overrides = {}  # type: Dict[str, int]
+        self._subscribers = {}  # type: Dict[LogWireSession, Callable[[bytes], None]]
+
+    def get_level(self, name: str) -> int:
+        with self._lock:
+            level = self._overrides.get(name)
+        if level is None:
+            level = logging.getLogger(self.logname or name).getEffectiveLevel()
+        return level
+
+    def get_levels(self, names: List[str]) -> Dict[str, int]:
+        return {name: self.get_level(name) for name in names}
+
+    def subscribe(self, session: "LogWireSession", send: Callable[[bytes], None]) -> None:
+        with self._lock:
+            self._subscribers[session] = send
+
+    def unsubscribe(self, session: "LogWireSession") -> None:
+        with self._lock:
+            self._subscribers.pop(session, None)
+
+    def is_signed(self, levels: Dict[str, Optional[int]], signature: Any) -> bool:
+        """Whether the levels of a SET_LEVELS message were signed with key."""
+        return isinstance(signature, str) and hmac.compare_digest(
+            signature, sign_levels(levels, self.key)
+        )
+
+    def set_levels(self, levels: Dict[str, Optional[int]]) -> None:
+        """
+        Overrides the levels of client loggers by name. A level of None removes
+        the override, so that the logger gets its configured level again.
+        """
+        with self._lock:
+            for name, level in levels.items():
+                if level is None:
+                    self._overrides.pop(name, None)
+                else:
+                    self._overrides[name] = level
+            subscribers = list(self._subscribers.items())
+        for session, send in subscribers:
+            names = [name for name in session.loggers if name in levels]
+            if not names:
+                continue
+            try:
+                send(control_frame(LEVELS, {"levels": self.get_levels(names)}))
+            except OSError:
+                # The connection is closed and its receiver unsubscribes it
+                pass
+
+
+class LogWireSession(object):
+    """The server side of the log protocol for one client connection.
+
+    Clients which do not negotiate, like a logging.handlers.SocketHandler,
+    send pickle frames. A client offering encodings with a HELLO frame is
+    answered with a WELCOME frame naming the encoding it has to use from then
+    on and, if levels are given, the levels of the client loggers it named.
+    SET_LEVELS frames are passed on to levels, if they are signed with its key.
+
+    With accept_rings, the session attaches to the LogRing a client on the
+    same host offers. The client then writes its record frames to the ring
+    instead of the connection, and sends a NOTIFY frame when the session
+    waits for the ring. The receiver passes NOTIFY frames to handle_frame
+    like any other frame and calls poll regularly in case a notification
+    got lost.
+    """
+
+    def __init__(
+        self,
+        encodings: Tuple[str, ...] = WIRE_ENCODINGS,
+        levels: Optional[ClientLevels] = None,
+        accept_rings: bool = False,
+    ):
+        self.encodings = encodings
+        self.levels = levels
+        self.accept_rings = accept_rings
+        self.encoding = "pickle"
+        # The client loggers sending over the connection
+        self.loggers = []  # type: List[str]
+        self.ring = None  # type: Optional[LogRing]
+        self._decoder = CompactDecoder()
+
+    def _attach_ring(self, name: Any) -> bool:
+        if not self.accept_rings or not isinstance(name, str):
+            return False
+        try:
+            self.ring = LogRing.attach(name)
+        except (OSError, ValueError):
+            # The client runs on another host
+            return False
+        return True
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Returns the record dicts of the frames in the ring."""
+        records = []  # type: List[Dict[str, Any]]
+        if self.ring is None:
+            return records
+
+        def handle(payload: memoryview) -> None:
+            if frame_kind(payload) not in (None, RECORDS):
+                raise ValueError("Log rings only hold records")
+            records.extend(self.handle_frame(payload)[0])
+
+        self.ring.read(handle)
+        return records
+
+    def close(self) -> None:
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def handle_frame(
+        self, payload: Union[bytes, memoryview]
+    ) -> Tuple[List[Dict[str, Any]], Optional[bytes]]:
+        """
+        Returns the record dicts of a frame and the frame to send back to the
+        client, if any.
+        """
+        kind = frame_kind(payload)
+        if kind is None:
+            obj = pickle.loads(payload)
+            # A BatchingSocketHandler sends a list of records per frame
+            return obj if isinstance(obj, list) else [obj], None
+        if kind == RECORDS:
+            if self.encoding != "compact":
+                raise ValueError("The client did not negotiate the compact encoding")
+            return self._decoder.decode(payload), None
+        if kind == HELLO:
+            message = parse_control(payload)
+            offered = message.get("encodings", [])
+            self.encoding = "pickle"
+            if message.get("version") == VERSION and "compact" in offered:
+                if "compact" in self.encodings:
+                    self.encoding = "compact"
+            self._decoder = CompactDecoder()
+            self.loggers = [str(name) for name in message.get("loggers", [])]
+            welcome = {"version": VERSION, "encoding": self.encoding}  # type: Dict[str, Any]
+            if self.levels is not None:
+                welcome["levels"] = self.levels.get_levels(self.loggers)
+            self.close()
+            if "ring" in message:
+                welcome["ring"] = self._attach_ring(message["ring"])
+            return [], control_frame(WELCOME, welcome)
+        if kind == NOTIFY:
+            return self.poll(), None
+        if kind == SET_LEVELS:
+            if self.levels is None:
+                raise ValueError("The log server does not publish levels")
+            message = parse_control(payload)
+            levels = parse_levels(message)
+            if not self.levels.is_signed(levels, message.get("signature")):
+                raise ValueError(
+                    "Log levels can only be set by the process which started the log server"
+                )
+            self.levels.set_levels(levels)
+            return [], None
+        raise ValueError("Unknown log frame kind %r" % kind)
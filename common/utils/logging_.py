@@ -5,15 +5,40 @@ import logging.handlers
 import multiprocessing
 import os
 import pickle
+import queue
 import random
 import select
+import selectors
+import socket
 import socketserver
+import stat
 import struct
 import threading
-from typing import Any, Dict, Optional, Type
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type, Union
 
 import yaml
 
+from .log_ring import LogRing, supports_log_rings
+from .log_wire import (
+    ClientLevels,
+    CompactEncoder,
+    FRAME_LENGTH,
+    LEVELS,
+    LogWireSession,
+    NOTIFY_FRAME,
+    SET_LEVELS,
+    WIRE_ENCODINGS,
+    control_frame,
+    frame_kind,
+    make_frame,
+    negotiate,
+    parse_control,
+    parse_levels,
+    recv_frame,
+    sign_levels,
+)
+
 
 def setup_logger(
     output_dir: str,
@@ -101,19 +126,437 @@ class PickableLoggerAdapter(object):
         return self.logger.isEnabledFor(level)
 
 
+def _create_connection(host: str, port: Optional[int], timeout: float) -> socket.socket:
+    # A port of None stands for a Unix domain socket at the path host, as in
+    # logging.handlers.SocketHandler
+    if port is not None:
+        return socket.create_connection((host, port), timeout=timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(host)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _create_server(host: str, port: Optional[int]) -> socket.socket:
+    # socket.create_server requires Python >= 3.8
+    if port is None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address: Union[str, Tuple[str, int]] = host
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        address = (host, port)
+    try:
+        sock.bind(address)
+        sock.listen()
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _apply_level(logger_name: str, levels: Dict[str, Any]) -> None:
+    level = levels.get(logger_name)
+    if isinstance(level, int):
+        logging.getLogger(logger_name).setLevel(level)
+
+
+def _listen_for_levels(sock: socket.socket, logger_name: str) -> None:
+    # Runs until the connection is closed
+    while True:
+        try:
+            payload = recv_frame(sock, retry_timeouts=True)
+            if frame_kind(payload) == LEVELS:
+                _apply_level(logger_name, parse_levels(parse_control(payload)))
+        except (OSError, ValueError):
+            return
+
+
+def _start_level_listener(sock: socket.socket, logger_name: str) -> None:
+    threading.Thread(
+        target=_listen_for_levels, args=(sock, logger_name), name="LogLevelListener", daemon=True
+    ).start()
+
+
+def _shutdown_socket(sock: socket.socket) -> None:
+    # Wakes up the level listener, which close alone does not
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class ClientSocketHandler(logging.handlers.SocketHandler):
+    """
+    A SocketHandler which gets the level of its client logger from the log
+    server.
+
+    On a new connection, the handler negotiates the pickle encoding with the
+    log server, which answers with the level of the client logger called
+    logger_name. The level is set on that logger, so that records below it
+    are dropped before they are created, let alone pickled and sent. Later
+    changes of the level, see set_client_log_level, are received by a
+    listener thread. Log servers which do not negotiate get pickle frames
+    right away, like from a plain SocketHandler.
+    """
+
+    def __init__(self, host: str, port: Optional[int], logger_name: Optional[str] = None):
+        super().__init__(host, port)
+        self.logger_name = logger_name
+        # Set once the log server did not negotiate
+        self._pickle_only = False
+
+    def makeSocket(self, timeout: float = 1) -> socket.socket:
+        sock = super().makeSocket(timeout)
+        if self.logger_name is None or self._pickle_only:
+            return sock
+        try:
+            welcome = negotiate(sock, ("pickle",), (self.logger_name,))
+        except (OSError, ValueError):
+            sock.close()
+            self._pickle_only = True
+            return super().makeSocket(timeout)
+        _apply_level(self.logger_name, welcome.levels)
+        _start_level_listener(sock, self.logger_name)
+        return sock
+
+    def close(self) -> None:
+        with self.lock:  # type: ignore[union-attr]
+            if self.sock is not None:
+                _shutdown_socket(self.sock)
+        super().close()
+
+
+class BatchingOptions(NamedTuple):
+    """How a BatchingSocketHandler sends the records of a client logger.
+
+    Records are queued and sent by a background thread in batches of at most
+    batch_size records, at the latest flush_interval seconds after the first
+    record of a batch was queued. At most max_queued records are queued. If
+    the queue is full, overflow decides whether new records are dropped
+    ("drop") or the logging call blocks until there is room ("block").
+
+    encoding is the encoding the handler offers to the log server, either
+    "compact" or "pickle", see log_wire.
+
+    If ring_size is positive, the handler also offers the log server a
+    LogRing of ring_size bytes in shared memory, through which the batches
+    are passed instead of the socket if the server runs on the same host.
+    """
+
+    batch_size: int = 100
+    flush_interval: float = 0.05
+    max_queued: int = 10000
+    overflow: str = "drop"
+    encoding: str = "compact"
+    ring_size: int = 0
+
+
+OVERFLOW_POLICIES = ("drop", "block")
+
+
+class BatchingSocketHandler(logging.Handler):
+    """
+    Sends log records to a log server in batches from a background thread.
+
+    Unlike logging.handlers.SocketHandler, which pickles and sends every
+    record from the logging thread, emit only converts the record into a
+    dict and queues it, so that a slow log server never stalls the client.
+    Each batch is sent as a single frame. On a new connection, the handler
+    offers the compact encoding of log_wire to the log server. If the server
+    does not accept it, or does not negotiate at all, batches are sent as
+    pickled lists of record dicts, which LogRecordStreamHandler and
+    SelectorLogRecordReceiver accept next to the single-record frames of a
+    SocketHandler.
+
+    If logger_name is given, the handler gets the level of that logger from
+    the log server, like a ClientSocketHandler.
+
+    A port of None connects to a log server listening on a Unix domain
+    socket at the path host, as for logging.handlers.SocketHandler. A log
+    server on the same host can also read the batches from a shared memory
+    ring, see BatchingOptions.ring_size. The socket then only carries
+    notifications while the server waits for the ring, batches too large for
+    the ring are split into fragments.
+
+    stats counts the records sent, the records dropped because the queue
+    was full and the records lost because they could not be sent. The
+    handler is not pickled itself, PicklableClientLogger creates a new one
+    from the same options. After a fork, the child starts its own queue and
+    sender thread.
+    """
+
+    # Reconnection delays after the log server could not be reached, as in
+    # logging.handlers.SocketHandler
+    retry_start = 1.0
+    retry_max = 30.0
+    retry_factor = 2.0
+    # Seconds to wait for the log server to drain a full ring
+    ring_timeout = 5.0
+
+    def __init__(
+        self,
+        host: str,
+        port: Optional[int],
+        options: BatchingOptions = BatchingOptions(),
+        logger_name: Optional[str] = None,
+    ):
+        super().__init__()
+        if options.overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                "Unknown overflow policy %s, choose from %s" % (options.overflow, OVERFLOW_POLICIES)
+            )
+        if options.encoding not in WIRE_ENCODINGS:
+            raise ValueError(
+                "Unknown encoding %s, choose from %s" % (options.encoding, WIRE_ENCODINGS)
+            )
+        self.host = host
+        self.port = port
+        self.address: Union[str, Tuple[str, int]] = host if port is None else (host, port)
+        self.options = options
+        self.logger_name = logger_name
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._queue = queue.Queue(
+            maxsize=self.options.max_queued
+        )  # type: queue.Queue[Optional[Dict[str, Any]]]
+        self._stats_lock = threading.Lock()
+        self._stats = {"sent": 0, "dropped": 0, "lost": 0}
+        self._socket = None  # type: Optional[socket.socket]
+        self._encoder = None  # type: Optional[CompactEncoder]
+        # The ring of the current connection, if the log server attached to it
+        self._ring = None  # type: Optional[LogRing]
+        # Set once the log server did not negotiate the encoding
+        self._pickle_only = False
+        self._retry_time = None  # type: Optional[float]
+        self._retry_period = self.retry_start
+        self._thread = None  # type: Optional[threading.Thread]
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, key: str, n_records: int) -> None:
+        with self._stats_lock:
+            self._stats[key] += n_records
+
+    def make_dict(self, record: logging.LogRecord) -> Dict[str, Any]:
+        """
+        Converts a record into a dict which can be pickled, formatting its
+        message and exception like logging.handlers.SocketHandler.makePickle.
+        """
+        if record.exc_info:
+            # Sets record.exc_text
+            self.format(record)
+        record_dict = dict(record.__dict__)
+        record_dict["msg"] = record.getMessage()
+        record_dict["args"] = None
+        record_dict["exc_info"] = None
+        record_dict.pop("message", None)
+        return record_dict
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if os.getpid() != self._pid:
+            # Forked, the sender thread of the parent does not exist here
+            self._reset()
+        try:
+            record_dict = self.make_dict(record)
+        except Exception:
+            self.handleError(record)
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="BatchingSocketHandler", daemon=True
+            )
+            self._thread.start()
+        if self.options.overflow == "block":
+            self._queue.put(record_dict)
+            return
+        try:
+            self._queue.put_nowait(record_dict)
+        except queue.Full:
+            self._count("dropped", 1)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.options.flush_interval
+            while len(batch) < self.options.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        item = self._queue.get(timeout=timeout)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._send(batch)
+            for _ in range(len(batch) + int(stop)):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _connect(self) -> Optional[socket.socket]:
+        if self._socket is not None:
+            return self._socket
+        now = time.monotonic()
+        if self._retry_time is not None and now < self._retry_time:
+            return None
+        try:
+            sock = _create_connection(self.host, self.port, timeout=1.0)
+            encoder = None
+            ring = None
+            welcome = None
+            loggers = () if self.logger_name is None else (self.logger_name,)
+            if self.options.ring_size > 0 and supports_log_rings() and not self._pickle_only:
+                try:
+                    ring = LogRing.create(self.options.ring_size)
+                except OSError:
+                    # E.g. /dev/shm is full, the socket works as well
+                    ring = None
+            if (self.options.encoding == "compact" or loggers or ring) and not self._pickle_only:
+                encodings = ("pickle",) if self.options.encoding == "pickle" else WIRE_ENCODINGS
+                try:
+                    welcome = negotiate(
+                        sock, encodings, loggers, None if ring is None else ring.name
+                    )
+                    if welcome.encoding == "compact":
+                        encoder = CompactEncoder()
+                except (OSError, ValueError):
+                    # The log server only understands pickle frames
+                    sock.close()
+                    self._pickle_only = True
+                    welcome = None
+                    sock = _create_connection(self.host, self.port, timeout=1.0)
+            if ring is not None and (welcome is None or not welcome.ring):
+                # The log server runs on another host
+                ring.close()
+                ring = None
+            sock.settimeout(None)
+            self._socket = sock
+            self._encoder = encoder
+            self._ring = ring
+            if welcome is not None and self.logger_name is not None:
+                _apply_level(self.logger_name, welcome.levels)
+                _start_level_listener(sock, self.logger_name)
+            self._retry_time = None
+            self._retry_period = self.retry_start
+        except OSError:
+            self._retry_time = now + self._retry_period
+            self._retry_period = min(self._retry_period * self.retry_factor, self.retry_max)
+        return self._socket
+
+    def _close_socket(self) -> None:
+        if self._socket is not None:
+            _shutdown_socket(self._socket)
+            self._socket.close()
+            self._socket = None
+        if self._ring is not None:
+            # The log server drains the ring when the connection is closed
+            self._ring.close()
+            self._ring = None
+
+    def _wait_for_ring(self, sock: socket.socket) -> None:
+        """Waits until the log server drained the ring."""
+        assert self._ring is not None
+        if self._ring.is_empty():
+            return
+        sock.sendall(NOTIFY_FRAME)
+        deadline = time.monotonic() + self.ring_timeout
+        while not self._ring.is_empty():
+            if time.monotonic() > deadline:
+                raise OSError("The log server does not drain the log ring")
+            time.sleep(0.001)
+
+    def _send_frame(self, sock: socket.socket, frame: bytes) -> None:
+        if self._ring is None:
+            sock.sendall(frame)
+            return
+        header_size = FRAME_LENGTH.size
+        payload = memoryview(frame)[header_size:]
+        fragment_size = self._ring.max_payload_size
+        notify = False
+        for start in range(0, len(payload), fragment_size):
+            end = start + fragment_size
+            more = end < len(payload)
+            written = self._ring.write(payload[start:end], more)
+            if written is None:
+                # The ring is full, it has room for any fragment once it is empty
+                self._wait_for_ring(sock)
+                written = self._ring.write(payload[start:end], more)
+            notify = notify or bool(written)
+        if notify:
+            try:
+                sock.sendall(NOTIFY_FRAME)
+            except OSError:
+                # The batch is in the ring already, the log server drains it
+                # once it notices the closed connection
+                self._close_socket()
+
+    def _send(self, batch: List[Dict[str, Any]]) -> None:
+        for _ in range(2):
+            # A connection closed by the server is only noticed when sending,
+            # so the batch is sent once more on a new connection
+            sock = self._connect()
+            if sock is None:
+                break
+            if self._encoder is not None:
+                frame = self._encoder.encode(batch)
+            else:
+                frame = make_frame(pickle.dumps(batch, 4))
+            try:
+                self._send_frame(sock, frame)
+                self._count("sent", len(batch))
+                return
+            except OSError:
+                self._close_socket()
+        self._count("lost", len(batch))
+
+    def flush(self) -> None:
+        """Blocks until all queued records were sent or lost."""
+        if os.getpid() == self._pid and self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        if os.getpid() == self._pid and self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._close_socket()
+        super().close()
+
+
 def get_named_client_logger(
     name: str,
     host: str = "localhost",
-    port: int = logging.handlers.DEFAULT_TCP_LOGGING_PORT,
+    port: Optional[int] = logging.handlers.DEFAULT_TCP_LOGGING_PORT,
+    batching: Optional[BatchingOptions] = None,
 ) -> "PicklableClientLogger":
-    logger = PicklableClientLogger(name=name, host=host, port=port)
+    logger = PicklableClientLogger(name=name, host=host, port=port, batching=batching)
     return logger
 
 
 def _get_named_client_logger(
     name: str,
     host: str = "localhost",
-    port: int = logging.handlers.DEFAULT_TCP_LOGGING_PORT,
+    port: Optional[int] = logging.handlers.DEFAULT_TCP_LOGGING_PORT,
+    batching: Optional[BatchingOptions] = None,
 ) -> logging.Logger:
     """
     When working with a logging server, clients are expected to create a logger using
@@ -131,9 +574,17 @@ def _get_named_client_logger(
         name: (str)
             the name of the logger, used to tag the messages in the main log
         host: (str)
-            Address of where the server is gonna look for messages
-        port: (str)
-            Port used to communicate with the server
+            Address of where the server is gonna look for messages, or the
+            path of its Unix domain socket if port is None
+        port: (Optional[int])
+            Port used to communicate with the server, None for a server
+            listening on a Unix domain socket, see start_log_server
+        batching: (Optional[BatchingOptions])
+            If given, records are sent in batches by a BatchingSocketHandler,
+            otherwise one by one by a ClientSocketHandler
+
+    The level of the logger is published by the log server once connected,
+    until then all records are sent.
 
     Returns
     -------
@@ -145,30 +596,86 @@ def _get_named_client_logger(
     # a new singleton with the desired socket handlers
     local_logger = _create_logger("Client-" + name)
     local_logger.propagate = False
-    local_logger.setLevel(logging.DEBUG)
+    if local_logger.level == logging.NOTSET:
+        # Do not reset a level the log server already published
+        local_logger.setLevel(logging.DEBUG)
 
+    address: Union[str, Tuple[str, int]] = host if port is None else (host, port)
     try:
-        ports = [getattr(handler, "port", None) for handler in local_logger.handlers]
+        addresses = [getattr(handler, "address", None) for handler in local_logger.handlers]
     except AttributeError:
         # We do not want to log twice but adding multiple times the same
-        # handler. So we check to what ports we communicate to
-        # We can prevent errors with streamers not having a port with this try
-        # block -- but it is a scenario that is unlikely to happen
-        ports = []
+        # handler. So we check to what addresses we communicate to
+        # We can prevent errors with streamers not having an address with this
+        # try block -- but it is a scenario that is unlikely to happen
+        addresses = []
 
-    if port not in ports:
-        socketHandler = logging.handlers.SocketHandler(host, port)
+    if address not in addresses:
+        if batching is not None:
+            socketHandler = BatchingSocketHandler(
+                host, port, batching, local_logger.name
+            )  # type: logging.Handler
+        else:
+            socketHandler = ClientSocketHandler(host, port, local_logger.name)
         local_logger.addHandler(socketHandler)
 
     return local_logger
 
 
+def set_client_log_level(
+    name: str,
+    level: Optional[Union[int, str]],
+    host: str = "localhost",
+    port: Optional[int] = logging.handlers.DEFAULT_TCP_LOGGING_PORT,
+    key: Optional[bytes] = None,
+) -> None:
+    """
+    Changes the level of the client loggers called name, see
+    get_named_client_logger, at runtime. The log server passes the level on
+    to all clients using such a logger. It only accepts the change from the
+    process which started it, see ClientLevels.
+
+    Parameters
+    ----------
+        name: (str)
+            the name of the client loggers
+        level: (Optional[Union[int, str]])
+            the new level, e.g. logging.DEBUG or "DEBUG". None restores the
+            level configured for the log server
+        host: (str)
+            Address of the log server, or the path of its Unix domain socket
+        port: (Optional[int])
+            Port of the log server, None for a Unix domain socket
+        key: (Optional[bytes])
+            Key the change is signed with, by default the multiprocessing
+            authkey of the current process
+    """
+    if isinstance(level, str):
+        level_number = logging.getLevelName(level.upper())
+        if not isinstance(level_number, int):
+            raise ValueError("Unknown level %s" % level)
+        level = level_number
+    if key is None:
+        key = bytes(multiprocessing.current_process().authkey)
+    levels = {"Client-" + name: level}  # type: Dict[str, Optional[int]]
+    frame = control_frame(SET_LEVELS, {"levels": levels, "signature": sign_levels(levels, key)})
+    with _create_connection(host, port, timeout=5.0) as sock:
+        sock.sendall(frame)
+
+
 class PicklableClientLogger(PickableLoggerAdapter):
-    def __init__(self, name: str, host: str, port: int):
+    def __init__(
+        self,
+        name: str,
+        host: str,
+        port: Optional[int],
+        batching: Optional[BatchingOptions] = None,
+    ):
         self.name = name
         self.host = host
         self.port = port
-        self.logger = _get_named_client_logger(name=name, host=host, port=port)
+        self.batching = batching
+        self.logger = _get_named_client_logger(name=name, host=host, port=port, batching=batching)
 
     def __getstate__(self) -> Dict[str, Any]:
         """
@@ -183,6 +690,7 @@ class PicklableClientLogger(PickableLoggerAdapter):
             "name": self.name,
             "host": self.host,
             "port": self.port,
+            "batching": self.batching,
         }
 
     def __setstate__(self, state: Dict[str, Any]) -> None:
@@ -198,10 +706,12 @@ class PicklableClientLogger(PickableLoggerAdapter):
         self.name = state["name"]
         self.host = state["host"]
         self.port = state["port"]
+        self.batching = state.get("batching")
         self.logger = _get_named_client_logger(
             name=self.name,
             host=self.host,
             port=self.port,
+            batching=self.batching,
         )
 
 
@@ -215,20 +725,40 @@ class LogRecordStreamHandler(socketserver.StreamRequestHandler):
     def handle(self) -> None:
         """
         Handle multiple requests - each expected to be a 4-byte length,
-        followed by the LogRecord in pickle format. Logs the record
-        according to whatever policy is configured locally.
+        followed by the LogRecord, or a list of LogRecords, in pickle format,
+        or by a frame of the log_wire protocol negotiated by the client.
+        Logs the records according to whatever policy is configured locally.
         """
-        while True:
-            chunk = self.connection.recv(4)  # type: ignore[attr-defined]
-            if len(chunk) < 4:
-                break
-            slen = struct.unpack(">L", chunk)[0]
-            chunk = self.connection.recv(slen)  # type: ignore[attr-defined]
-            while len(chunk) < slen:
-                chunk = chunk + self.connection.recv(slen - len(chunk))  # type: ignore[attr-defined]  # noqa: E501
-            obj = self.unPickle(chunk)
-            record = logging.makeLogRecord(obj)
-            self.handleLogRecord(record)
+        # levels is defined in LogRecordSocketReceiver
+        levels = getattr(self.server, "levels", None)
+        session = LogWireSession(levels=levels)
+        # Levels of the client loggers are also sent from other threads
+        send_lock = threading.Lock()
+
+        def send(frame: bytes) -> None:
+            with send_lock:
+                self.connection.sendall(frame)
+
+        if levels is not None:
+            levels.subscribe(session, send)
+        try:
+            while True:
+                chunk = self.connection.recv(4)
+                if len(chunk) < 4:
+                    break
+                slen = struct.unpack(">L", chunk)[0]
+                chunk = self.connection.recv(slen)
+                while len(chunk) < slen:
+                    chunk = chunk + self.connection.recv(slen - len(chunk))
+                record_dicts, reply = session.handle_frame(chunk)
+                if reply is not None:
+                    send(reply)
+                for record_dict in record_dicts:
+                    record = logging.makeLogRecord(record_dict)
+                    self.handleLogRecord(record)
+        finally:
+            if levels is not None:
+                levels.unsubscribe(session)
 
     def unPickle(self, data: Any) -> Any:
         return pickle.loads(data)
@@ -236,16 +766,20 @@ class LogRecordStreamHandler(socketserver.StreamRequestHandler):
     def handleLogRecord(self, record: logging.LogRecord) -> None:
         # logname is define in LogRecordSocketReceiver
         # Yet Mypy Cannot see this. Ignore typing check for this
-        if self.server.logname is not None:  # type: ignore  # noqa
-            name = self.server.logname  # type: ignore  # noqa
-        else:
-            name = record.name
-        logger = logging.getLogger(name)
-        # N.B. EVERY record gets logged. This is because Logger.handle
-        # is normally called AFTER logger-level filtering. If you want
-        # to do filtering, do it at the client end to save wasting
-        # cycles and network bandwidth!
-        logger.handle(record)
+        _handle_log_record(record, self.server.logname)  # type: ignore  # noqa
+
+
+def _handle_log_record(record: logging.LogRecord, logname: Optional[str]) -> None:
+    if logname is not None:
+        name = logname
+    else:
+        name = record.name
+    logger = logging.getLogger(name)
+    # N.B. EVERY record gets logged. This is because Logger.handle
+    # is normally called AFTER logger-level filtering. Client loggers
+    # filter by the level the log server publishes to them, see
+    # ClientLevels, to save wasting cycles and network bandwidth!
+    logger.handle(record)
 
 
 def start_log_server(
@@ -256,32 +790,66 @@ def start_log_server(
     filename: str,
     logging_config: Optional[Dict[str, Dict[str, Any]]],
     output_dir: str,
+    receiver_type: str = "threading",
+    unix_socket: Optional[str] = None,
 ) -> None:
+    """
+    Receives the records of all client loggers and logs them according to
+    the logging config, until event is set.
+
+    receiver_type chooses the receiver: "threading" serves every client
+    connection on its own thread, "selector" serves all of them from a
+    single thread, which scales to many clients and stops right away when
+    event is set. The selector receiver also reads the records of clients
+    on the same host from the LogRing they offer, see BatchingOptions.
+
+    If unix_socket is given, the server listens on a Unix domain socket at
+    this path instead of a TCP port and sets port to -1 once it listens.
+    Client loggers then connect with the path as host and a port of None.
+    Workers on other hosts need a server listening on a TCP port.
+    """
+    if receiver_type not in LOG_RECEIVERS:
+        raise ValueError(
+            "Unknown receiver_type %s, choose from %s" % (receiver_type, sorted(LOG_RECEIVERS))
+        )
     setup_logger(filename=filename, logging_config=logging_config, output_dir=output_dir)
 
     while True:
-        # Loop until we find a valid port
-        _port = random.randint(10000, 65535)
+        # Loop until we find a valid port. A Unix domain socket has a fixed
+        # path, which is published as port -1
+        _port = None if unix_socket is not None else random.randint(10000, 65535)
         try:
-            receiver = LogRecordSocketReceiver(
-                host=host,
+            receiver = LOG_RECEIVERS[receiver_type](
+                host=host if unix_socket is None else unix_socket,
                 port=_port,
                 logname=logname,
                 event=event,
             )
             with port.get_lock():
-                port.value = _port
+                port.value = -1 if _port is None else _port
             receiver.serve_until_stopped()
             break
         except OSError:
+            if unix_socket is not None:
+                raise
             continue
 
 
+def _remove_unix_socket(path: str) -> None:
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
 class LogRecordSocketReceiver(socketserver.ThreadingTCPServer):
     """
     This class implement a entity that receives tcp messages on a given address
     For further information, please check
     https://docs.python.org/3/howto/logging-cookbook.html#configuration-server-example
+
+    With a port of None, it listens on a Unix domain socket at the path host.
     """
 
     allow_reuse_address = True
@@ -289,20 +857,309 @@ class LogRecordSocketReceiver(socketserver.ThreadingTCPServer):
     def __init__(
         self,
         host: str = "localhost",
-        port: int = logging.handlers.DEFAULT_TCP_LOGGING_PORT,
+        port: Optional[int] = logging.handlers.DEFAULT_TCP_LOGGING_PORT,
         handler: Type[LogRecordStreamHandler] = LogRecordStreamHandler,
         logname: Optional[str] = None,
         event: Optional[threading.Event] = None,
     ):
-        socketserver.ThreadingTCPServer.__init__(self, (host, port), handler)
+        if port is None:
+            # A log server which was not closed leaves its socket behind
+            _remove_unix_socket(host)
+            self.address_family = socket.AF_UNIX
+            server_address: Union[str, Tuple[str, int]] = host
+        else:
+            server_address = (host, port)
+        socketserver.ThreadingTCPServer.__init__(
+            self, server_address, handler  # type: ignore[arg-type]
+        )
+        self.unix_socket = host if port is None else None
         self.timeout = 1
         self.logname = logname
         self.event = event
+        self.levels = ClientLevels(logname)
 
     def serve_until_stopped(self) -> None:
-        while True:
-            rd, wr, ex = select.select([self.socket.fileno()], [], [], self.timeout)
-            if rd:
-                self.handle_request()
-            if self.event is not None and self.event.is_set():
+        try:
+            while True:
+                rd, wr, ex = select.select([self.socket.fileno()], [], [], self.timeout)
+                if rd:
+                    self.handle_request()
+                if self.event is not None and self.event.is_set():
+                    break
+        finally:
+            self.server_close()
+
+    def server_close(self) -> None:
+        socketserver.ThreadingTCPServer.server_close(self)
+        if self.unix_socket is not None:
+            _remove_unix_socket(self.unix_socket)
+
+
+class _Connection(object):
+    """A client connection of the SelectorLogRecordReceiver and its buffers."""
+
+    def __init__(self, sock: socket.socket, buffer_size: int, session: LogWireSession):
+        self.socket = sock
+        self.buffer = bytearray(buffer_size)
+        # Number of bytes received into the buffer, but not yet handled
+        self.filled = 0
+        self.session = session
+        # Frames to send which did not fit into the send buffer of the socket
+        self.outgoing = bytearray()
+        self.events = selectors.EVENT_READ
+        self.closed = False
+
+
+class SelectorLogRecordReceiver(object):
+    """
+    Receives log records from many clients on a single thread.
+
+    Unlike LogRecordSocketReceiver, which starts a thread per client, all
+    connections are multiplexed with a selector. Frames, a 4-byte length
+    followed by a pickled LogRecord dict as sent by a SocketHandler or by a
+    payload of the log_wire protocol, are received with recv_into into a
+    buffer per connection, which is reused for all frames and only grows for
+    frames larger than the buffer.
+
+    Frames to the clients, such as the levels published by levels, are sent
+    without blocking: what does not fit into the send buffer of a socket is
+    kept and sent once the socket is writable again.
+
+    Clients on the same host may write their records to a LogRing instead of
+    the connection. The receiver reads a ring when the client notifies it,
+    every ring_poll_interval seconds in case a notification got lost, and a
+    last time when the connection is closed.
+
+    With a port of None, the receiver listens on a Unix domain socket at the
+    path host. serve_until_stopped returns as soon as event is set or stop is
+    called.
+    """
+
+    # Seconds between two reads of the rings of the clients
+    ring_poll_interval = 0.05
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: Optional[int] = logging.handlers.DEFAULT_TCP_LOGGING_PORT,
+        logname: Optional[str] = None,
+        event: Optional[Any] = None,
+        buffer_size: int = 2**16,
+    ):
+        self.logname = logname
+        # A threading.Event or a multiprocessing.Event
+        self.event = event
+        self.buffer_size = buffer_size
+        self.levels = ClientLevels(logname)
+        self.unix_socket = host if port is None else None
+        if port is None:
+            # A log server which was not closed leaves its socket behind
+            _remove_unix_socket(host)
+        self.socket = _create_server(host, port)
+        self.socket.setblocking(False)
+        self.server_address = self.socket.getsockname()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.socket, selectors.EVENT_READ, None)
+        # stop, and sends from other threads, write to this socket pair to
+        # wake up the selector
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self.selector.register(self._wakeup_recv, selectors.EVENT_READ, None)
+        self._serving_thread = None  # type: Optional[int]
+        # Guards the outgoing buffers of the connections
+        self._send_lock = threading.Lock()
+        # The connections of clients writing to a LogRing
+        self._ring_connections = []  # type: List[_Connection]
+        self._next_ring_poll = 0.0
+
+    def stop(self) -> None:
+        """Makes serve_until_stopped return, can be called from any thread."""
+        try:
+            self._wakeup_send.send(b"\0")
+        except OSError:
+            # Already closed
+            pass
+
+    def _wait_for_event(self) -> None:
+        assert self.event is not None
+        self.event.wait()
+        self.stop()
+
+    def serve_until_stopped(self) -> None:
+        self._serving_thread = threading.get_ident()
+        if self.event is not None:
+            threading.Thread(
+                target=self._wait_for_event, name="LogServerStopper", daemon=True
+            ).start()
+        try:
+            while True:
+                timeout = None  # type: Optional[float]
+                if self._ring_connections:
+                    timeout = max(self._next_ring_poll - time.monotonic(), 0.0)
+                for key, mask in self.selector.select(timeout):
+                    if key.fileobj is self._wakeup_recv:
+                        if b"\0" in self._wakeup_recv.recv(4096):
+                            return
+                        self._flush_all()
+                    elif key.fileobj is self.socket:
+                        self._accept()
+                    else:
+                        if mask & selectors.EVENT_WRITE and not key.data.closed:
+                            self._flush(key.data)
+                        if mask & selectors.EVENT_READ and not key.data.closed:
+                            self._receive(key.data)
+                if self._ring_connections and time.monotonic() >= self._next_ring_poll:
+                    self._poll_rings()
+        finally:
+            self.server_close()
+
+    def _accept(self) -> None:
+        try:
+            sock, _ = self.socket.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        session = LogWireSession(levels=self.levels, accept_rings=True)
+        connection = _Connection(sock, self.buffer_size, session)
+        self.selector.register(sock, selectors.EVENT_READ, connection)
+        self.levels.subscribe(connection.session, lambda frame: self._send(connection, frame))
+
+    def _close_connection(self, connection: _Connection) -> None:
+        self.levels.unsubscribe(connection.session)
+        self.selector.unregister(connection.socket)
+        connection.socket.close()
+        connection.closed = True
+        if connection in self._ring_connections:
+            self._ring_connections.remove(connection)
+        # The client may have written records to its ring before closing
+        self._close_session(connection)
+
+    def _close_session(self, connection: _Connection) -> None:
+        try:
+            self._handle_records(connection.session.poll())
+        except Exception:
+            logging.getLogger(__name__).exception("Could not handle a log record")
+        finally:
+            connection.session.close()
+
+    def _poll_rings(self) -> None:
+        self._next_ring_poll = time.monotonic() + self.ring_poll_interval
+        for connection in list(self._ring_connections):
+            try:
+                self._handle_records(connection.session.poll())
+            except Exception:
+                logging.getLogger(__name__).exception("Could not handle a log record")
+                self._close_connection(connection)
+
+    def _send(self, connection: _Connection, frame: bytes) -> None:
+        """Sends a frame to a client, can be called from any thread."""
+        with self._send_lock:
+            if connection.closed:
+                return
+            connection.outgoing += frame
+        if threading.get_ident() == self._serving_thread:
+            self._flush(connection)
+        else:
+            try:
+                self._wakeup_send.send(b"\1")
+            except OSError:
+                # Already closed
+                pass
+
+    def _flush(self, connection: _Connection) -> None:
+        with self._send_lock:
+            if connection.outgoing:
+                try:
+                    n_bytes = connection.socket.send(connection.outgoing)
+                except BlockingIOError:
+                    n_bytes = 0
+                except OSError:
+                    # The connection is closed, which the next receive notices
+                    n_bytes = len(connection.outgoing)
+                del connection.outgoing[:n_bytes]
+            events = selectors.EVENT_READ
+            if connection.outgoing:
+                events |= selectors.EVENT_WRITE
+        if events != connection.events:
+            self.selector.modify(connection.socket, events, connection)
+            connection.events = events
+
+    def _flush_all(self) -> None:
+        for key in list(self.selector.get_map().values()):
+            if isinstance(key.data, _Connection) and not key.data.closed:
+                self._flush(key.data)
+
+    def _receive(self, connection: _Connection) -> None:
+        filled = connection.filled
+        try:
+            n_bytes = connection.socket.recv_into(memoryview(connection.buffer)[filled:])
+        except BlockingIOError:
+            return
+        except OSError:
+            n_bytes = 0
+        if n_bytes == 0:
+            self._close_connection(connection)
+            return
+        connection.filled += n_bytes
+
+        offset = 0
+        while connection.filled - offset >= 4:
+            (length,) = struct.unpack_from(">L", connection.buffer, offset)
+            start = offset + 4
+            end = start + length
+            if end > connection.filled:
                 break
+            with memoryview(connection.buffer) as view, view[start:end] as payload:
+                try:
+                    self.handle_frame(connection, payload)
+                except Exception:
+                    logging.getLogger(__name__).exception("Could not handle a log record")
+            offset = end
+
+        # Move the start of an incomplete frame to the front of the buffer and
+        # make room for all of it
+        filled = connection.filled
+        remaining = filled - offset
+        if offset > 0 and remaining > 0:
+            connection.buffer[:remaining] = connection.buffer[offset:filled]
+        connection.filled = remaining
+        if remaining >= 4:
+            (length,) = struct.unpack_from(">L", connection.buffer, 0)
+            if 4 + length > len(connection.buffer):
+                connection.buffer.extend(bytes(4 + length - len(connection.buffer)))
+
+    def handle_frame(self, connection: _Connection, payload: Union[bytes, memoryview]) -> None:
+        record_dicts, reply = connection.session.handle_frame(payload)
+        if reply is not None:
+            self._send(connection, reply)
+        # A HELLO frame may attach or detach a ring
+        has_ring = connection.session.ring is not None
+        if has_ring != (connection in self._ring_connections):
+            if has_ring:
+                self._ring_connections.append(connection)
+            else:
+                self._ring_connections.remove(connection)
+        self._handle_records(record_dicts)
+
+    def _handle_records(self, record_dicts: List[Dict[str, Any]]) -> None:
+        for record_dict in record_dicts:
+            _handle_log_record(logging.makeLogRecord(record_dict), self.logname)
+
+    def server_close(self) -> None:
+        for key in list(self.selector.get_map().values()):
+            if isinstance(key.data, _Connection):
+                key.data.socket.close()
+                self._close_session(key.data)
+        self._ring_connections = []
+        self.selector.close()
+        self.socket.close()
+        if self.unix_socket is not None:
+            _remove_unix_socket(self.unix_socket)
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+
+
+LOG_RECEIVERS = {
+    "threading": LogRecordSocketReceiver,
+    "selector": SelectorLogRecordReceiver,
+}  # type: Dict[str, Any]
@@ -0,0 +1,162 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Sequence, Tuple
+
+from .process_local import ProcessLocalState
+
+
+__all__ = ["LoadedModel", "ModelCache"]
+
+
+# (mtime, size, inode) of the file and (mtime, size) of each side file, or
+# None for a missing side file
+SIGNATURE_TYPE = Tuple[Tuple[int, int, int], Tuple[Optional[Tuple[int, int]], ...]]
+# (model, size, signature of the files it was loaded from)
+CACHE_ENTRY_TYPE = Tuple[Any, int, SIGNATURE_TYPE]
+
+
+class LoadedModel(NamedTuple):
+    """A model and its size, which load functions of a ModelCache may return."""
+
+    model: Any
+    size: int
+
+
+class ModelCache(ProcessLocalState):
+    """In-process LRU cache for unpickled models.
+
+    Entries are keyed by an arbitrary hashable key, e.g. (seed, idx, budget, kind),
+    and validated against the modification time, size and inode of the file
+    they were loaded from, so a run that was saved again is loaded again.
+    Side files read together with the file, e.g. the buffers of an
+    out-of-band pickle, are validated by their modification time and size.
+
+    The size of an entry is estimated by the length of its uncompressed pickle
+    and the least recently used entries are evicted once the sum of these
+    sizes exceeds max_bytes. Models larger than max_bytes are never cached.
+    A load function which reads compressed files, or arrays mapped from side
+    files, returns a LoadedModel to report that size, since the size of the
+    file on disk can be much smaller. For other load functions, the size of
+    the file is used.
+
+    Cached models are shared between all callers, they must not be modified.
+    Every process starts with an empty cache.
+    """
+
+    _config_attributes = ("max_bytes",)
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._reset()
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # type: OrderedDict[Hashable, CACHE_ENTRY_TYPE]
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "current_bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def get(
+        self,
+        key: Hashable,
+        file_path: str,
+        load: Optional[Callable[[str], Any]] = None,
+        side_files: Sequence[str] = (),
+    ) -> Any:
+        """
+        Returns the cached object for key, loading it from file_path on a miss
+        or if the file changed since it was cached.
+
+        Parameters
+        ----------
+        key: Hashable
+            Key of the entry
+        file_path: str
+            File the object is loaded from
+        load: Optional[Callable[[str], Any]]
+            Function loading the object, or a LoadedModel, from file_path,
+            unpickles the file by default
+        side_files: Sequence[str]
+            Further files load reads, which need not exist
+
+        Returns
+        -------
+        The cached or freshly loaded object
+        """
+        stat = os.stat(file_path)
+        signature = (
+            (stat.st_mtime_ns, stat.st_size, stat.st_ino),
+            tuple(_side_file_signature(side_file) for side_file in side_files),
+        )  # type: SIGNATURE_TYPE
+
+        with self._lock:
+            if key in self._entries:
+                model, _, cached_signature = self._entries[key]
+                if cached_signature == signature:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return model
+                self._remove(key)
+                self.invalidations += 1
+            self.misses += 1
+
+        if load is None:
+            load = _unpickle
+        loaded = load(file_path)
+        if isinstance(loaded, LoadedModel):
+            model, size = loaded
+        else:
+            model, size = loaded, stat.st_size
+        if size > self.max_bytes:
+            return model
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (model, size, signature)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                lru_key = next(iter(self._entries))
+                self._remove(lru_key)
+                self.evictions += 1
+        return model
+
+
+def _side_file_signature(file_path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _unpickle(file_path: str) -> LoadedModel:
+    with open(file_path, "rb") as fh:
+        return LoadedModel(pickle.load(fh), fh.tell())
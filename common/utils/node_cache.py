@@ -0,0 +1,151 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, BinaryIO, Callable, Dict, List, Tuple, cast
+
+from .process_local import ProcessLocalState
+
+
+__all__ = ["NodeLocalCache"]
+
+
+TMP_PREFIX = ".tmp_"
+
+
+class NodeLocalCache(ProcessLocalState):
+    """Node-local copies of files from a shared filesystem.
+
+    Files are copied into a directory on fast node-local storage, such as
+    /dev/shm or a local SSD, the first time they are read, or stored from the
+    data just written to them (write-through). Later reads are served from the
+    local copy, as long as the shared file still has the same inode, size and
+    modification time, which costs a single stat on the shared filesystem.
+
+    Several processes on the same node can share the cache directory. Copies
+    are published with an atomic rename, and the least recently used ones are
+    deleted whenever the copies take more than max_bytes. A copy can thus
+    disappear right after get_path returned it, in which case the caller
+    falls back to the shared file.
+    """
+
+    _config_attributes = ("directory", "max_bytes")
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._reset()
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _key(shared_path: str) -> str:
+        return hashlib.sha1(os.path.abspath(shared_path).encode("utf-8")).hexdigest()
+
+    def _local_path(self, shared_path: str, st: os.stat_result) -> str:
+        return os.path.join(
+            self.directory,
+            "%s.%d.%d.%d" % (self._key(shared_path), st.st_ino, st.st_size, st.st_mtime_ns),
+        )
+
+    def get_path(self, shared_path: str) -> str:
+        """
+        Returns the path of an up to date local copy of shared_path, copying
+        the file if needed. Files larger than max_bytes are not cached and
+        their shared path is returned.
+
+        Raises FileNotFoundError if shared_path does not exist.
+        """
+        st = os.stat(shared_path)
+        local_path = self._local_path(shared_path, st)
+        try:
+            # Refresh the modification time, which orders the copies for eviction
+            os.utime(local_path)
+            self._count("hits")
+            return local_path
+        except FileNotFoundError:
+            pass
+
+        self._count("misses")
+        if st.st_size > self.max_bytes:
+            return shared_path
+
+        def copy(fh: BinaryIO) -> None:
+            with open(shared_path, "rb") as shared_fh:
+                shutil.copyfileobj(shared_fh, fh, 2**20)
+
+        self._store(shared_path, local_path, copy)
+        return local_path
+
+    def put(self, shared_path: str, data: bytes) -> None:
+        """
+        Stores the data which was just written to shared_path as its local
+        copy, without reading the shared file back. Only a stat of
+        shared_path is needed to tell later reads whether the copy is still
+        up to date.
+
+        Raises FileNotFoundError if shared_path does not exist.
+        """
+        st = os.stat(shared_path)
+        if st.st_size != len(data) or st.st_size > self.max_bytes:
+            # Written to since, or too large to be cached
+            return
+        local_path = self._local_path(shared_path, st)
+        self._store(shared_path, local_path, lambda fh: fh.write(data))
+
+    def _store(self, shared_path: str, local_path: str, write: Callable[[BinaryIO], Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=self.directory, prefix=TMP_PREFIX, delete=False
+        ) as fh:
+            write(cast(BinaryIO, fh))
+            tempname = fh.name
+        os.rename(tempname, local_path)
+
+        # Outdated copies of the same file are of no use anymore
+        key = self._key(shared_path)
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(key + ".") and entry.path != local_path:
+                self._remove(entry.path)
+        self._evict(keep=local_path)
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep: str) -> None:
+        copies: List[Tuple[int, str, int]] = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(TMP_PREFIX):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            copies.append((st.st_mtime_ns, entry.path, st.st_size))
+        n_bytes = sum(size for _, _, size in copies)
+        for _, path, size in sorted(copies):
+            if n_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            self._count("evictions")
+            n_bytes -= size
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
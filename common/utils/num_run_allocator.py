@@ -0,0 +1,97 @@
+import fcntl
+import os
+import threading
+
+from .process_local import ProcessLocalState
+
+
+__all__ = ["NumRunAllocator"]
+
+
+class NumRunAllocator(ProcessLocalState):
+    """Hands out unique num_runs to all backends sharing a directory.
+
+    The highest reserved num_run is stored in a counter file, which is read
+    and advanced under an exclusive lock, so that concurrent processes, also
+    on different nodes of a shared filesystem, never receive the same
+    num_run. Each allocation costs one locked read and write of the counter,
+    independent of the number of runs.
+
+    With a block_size larger than one, a whole range of num_runs is reserved
+    at once and handed out locally, which reduces the contention on the
+    counter file when thousands of workers allocate concurrently. num_runs
+    are then still unique, but no longer allocated in increasing order across
+    workers, and unused num_runs of a block are skipped. Copies of a backend
+    in other processes never hand out num_runs from the same block.
+    """
+
+    _config_attributes = ("counter_path", "block_size")
+
+    def __init__(self, counter_path: str, block_size: int = 1):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1, got %d" % block_size)
+        self.counter_path = counter_path
+        self.block_size = block_size
+        self._reset()
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        # Next num_run to hand out and the end of the reserved block
+        self._next = 0
+        self._end = 0
+
+    @staticmethod
+    def _read(fd: int) -> int:
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            return int(os.read(fd, 64).decode("ascii").strip() or 0)
+        except ValueError:
+            # A writer crashed while updating the counter. The callers'
+            # floor, e.g. from the run index, keeps num_runs unique
+            return 0
+
+    def _reserve(self, floor: int) -> None:
+        fd = os.open(self.counter_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            start = max(self._read(fd), floor) + 1
+            end = start + self.block_size
+            data = str(end - 1).encode("ascii")
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, data)
+            os.ftruncate(fd, len(data))
+        finally:
+            # Closing the file releases the lock
+            os.close(fd)
+        self._next, self._end = start, end
+
+    def allocate(self, floor: int = 0) -> int:
+        """
+        Returns a num_run which was never returned before by any allocator
+        sharing the counter file.
+
+        Parameters
+        ----------
+        floor: int
+            num_runs up to floor are taken already, e.g. by runs which were
+            saved without allocating their num_run. Only considered when a
+            new block is reserved
+        """
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve(floor)
+            num_run = self._next
+            self._next += 1
+            return num_run
+
+    def peek(self) -> int:
+        """Returns the highest num_run reserved so far by any allocator."""
+        try:
+            fd = os.open(self.counter_path, os.O_RDONLY)
+        except FileNotFoundError:
+            return 0
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            return self._read(fd)
+        finally:
+            os.close(fd)
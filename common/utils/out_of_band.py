@@ -0,0 +1,162 @@
+import mmap
+import os
+import pickle
+import struct
+from typing import Any, BinaryIO, List, Optional, Tuple
+
+from .compression import open_compressed_reader, open_compressed_writer
+
+
+__all__ = [
+    "dump_out_of_band",
+    "load_out_of_band",
+    "load_out_of_band_with_size",
+    "supports_out_of_band",
+]
+
+
+# Files with out-of-band buffers start with MAGIC, a format version and a table
+# of the (offset, length) of each buffer in the side file. The (possibly
+# compressed) pickle follows. Files without out-of-band buffers have no header.
+MAGIC = b"AMLB"
+VERSION = 1
+BUFFERS_SUFFIX = ".buffers"
+# Buffers are aligned in the side file, so that arrays mapped from it are
+# aligned for any dtype
+ALIGNMENT = 64
+# Buffers smaller than this are kept in-band
+MIN_BUFFER_SIZE = 2**20
+
+
+def supports_out_of_band() -> bool:
+    # Out-of-band buffers were introduced with pickle protocol 5 in Python 3.8
+    return pickle.HIGHEST_PROTOCOL >= 5
+
+
+def get_buffers_filename(file_path: str) -> str:
+    return file_path + BUFFERS_SUFFIX
+
+
+def dump_out_of_band(
+    obj: Any,
+    file_path: str,
+    codec: str = "none",
+    min_buffer_size: int = MIN_BUFFER_SIZE,
+) -> None:
+    """
+    Pickles obj into file_path with pickle protocol 5. Buffers of at least
+    min_buffer_size bytes, e.g. the data of large numpy arrays, are not copied
+    into the pickle but written to an aligned side file, file_path.buffers,
+    from where load_out_of_band maps them back without copying.
+
+    Parameters
+    ----------
+    obj: Any
+        Object to pickle
+    file_path: str
+        File to write the pickle to
+    codec: str
+        Compression codec of the pickle, the side file is never compressed
+    min_buffer_size: int
+        Smaller buffers are kept in the pickle
+    """
+    if not supports_out_of_band():
+        raise ValueError("Out-of-band buffers require pickle protocol 5 (Python >= 3.8)")
+
+    table: List[Tuple[int, int]] = []
+    with open(get_buffers_filename(file_path), "wb") as buffers_fh:
+
+        def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+            raw = buffer.raw()
+            if raw.nbytes < min_buffer_size:
+                # Serialize in-band
+                return True
+            offset = buffers_fh.tell()
+            padding = -offset % ALIGNMENT
+            buffers_fh.write(b"\0" * padding)
+            table.append((offset + padding, raw.nbytes))
+            buffers_fh.write(raw)
+            return False
+
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+
+    if len(table) == 0:
+        os.remove(get_buffers_filename(file_path))
+
+    with open(file_path, "wb") as fh:
+        if len(table) > 0:
+            fh.write(MAGIC + struct.pack("<BI", VERSION, len(table)))
+            fh.write(b"".join(struct.pack("<QQ", offset, length) for offset, length in table))
+        stream = open_compressed_writer(fh, codec)
+        stream.write(data)
+        stream.close()
+
+
+class _CountingReader(object):
+    """Passes reads through to a stream and counts the bytes read."""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self.n_bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self.n_bytes += len(data)
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        data = self._stream.readline(size)
+        self.n_bytes += len(data)
+        return data
+
+
+def load_out_of_band(fh: BinaryIO, file_path: str, side_file: Optional[memoryview] = None) -> Any:
+    """
+    Unpickles an object from fh, which was opened from file_path. If the object
+    was written with out-of-band buffers, their side file is memory-mapped and
+    the buffers are handed to the unpickler without copying. The mapping is
+    private, so modifying the loaded arrays never changes the side file.
+
+    side_file can provide the content of the side file instead, e.g. as a view
+    of an archive the files were packed into.
+
+    Files written by compression.compressed_dump or plain pickles are read as well.
+    """
+    return load_out_of_band_with_size(fh, file_path, side_file)[0]
+
+
+def load_out_of_band_with_size(
+    fh: BinaryIO, file_path: str, side_file: Optional[memoryview] = None
+) -> Tuple[Any, int]:
+    """
+    Like load_out_of_band, but also returns the size of the object as the
+    length of its uncompressed pickle plus the length of its out-of-band
+    buffers, an estimate of the memory it takes which does not depend on how
+    the file was compressed.
+    """
+    start = fh.tell()
+    if fh.read(len(MAGIC)) != MAGIC:
+        fh.seek(start)
+        stream = open_compressed_reader(fh)
+        if stream is fh:
+            # A plain pickle ends where the unpickler stopped reading
+            return pickle.load(fh), fh.tell() - start
+        reader = _CountingReader(stream)
+        return pickle.load(reader), reader.n_bytes
+
+    version, n_buffers = struct.unpack("<BI", fh.read(5))
+    if version != VERSION:
+        raise ValueError("Unsupported out-of-band file format version %d" % version)
+    table = [struct.unpack("<QQ", fh.read(16)) for _ in range(n_buffers)]
+
+    if side_file is None:
+        with open(get_buffers_filename(file_path), "rb") as buffers_fh:
+            mapping = mmap.mmap(buffers_fh.fileno(), 0, access=mmap.ACCESS_COPY)
+        side_file = memoryview(mapping)
+    buffers = []
+    for offset, length in table:
+        end = offset + length
+        buffers.append(side_file[offset:end])
+    reader = _CountingReader(open_compressed_reader(fh))
+    obj = pickle.load(reader, buffers=buffers)
+    return obj, reader.n_bytes + sum(length for _, length in table)
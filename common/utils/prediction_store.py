@@ -0,0 +1,245 @@
+import fcntl
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple, cast
+
+import numpy as np
+
+from .process_local import ProcessLocalState
+
+
+__all__ = ["PredictionStore"]
+
+
+IDENTIFIER_TYPE = Tuple[int, int, float]
+
+
+class PredictionStore(ProcessLocalState):
+    """Append-only store of the predictions of all runs on one subset.
+
+    The predictions are kept in a single raw file that is memory-mapped as a
+    3-D array of shape [n_rows, n_data_points, n_targets], so that the input
+    of AbstractEnsemble.fit can be obtained by indexing the mapping instead
+    of loading and stacking one file per run.
+
+    The directory of a store contains:
+    * meta.json, the shape and dtype of a single row
+    * data.bin, the raw rows, preallocated in chunks that double in size
+    * rows.index, append-only json lines mapping an identifier to its row,
+      or removing it again with a tombstone. The rows of removed runs are
+      not reused
+
+    Writers serialize on a lock file, so that several workers can append to
+    the same store. Readers only take the lock-free path, other processes
+    map the data again and re-read the row index.
+    """
+
+    _config_attributes = ("directory", "initial_capacity")
+
+    def __init__(self, directory: str, initial_capacity: int = 64):
+        self.directory = directory
+        self.initial_capacity = initial_capacity
+        self._reset()
+
+    def _reset(self) -> None:
+        self._rows: Dict[IDENTIFIER_TYPE, int] = {}
+        self._n_rows = 0
+        self._offset = 0
+        self._row_shape: Optional[Tuple[int, ...]] = None
+        self._dtype: Optional[np.dtype] = None
+        self._mmap: Optional[np.memmap] = None
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    @property
+    def _data_path(self) -> str:
+        return os.path.join(self.directory, "data.bin")
+
+    @property
+    def _rows_path(self) -> str:
+        return os.path.join(self.directory, "rows.index")
+
+    @property
+    def _lock_path(self) -> str:
+        return os.path.join(self.directory, "lock")
+
+    def _read_meta(self) -> bool:
+        if self._row_shape is not None:
+            return True
+        try:
+            with open(self._meta_path, "r") as fh:
+                meta = json.load(fh)
+        except FileNotFoundError:
+            return False
+        self._row_shape = tuple(meta["shape"])
+        self._dtype = np.dtype(meta["dtype"])
+        return True
+
+    def _row_nbytes(self) -> int:
+        assert self._row_shape is not None and self._dtype is not None
+        return int(np.prod(self._row_shape)) * self._dtype.itemsize
+
+    def refresh(self) -> None:
+        """
+        Reads the rows appended to the store since the last call.
+        """
+        if not self._read_meta():
+            return
+        try:
+            with open(self._rows_path, "rb") as fh:
+                fh.seek(self._offset)
+                data = fh.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            entry = json.loads(line.decode("utf-8"))
+            identifier = (int(entry["seed"]), int(entry["num_run"]), float(entry["budget"]))
+            if entry.get("deleted", False):
+                self._rows.pop(identifier, None)
+                continue
+            self._rows[identifier] = int(entry["row"])
+            self._n_rows = max(self._n_rows, int(entry["row"]) + 1)
+        self._offset += end
+
+    def append(self, identifier: IDENTIFIER_TYPE, predictions: np.ndarray) -> int:
+        """
+        Writes the predictions of a run into the next free row of the store.
+
+        Parameters
+        ----------
+        identifier: Tuple[int, int, float]
+            (seed, num_run, budget) of the run
+        predictions: np.ndarray
+            Predictions of the run, all rows of a store share the same shape
+
+        Returns
+        -------
+        row: int
+            The row the predictions were written to
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                if not self._read_meta():
+                    meta = {"shape": list(predictions.shape), "dtype": predictions.dtype.str}
+                    with tempfile.NamedTemporaryFile("w", dir=self.directory, delete=False) as fh:
+                        json.dump(meta, fh)
+                        tempname = fh.name
+                    os.rename(tempname, self._meta_path)
+                    self._read_meta()
+                if tuple(predictions.shape) != self._row_shape:
+                    raise ValueError(
+                        "Predictions of shape %s can not be stored together with predictions "
+                        "of shape %s" % (predictions.shape, self._row_shape)
+                    )
+                self.refresh()
+                row = self._n_rows
+                row_nbytes = self._row_nbytes()
+
+                fd = os.open(self._data_path, os.O_RDWR | os.O_CREAT, 0o644)
+                with os.fdopen(fd, "r+b") as fh:
+                    size = os.fstat(fh.fileno()).st_size
+                    if size < (row + 1) * row_nbytes:
+                        # Grow the preallocated (sparse) file geometrically
+                        capacity = max(
+                            self.initial_capacity, 2 * size // max(row_nbytes, 1), row + 1
+                        )
+                        fh.truncate(capacity * row_nbytes)
+                    fh.seek(row * row_nbytes)
+                    fh.write(np.ascontiguousarray(predictions, dtype=self._dtype).tobytes())
+                    fh.flush()
+
+                line = json.dumps(
+                    {
+                        "seed": identifier[0],
+                        "num_run": identifier[1],
+                        "budget": identifier[2],
+                        "row": row,
+                    }
+                )
+                with open(self._rows_path, "a") as fh:
+                    fh.write(line + "\n")
+                self.refresh()
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+        return row
+
+    def remove(self, identifier: IDENTIFIER_TYPE) -> None:
+        """
+        Removes the predictions of a run from the store by appending a
+        tombstone to the row index, e.g. after the run was pruned.
+        """
+        if identifier not in self:
+            return
+        line = json.dumps(
+            {
+                "seed": identifier[0],
+                "num_run": identifier[1],
+                "budget": identifier[2],
+                "deleted": True,
+            }
+        )
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                with open(self._rows_path, "a") as fh:
+                    fh.write(line + "\n")
+                self.refresh()
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _get_mmap(self) -> np.memmap:
+        assert self._row_shape is not None
+        if self._mmap is None or self._mmap.shape[0] < self._n_rows:
+            self._mmap = np.memmap(
+                self._data_path,
+                dtype=self._dtype,
+                mode="r",
+                shape=(self._n_rows,) + self._row_shape,
+            )
+        return self._mmap
+
+    def __contains__(self, identifier: IDENTIFIER_TYPE) -> bool:
+        self.refresh()
+        return identifier in self._rows
+
+    def list_identifiers(self) -> List[IDENTIFIER_TYPE]:
+        self.refresh()
+        return sorted(self._rows)
+
+    def get(self, identifiers: Sequence[IDENTIFIER_TYPE]) -> np.ndarray:
+        """
+        Returns the predictions of the given runs, in the given order.
+
+        If the requested rows are consecutive in the store, a read-only view
+        of the memory mapping is returned, otherwise the rows are gathered
+        into a single new array.
+
+        Parameters
+        ----------
+        identifiers: Sequence[Tuple[int, int, float]]
+            (seed, num_run, budget) of the runs
+
+        Returns
+        -------
+        predictions: array of shape = [n_identifiers, n_data_points, n_targets]
+        """
+        self.refresh()
+        missing = [identifier for identifier in identifiers if identifier not in self._rows]
+        if len(missing) > 0:
+            raise KeyError("No predictions stored for %s" % missing)
+        if self._row_shape is None:
+            raise KeyError("The prediction store %s is empty" % self.directory)
+        rows = [self._rows[identifier] for identifier in identifiers]
+        if len(rows) == 0:
+            return np.empty((0,) + self._row_shape, dtype=self._dtype)
+        mmap = self._get_mmap()
+        start, stop = rows[0], rows[0] + len(rows)
+        if rows == list(range(start, stop)):
+            return mmap[start:stop]
+        return cast(np.ndarray, np.asarray(mmap[rows]))
@@ -0,0 +1,27 @@
+from typing import Any, Dict, Tuple
+
+
+__all__ = ["ProcessLocalState"]
+
+
+class ProcessLocalState(object):
+    """Base class of objects whose state, apart from their configuration, only
+    makes sense within one process, e.g. locks, threads or memory mappings.
+
+    When pickled, e.g. when the Backend is sent to a worker, only the
+    attributes named in _config_attributes are kept, and the receiving process
+    recreates everything else by calling _reset.
+    """
+
+    _config_attributes: Tuple[str, ...] = ()
+
+    def _reset(self) -> None:
+        raise NotImplementedError()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self._config_attributes}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for name in self._config_attributes:
+            setattr(self, name, state[name])
+        self._reset()
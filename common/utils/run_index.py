@@ -0,0 +1,263 @@
+import bisect
+import contextlib
+import fcntl
+import json
+import os
+import re
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+__all__ = ["RunIndex", "parse_budget"]
+
+
+RUN_IDENTIFIER_TYPE = Tuple[int, int, float]
+RUN_DIR_PATTERN = r"\d+_\d+_\d+"
+
+
+def parse_budget(budget: Any) -> float:
+    """
+    Translates the budget token of a run directory, or the budget of an index
+    entry, into a budget which is formatted like the token again. Run
+    directories and their files are named after "%s" % budget, so a run saved
+    with an integer budget, e.g. 1_2_0, keeps an integer budget.
+    """
+    if isinstance(budget, int) or (isinstance(budget, str) and budget.isdigit()):
+        return int(budget)
+    return float(budget)
+
+
+def parse_run_dir(run_dir: str) -> Optional[RUN_IDENTIFIER_TYPE]:
+    """
+    Translates the base name of a run directory, <seed>_<num_run>_<budget>,
+    into its identifier. The budget is parsed with parse_budget, so that the
+    identifier leads back to the directory.
+
+    Parameters
+    ----------
+    run_dir: str
+        base name of the run directory
+
+    Returns
+    -------
+    identifier: Optional[Tuple[int, int, float]]
+        (seed, num_run, budget) or None if run_dir is not a run directory
+    """
+    if not re.match(RUN_DIR_PATTERN, run_dir):
+        return None
+    try:
+        seed, num_run, budget = run_dir.split("_", 2)
+        return int(seed), int(num_run), parse_budget(budget)
+    except ValueError:
+        return None
+
+
+class RunIndex(object):
+    """Persistent, append-only index of the run directories of a Backend.
+
+    Every line of the index file is a json entry describing one run directory:
+    its seed, num_run and budget, the artifacts it contains with their sizes
+    and the time it was published. Later entries supersede earlier ones with
+    the same identifier, which allows writers to only ever append. A run is
+    removed from the index by appending a tombstone entry.
+
+    Readers keep the parsed entries in memory, with their identifiers in sorted
+    order, and only read the lines appended since their last refresh, so
+    queries neither list the runs directory nor sort all runs again.
+    If the index is missing, or the runs directory changed after the last
+    append (for example because a run was deleted by hand), the index is
+    rebuilt from the runs directory.
+
+    Appends hold a shared and rebuilds an exclusive lock on a lock file next
+    to the index, so that a rebuild can not replace the index between a run
+    being published and its entry being appended.
+    """
+
+    def __init__(self, runs_directory: str, index_path: str, grace_period: float = 5.0):
+        self.runs_directory = runs_directory
+        self.index_path = index_path
+        # Writers rename their run directory before appending to the index.
+        # A modification of the runs directory is only considered a sign of
+        # staleness if the index was not updated within this many seconds
+        self.grace_period = grace_period
+        self.lock_path = index_path + ".lock"
+        self._reset()
+
+    def _reset(self) -> None:
+        self._entries = {}  # type: Dict[RUN_IDENTIFIER_TYPE, Dict[str, Any]]
+        self._identifiers = []  # type: List[RUN_IDENTIFIER_TYPE]
+        self._max_num_run = 0
+        self._offset = 0
+        self._inode = None  # type: Optional[int]
+
+    @staticmethod
+    def make_entry(
+        seed: int,
+        num_run: int,
+        budget: float,
+        artifacts: Dict[str, int],
+        mtime: float,
+    ) -> Dict[str, Any]:
+        return {
+            "seed": seed,
+            "num_run": num_run,
+            "budget": budget,
+            "artifacts": artifacts,
+            "mtime": mtime,
+        }
+
+    @staticmethod
+    def make_tombstone(seed: int, num_run: int, budget: float) -> Dict[str, Any]:
+        return {"seed": seed, "num_run": num_run, "budget": budget, "deleted": True}
+
+    @staticmethod
+    def identifier(entry: Dict[str, Any]) -> RUN_IDENTIFIER_TYPE:
+        """(seed, num_run, budget) of an entry, which leads back to its run directory."""
+        return int(entry["seed"]), int(entry["num_run"]), parse_budget(entry["budget"])
+
+    def _add(self, entry: Dict[str, Any]) -> None:
+        identifier = self.identifier(entry)
+        # num_run is never handed out again, even if the run was deleted
+        self._max_num_run = max(self._max_num_run, identifier[1])
+        if entry.get("deleted", False):
+            if self._entries.pop(identifier, None) is not None:
+                del self._identifiers[bisect.bisect_left(self._identifiers, identifier)]
+        else:
+            if identifier not in self._entries:
+                bisect.insort(self._identifiers, identifier)
+            self._entries[identifier] = entry
+
+    @contextlib.contextmanager
+    def _locked(self, operation: int) -> Iterator[None]:
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+            yield
+        finally:
+            # Closing the file releases the lock
+            os.close(fd)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """
+        Appends an entry to the index file.
+
+        The entry is written with a single write on a file opened with O_APPEND,
+        so concurrent writers never interleave their lines. Writers only share
+        the lock, a rebuild waits until their entries are appended and lists
+        their runs afterwards.
+        """
+        line = (json.dumps(entry, sort_keys=True) + "\n").encode("utf-8")
+        with self._locked(fcntl.LOCK_SH):
+            fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+
+    def is_stale(self) -> bool:
+        try:
+            index_mtime = os.stat(self.index_path).st_mtime
+        except FileNotFoundError:
+            return True
+        try:
+            runs_mtime = os.stat(self.runs_directory).st_mtime
+        except FileNotFoundError:
+            return False
+        return runs_mtime > index_mtime + self.grace_period
+
+    def refresh(self) -> None:
+        """
+        Brings the in-memory view up to date, reading only the entries that
+        were appended since the last call.
+        """
+        if self.is_stale():
+            self.rebuild()
+            return
+
+        try:
+            with open(self.index_path, "rb") as fh:
+                inode = os.fstat(fh.fileno()).st_ino
+                if inode != self._inode:
+                    # The index was rebuilt by someone else
+                    self._reset()
+                    self._inode = inode
+                fh.seek(self._offset)
+                data = fh.read()
+        except FileNotFoundError:
+            self.rebuild()
+            return
+
+        # A concurrent writer might not have finished its line yet
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                self._add(json.loads(line.decode("utf-8")))
+            except ValueError:
+                continue
+        self._offset += end
+
+    def rebuild(self) -> None:
+        """
+        Recreates the index from the content of the runs directory and
+        atomically replaces the index file.
+        """
+        with self._locked(fcntl.LOCK_EX):
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._reset()
+        entries = []
+        try:
+            run_dirs = list(os.scandir(self.runs_directory))
+        except FileNotFoundError:
+            run_dirs = []
+        for run_dir in run_dirs:
+            identifier = parse_run_dir(run_dir.name)
+            if identifier is None or not run_dir.is_dir():
+                continue
+            try:
+                artifacts = {
+                    artifact.name: artifact.stat().st_size for artifact in os.scandir(run_dir.path)
+                }
+                mtime = run_dir.stat().st_mtime
+            except FileNotFoundError:
+                # Deleted while we were scanning
+                continue
+            entries.append(self.make_entry(*identifier, artifacts=artifacts, mtime=mtime))
+
+        data = "".join(json.dumps(entry, sort_keys=True) + "\n" for entry in entries)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=os.path.dirname(self.index_path), delete=False
+        ) as fh:
+            fh.write(data)
+            tempname = fh.name
+        os.rename(tempname, self.index_path)
+
+        for entry in entries:
+            self._add(entry)
+        self._offset = len(data.encode("utf-8"))
+        self._inode = os.stat(self.index_path).st_ino
+
+    def get_max_num_run(self) -> int:
+        self.refresh()
+        return self._max_num_run
+
+    def get(self, seed: int, num_run: int, budget: float) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        return self._entries.get((seed, num_run, float(budget)))
+
+    def list_entries(self, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+        self.refresh()
+        if seed is None:
+            identifiers = self._identifiers
+        else:
+            # The runs of a seed are a contiguous range of the sorted identifiers
+            start = bisect.bisect_left(self._identifiers, (seed,))
+            end = bisect.bisect_left(self._identifiers, (seed + 1,))
+            identifiers = self._identifiers[start:end]
+        return [self._entries[identifier] for identifier in identifiers]
+
+    def list_runs(self, seed: Optional[int] = None) -> List[RUN_IDENTIFIER_TYPE]:
+        return [self.identifier(entry) for entry in self.list_entries(seed)]
@@ -0,0 +1,213 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+from typing import Any, BinaryIO, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+__all__ = [
+    "CHECKSUM_ALGORITHM",
+    "CorruptArtifactError",
+    "HashingWriter",
+    "VERIFY_MODES",
+    "array_metadata",
+    "available_checksum_algorithms",
+    "check_checksum_algorithm",
+    "checksum",
+    "file_checksum",
+    "read_run_metadata",
+    "verify_artifact",
+    "verify_data",
+    "write_run_metadata",
+]
+
+
+# xxh3 hashes several GB/s, much faster than any cryptographic hash. As the
+# checksums only detect damaged files, not tampering, it is preferred if available
+CHECKSUM_ALGORITHM = "blake2b" if xxhash is None else "xxh3_64"
+# "size" only compares the file sizes, "full" hashes the whole files
+VERIFY_MODES = ("size", "full")
+
+
+class CorruptArtifactError(ValueError):
+    """Raised when an artifact does not match the size or checksum recorded for it."""
+
+
+def available_checksum_algorithms() -> List[str]:
+    """Returns the checksum algorithms which can be used, "none" disables checksums."""
+    algorithms = ["none", "blake2b", "sha256"]
+    if xxhash is not None:
+        algorithms.append("xxh3_64")
+    return algorithms
+
+
+def check_checksum_algorithm(algorithm: str) -> None:
+    if algorithm not in available_checksum_algorithms():
+        raise ValueError(
+            "Unknown or unavailable checksum algorithm %s, choose from %s"
+            % (algorithm, available_checksum_algorithms())
+        )
+
+
+def _new_hash(algorithm: str) -> Any:
+    if algorithm == "none":
+        return None
+    if algorithm == "xxh3_64":
+        return xxhash.xxh3_64()
+    return hashlib.new(algorithm)
+
+
+class HashingWriter(io.RawIOBase):
+    """Passes writes through to a file while hashing them.
+
+    This computes the checksum of an artifact while it is written, instead
+    of reading the artifact back afterwards. Closing the writer leaves the
+    file open.
+    """
+
+    def __init__(self, fh: BinaryIO, algorithm: str = CHECKSUM_ALGORITHM):
+        self._fh = fh
+        self._hash = _new_hash(algorithm)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        if self._hash is not None:
+            self._hash.update(data)
+        self._fh.write(data)
+        return memoryview(data).nbytes
+
+    def hexdigest(self) -> Optional[str]:
+        """Returns the checksum of everything written, None for the algorithm "none"."""
+        return None if self._hash is None else str(self._hash.hexdigest())
+
+
+def checksum(data: bytes, algorithm: str = CHECKSUM_ALGORITHM) -> Optional[str]:
+    data_hash = _new_hash(algorithm)
+    if data_hash is None:
+        return None
+    data_hash.update(data)
+    return str(data_hash.hexdigest())
+
+
+def file_checksum(
+    file_path: str, algorithm: str = CHECKSUM_ALGORITHM, chunk_size: int = 2**20
+) -> Optional[str]:
+    """Returns the checksum of the content of a file, read in chunks."""
+    file_hash = _new_hash(algorithm)
+    if file_hash is None:
+        return None
+    with open(file_path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return str(file_hash.hexdigest())
+
+
+def _check_mode(mode: str) -> None:
+    if mode not in VERIFY_MODES:
+        raise ValueError("Unknown verify mode %s, choose from %s" % (mode, VERIFY_MODES))
+
+
+def _check_size(name: str, size: int, expected: Dict[str, Any]) -> None:
+    if size != expected["size"]:
+        raise CorruptArtifactError(
+            "%s has %d bytes instead of %d, it was probably only partially written"
+            % (name, size, expected["size"])
+        )
+
+
+def _can_verify_checksum(expected: Dict[str, Any], algorithm: str, mode: str) -> bool:
+    return (
+        mode == "full"
+        and expected.get("checksum") is not None
+        and algorithm != "none"
+        and algorithm in available_checksum_algorithms()
+    )
+
+
+def verify_artifact(
+    file_path: str, expected: Dict[str, Any], algorithm: str, mode: str = "full"
+) -> None:
+    """
+    Checks that a file matches the size and checksum recorded in the run
+    metadata and raises a CorruptArtifactError if it does not.
+
+    Parameters
+    ----------
+    file_path: str
+        File to check
+    expected: Dict[str, Any]
+        Entry of the file in the artifacts of the run metadata, with its size
+        and checksum
+    algorithm: str
+        Algorithm the checksum was computed with
+    mode: str
+        "size" only compares the size, which costs a single stat. "full" also
+        compares the checksum, if one was recorded with an available algorithm
+    """
+    _check_mode(mode)
+    try:
+        size = os.path.getsize(file_path)
+    except FileNotFoundError:
+        raise CorruptArtifactError("%s is missing" % file_path)
+    _check_size(file_path, size, expected)
+    if (
+        _can_verify_checksum(expected, algorithm, mode)
+        and file_checksum(file_path, algorithm) != expected["checksum"]
+    ):
+        raise CorruptArtifactError("The checksum of %s does not match" % file_path)
+
+
+def verify_data(
+    data: bytes, expected: Dict[str, Any], algorithm: str, mode: str = "full", name: str = "data"
+) -> None:
+    """Like verify_artifact, for data which was already read into memory."""
+    _check_mode(mode)
+    _check_size(name, len(data), expected)
+    if (
+        _can_verify_checksum(expected, algorithm, mode)
+        and checksum(data, algorithm) != expected["checksum"]
+    ):
+        raise CorruptArtifactError("The checksum of %s does not match" % name)
+
+
+def array_metadata(array: np.ndarray) -> Dict[str, Any]:
+    return {"shape": list(array.shape), "dtype": str(array.dtype)}
+
+
+def write_run_metadata(file_path: str, metadata: Dict[str, Any]) -> bytes:
+    """
+    Writes the metadata of a run as json and returns the bytes written. The
+    file is replaced atomically, so that it can also be updated inside a
+    published run directory.
+    """
+    data = json.dumps(metadata, sort_keys=True).encode("utf-8")
+    with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(file_path), delete=False) as fh:
+        fh.write(data)
+        tempname = fh.name
+    os.rename(tempname, file_path)
+    return data
+
+
+def read_run_metadata(file_path: str, missing_ok: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Reads the metadata of a run, None if the run has no metadata, e.g.
+    because it was saved by an older version. If missing_ok is False,
+    FileNotFoundError is raised instead.
+    """
+    try:
+        with open(file_path, "r") as fh:
+            return dict(json.load(fh))
+    except FileNotFoundError:
+        if not missing_ok:
+            raise
+        return None
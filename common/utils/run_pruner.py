@@ -0,0 +1,170 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .process_local import ProcessLocalState
+from .run_index import RunIndex
+
+
+__all__ = ["PeriodicTask", "PrunePolicy", "select_runs_to_prune"]
+
+
+RUN_IDENTIFIER_TYPE = Tuple[int, int, float]
+PRUNABLE_ARTIFACTS = ("all", "models", "predictions")
+
+
+class PrunePolicy(NamedTuple):
+    """Limits enforced on the runs directory by Backend.prune_runs.
+
+    Runs are pruned until the artifacts of all runs take at most max_bytes
+    and at most max_runs runs remain. The members of the keep_ensembles
+    latest ensembles and runs published less than min_age seconds ago are
+    never pruned.
+
+    artifacts decides what is deleted from a pruned run: "all" removes the
+    whole run, "models" only its model and cv model files, which keeps its
+    predictions available to the ensemble builder, and "predictions" only its
+    predictions. Only removing whole runs reduces the number of runs.
+    """
+
+    max_bytes: Optional[int] = None
+    max_runs: Optional[int] = None
+    keep_ensembles: int = 1
+    artifacts: str = "all"
+    min_age: float = 0.0
+
+
+def is_model_artifact(name: str) -> bool:
+    return name.endswith((".model", ".cv_model", ".model.buffers", ".cv_model.buffers"))
+
+
+def is_prediction_artifact(name: str) -> bool:
+    return name.startswith("predictions_")
+
+
+def _prunable(artifacts: Dict[str, int], what: str) -> Dict[str, int]:
+    if what == "models":
+        return {name: size for name, size in artifacts.items() if is_model_artifact(name)}
+    if what == "predictions":
+        return {name: size for name, size in artifacts.items() if is_prediction_artifact(name)}
+    return artifacts
+
+
+def select_runs_to_prune(
+    entries: List[Dict[str, Any]],
+    policy: PrunePolicy,
+    protected: Set[RUN_IDENTIFIER_TYPE],
+    last_used: Dict[RUN_IDENTIFIER_TYPE, float],
+    now: Optional[float] = None,
+) -> List[Tuple[RUN_IDENTIFIER_TYPE, List[str]]]:
+    """
+    Decides which artifacts of which runs to delete to satisfy the policy.
+
+    Runs which were never part of an ensemble go first, followed by the runs
+    which left the ensembles the longest time ago, as given by last_used.
+    Ties are broken by publication time, oldest first.
+
+    Parameters
+    ----------
+    entries: List[Dict[str, Any]]
+        Run index entries of all runs
+    policy: PrunePolicy
+        Limits to enforce
+    protected: Set[Tuple[int, int, float]]
+        Runs which must not be pruned
+    last_used: Dict[Tuple[int, int, float], float]
+        For every run which was part of an ensemble, the time of the latest
+        ensemble it was part of
+    now: Optional[float]
+        Current time, defaults to time.time()
+
+    Returns
+    -------
+    selected: List[Tuple[Tuple[int, int, float], List[str]]]
+        Identifier and names of the artifacts to delete, in pruning order
+    """
+    if policy.artifacts not in PRUNABLE_ARTIFACTS:
+        raise ValueError(
+            "Unknown artifacts %s, choose from %s" % (policy.artifacts, PRUNABLE_ARTIFACTS)
+        )
+    if now is None:
+        now = time.time()
+
+    def identifier(entry: Dict[str, Any]) -> RUN_IDENTIFIER_TYPE:
+        return RunIndex.identifier(entry)
+
+    n_bytes = sum(sum(entry["artifacts"].values()) for entry in entries)
+    n_runs = len(entries)
+
+    candidates = [
+        entry
+        for entry in entries
+        if identifier(entry) not in protected and now - entry["mtime"] >= policy.min_age
+    ]
+    candidates.sort(key=lambda entry: (last_used.get(identifier(entry), -1.0), entry["mtime"]))
+
+    selected = []  # type: List[Tuple[RUN_IDENTIFIER_TYPE, List[str]]]
+    for entry in candidates:
+        too_large = policy.max_bytes is not None and n_bytes > policy.max_bytes
+        too_many = policy.max_runs is not None and n_runs > policy.max_runs
+        if not too_large and not (too_many and policy.artifacts == "all"):
+            break
+        prunable = _prunable(entry["artifacts"], policy.artifacts)
+        if policy.artifacts != "all" and len(prunable) == 0:
+            continue
+        selected.append((identifier(entry), sorted(prunable)))
+        n_bytes -= sum(prunable.values())
+        if policy.artifacts == "all":
+            n_runs -= 1
+    return selected
+
+
+class PeriodicTask(ProcessLocalState):
+    """Calls a function every interval seconds on a daemon thread.
+
+    Exceptions raised by the function are passed to on_error and do not stop
+    the task. Other processes receive the task stopped.
+    """
+
+    _config_attributes = ("function", "interval", "on_error")
+
+    def __init__(
+        self,
+        function: Callable[[], Any],
+        interval: float,
+        on_error: Optional[Callable[[BaseException], None]] = None,
+    ):
+        self.function = function
+        self.interval = interval
+        self.on_error = on_error
+        self._reset()
+
+    def _reset(self) -> None:
+        self._stop = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="PeriodicTask", daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.function()
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+
+    def stop(self) -> None:
+        """Stops the task, waiting for a running call to finish."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
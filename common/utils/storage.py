@@ -0,0 +1,307 @@
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+from abc import ABCMeta, abstractmethod
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+
+__all__ = [
+    "DirectoryObjectClient",
+    "InMemoryStorage",
+    "LocalStorage",
+    "ObjectStoreStorage",
+    "Storage",
+    "StorageStat",
+    "fsync_directory",
+    "fsync_file",
+    "matches_prefix",
+]
+
+
+# Temporary files of LocalStorage and DirectoryObjectClient start with this
+# prefix and are never listed
+TMP_PREFIX = ".tmp_"
+
+
+def fsync_file(path: str) -> None:
+    """Flushes the content of a file to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path: str) -> None:
+    """
+    Flushes a directory to disk, which makes renames into and out of the
+    directory durable.
+    """
+    fsync_file(path)
+
+
+def matches_prefix(key: str, prefix: str) -> bool:
+    """
+    Whether list_prefix(prefix) returns key, i.e. whether key starts with
+    prefix and has no "/" after it.
+    """
+    start = len(prefix)
+    return key.startswith(prefix) and "/" not in key[start:]
+
+
+class StorageStat(NamedTuple):
+    size: int
+    mtime: float
+
+
+class Storage(object, metaclass=ABCMeta):
+    """Key-value interface underneath the Backend.
+
+    Keys are "/"-separated relative paths like "ensembles/1.0000000003.ensemble".
+    Values are bytes which are always replaced as a whole, so readers see
+    either the old or the new value of a key, never a partial one.
+
+    Missing keys raise FileNotFoundError, like the file based code using
+    the storage did before.
+
+    Storages are shared by default, i.e. a pickled copy reads and writes the
+    same values as the original, also in another process.
+    """
+
+    shared = True
+
+    @abstractmethod
+    def put_atomic(self, key: str, data: bytes) -> None:
+        """Stores data under key, replacing the previous value atomically."""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """Returns the value of key."""
+
+    @abstractmethod
+    def list_prefix(self, prefix: str) -> List[str]:
+        """
+        Returns the keys starting with prefix, sorted. Like a listing of an
+        object store with the delimiter "/", keys with a "/" after the prefix
+        are not included, so only the keys of one directory are listed.
+        """
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Deletes key, if it exists."""
+
+    @abstractmethod
+    def stat(self, key: str) -> StorageStat:
+        """Returns the size and modification time of the value of key."""
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.stat(key)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def local_path(self, key: str) -> Optional[str]:
+        """
+        Returns the path of the file holding the value of key, None if values
+        are not stored in files. Callers can use it to memory-map values.
+        """
+        return None
+
+
+class LocalStorage(Storage):
+    """Stores every key as a file below a root directory.
+
+    Values are written to a temporary file in the target directory and
+    renamed into place, which is atomic on POSIX filesystems. If fsync is
+    True, the file and the directory are also flushed to disk, so that a
+    value survives a crash of the node once put_atomic returned.
+    """
+
+    def __init__(self, root: str, fsync: bool = False):
+        self.root = root
+        self.fsync = fsync
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put_atomic(self, key: str, data: bytes) -> None:
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=os.path.dirname(path), prefix=TMP_PREFIX, delete=False
+        ) as fh:
+            fh.write(data)
+            if self.fsync:
+                fh.flush()
+                os.fsync(fh.fileno())
+            tempname = fh.name
+        os.rename(tempname, path)
+        if self.fsync:
+            fsync_directory(os.path.dirname(path))
+
+    def get(self, key: str) -> bytes:
+        with open(self.local_path(key), "rb") as fh:
+            return fh.read()
+
+    def list_prefix(self, prefix: str) -> List[str]:
+        directory, name_prefix = prefix.rsplit("/", 1) if "/" in prefix else ("", prefix)
+        try:
+            entries = list(os.scandir(self.local_path(directory)))
+        except FileNotFoundError:
+            return []
+        return sorted(
+            entry.name if directory == "" else directory + "/" + entry.name
+            for entry in entries
+            if entry.name.startswith(name_prefix)
+            and not entry.name.startswith(TMP_PREFIX)
+            and entry.is_file()
+        )
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def stat(self, key: str) -> StorageStat:
+        st = os.stat(self.local_path(key))
+        return StorageStat(st.st_size, st.st_mtime)
+
+
+class InMemoryStorage(Storage):
+    """Keeps all values in a dictionary of the current process.
+
+    Meant for tests and for single-process runs, where small files do not
+    need to hit a filesystem. A pickled copy holds a snapshot of the values
+    and is independent of the original, so the storage is not shared.
+    """
+
+    shared = False
+
+    def __init__(self) -> None:
+        self._values = {}  # type: Dict[str, Tuple[bytes, float]]
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"values": dict(self._values)}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self._values = state["values"]
+        self._lock = threading.Lock()
+
+    def put_atomic(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._values[key] = (bytes(data), time.time())
+
+    def get(self, key: str) -> bytes:
+        with self._lock:
+            try:
+                return self._values[key][0]
+            except KeyError:
+                raise FileNotFoundError(key)
+
+    def list_prefix(self, prefix: str) -> List[str]:
+        with self._lock:
+            return sorted(key for key in self._values if matches_prefix(key, prefix))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def stat(self, key: str) -> StorageStat:
+        with self._lock:
+            try:
+                data, mtime = self._values[key]
+            except KeyError:
+                raise FileNotFoundError(key)
+        return StorageStat(len(data), mtime)
+
+
+class DirectoryObjectClient(object):
+    """Local stand-in for an object store client.
+
+    Implements the small client interface used by ObjectStoreStorage, with
+    each object stored as one file named after its quoted key in a flat
+    directory. Like objects in an object store, files are never renamed,
+    appended to or listed by directory, only put, fetched, listed by key
+    prefix and deleted as a whole.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, urllib.parse.quote(key, safe=""))
+
+    def put_object(self, key: str, data: bytes) -> None:
+        # An object store replaces an object atomically on PUT
+        with tempfile.NamedTemporaryFile(
+            "wb", dir=self.directory, prefix=TMP_PREFIX, delete=False
+        ) as fh:
+            fh.write(data)
+            tempname = fh.name
+        os.rename(tempname, self._path(key))
+
+    def get_object(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as fh:
+            return fh.read()
+
+    def head_object(self, key: str) -> Tuple[int, float]:
+        st = os.stat(self._path(key))
+        return st.st_size, st.st_mtime
+
+    def list_objects(self, prefix: str) -> Iterator[str]:
+        for name in os.listdir(self.directory):
+            if name.startswith(TMP_PREFIX):
+                continue
+            key = urllib.parse.unquote(name)
+            if key.startswith(prefix):
+                yield key
+
+    def delete_object(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class ObjectStoreStorage(Storage):
+    """Stores values as objects through an object store client.
+
+    The client needs put_object(key, data), get_object(key), head_object(key)
+    returning (size, mtime), list_objects(prefix) and delete_object(key), with
+    get_object and head_object raising FileNotFoundError for missing keys.
+    A thin adapter maps these onto the client of an actual object store, and
+    DirectoryObjectClient is a local stand-in. All keys are stored below the
+    given prefix, so that several backends can share a bucket.
+    """
+
+    def __init__(self, client: Any, prefix: str = ""):
+        self.client = client
+        self.prefix = prefix
+
+    def put_atomic(self, key: str, data: bytes) -> None:
+        self.client.put_object(self.prefix + key, data)
+
+    def get(self, key: str) -> bytes:
+        return bytes(self.client.get_object(self.prefix + key))
+
+    def list_prefix(self, prefix: str) -> List[str]:
+        start = len(self.prefix)
+        return sorted(
+            key[start:]
+            for key in self.client.list_objects(self.prefix + prefix)
+            if matches_prefix(key[start:], prefix)
+        )
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(self.prefix + key)
+
+    def stat(self, key: str) -> StorageStat:
+        size, mtime = self.client.head_object(self.prefix + key)
+        return StorageStat(int(size), float(mtime))
@@ -0,0 +1,230 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .ensemble_history import EnsembleHistory
+from .run_index import RunIndex
+
+
+__all__ = ["BackendWatcher", "WatchEvent"]
+
+
+WATCH_KINDS = ("runs", "ensembles")
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class WatchEvent(NamedTuple):
+    """A new run or a new ensemble of a Backend.
+
+    For runs, (seed, idx, budget) is the identifier of the run, with idx
+    being its num_run. For ensembles, idx is the ensemble index and budget
+    is None.
+    """
+
+    kind: str
+    seed: int
+    idx: int
+    budget: Optional[float]
+
+
+def _inotify_watch(directory: str, mask: int) -> Optional[int]:
+    """
+    Returns a non-blocking inotify file descriptor watching directory, or None
+    if inotify is not available.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+    return int(fd)
+
+
+def _read_inotify_names(fd: int) -> Optional[Set[str]]:
+    """
+    Returns the file names of all pending inotify events, None if the event
+    queue overflowed and events were lost.
+    """
+    names: Set[str] = set()
+    while True:
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            if mask & IN_Q_OVERFLOW:
+                return None
+            end = offset + length
+            names.add(os.fsdecode(data[offset:end].rstrip(b"\0")))
+            offset = end
+
+
+class BackendWatcher(object):
+    """Reports new runs and ensembles of a Backend.
+
+    Writers publish a run by appending to the run index and an ensemble by
+    appending to the ensemble history, both in the internals directory, also
+    if the ensembles themselves are kept in another Storage. On Linux, the
+    watcher waits for these files to change with inotify. Elsewhere, or if
+    inotify is unavailable, it polls their signature every poll_interval
+    seconds. Only once something changed, the run index or the ensemble
+    history is read to find out what is new.
+
+    Runs and ensembles that exist when the watcher is created are not reported,
+    unless include_existing is True.
+    """
+
+    def __init__(
+        self,
+        internals_directory: str,
+        runs_directory: str,
+        kind: Sequence[str] = WATCH_KINDS,
+        poll_interval: float = 0.5,
+        include_existing: bool = False,
+    ):
+        self._fd: Optional[int] = None
+        if isinstance(kind, str):
+            kind = (kind,)
+        for k in kind:
+            if k not in WATCH_KINDS:
+                raise ValueError("Unknown kind %s, choose from %s" % (k, WATCH_KINDS))
+        self.kind = tuple(kind)
+        self.poll_interval = poll_interval
+        self.internals_directory = internals_directory
+
+        self._run_index = RunIndex(runs_directory, os.path.join(internals_directory, "runs.index"))
+        self._ensemble_history = EnsembleHistory(
+            os.path.join(internals_directory, "ensembles.history")
+        )
+        self._files: Dict[str, str] = {
+            "runs": "runs.index",
+            "ensembles": "ensembles.history",
+        }
+        self._seen: Dict[str, Set[Tuple[int, int, Optional[float]]]] = {
+            "runs": set(),
+            "ensembles": set(),
+        }
+        self._signatures: Dict[str, Optional[Tuple[int, ...]]] = {}
+        self._fd = _inotify_watch(internals_directory, IN_MODIFY | IN_MOVED_TO | IN_CREATE)
+
+        for k in self.kind:
+            self._signatures[k] = self._signature(k)
+        if not include_existing:
+            for k in self.kind:
+                self._collect(k)
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _signature(self, kind: str) -> Optional[Tuple[int, ...]]:
+        path = os.path.join(self.internals_directory, self._files[kind])
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _collect(self, kind: str) -> List[WatchEvent]:
+        if kind == "runs":
+            if not os.path.exists(self._run_index.index_path):
+                # Do not create the index, there are no runs yet
+                return []
+            current: Set[Tuple[int, int, Optional[float]]] = set(
+                (seed, num_run, budget) for seed, num_run, budget in self._run_index.list_runs()
+            )
+        else:
+            current = set(
+                (snapshot.seed, snapshot.idx, None)
+                for snapshot in self._ensemble_history.list_snapshots()
+            )
+        new = sorted(current - self._seen[kind], key=lambda i: (i[0], i[1], i[2] or 0.0))
+        self._seen[kind].update(new)
+        return [WatchEvent(kind, seed, idx, budget) for seed, idx, budget in new]
+
+    def _wait(self, timeout: Optional[float]) -> List[str]:
+        """Blocks until one of the watched kinds might have changed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            if self._fd is not None:
+                readable, _, _ = select.select([self._fd], [], [], remaining)
+                if not readable:
+                    return []
+                names = _read_inotify_names(self._fd)
+                changed = [k for k in self.kind if names is None or self._files[k] in names]
+            else:
+                time.sleep(
+                    self.poll_interval if remaining is None else min(self.poll_interval, remaining)
+                )
+                changed = []
+                for k in self.kind:
+                    signature = self._signature(k)
+                    if signature != self._signatures[k]:
+                        self._signatures[k] = signature
+                        changed.append(k)
+            if len(changed) > 0 or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def poll(self, timeout: Optional[float] = 0.0) -> List[WatchEvent]:
+        """
+        Returns the events that happened since the last call, waiting up to
+        timeout seconds (forever if None) for at least one of them.
+        """
+        events: List[WatchEvent] = []
+        for k in self.kind:
+            events.extend(self._collect(k))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(events) == 0:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            for k in self._wait(remaining):
+                events.extend(self._collect(k))
+        return events
+
+    def __iter__(self) -> Iterator[WatchEvent]:
+        return self.events()
+
+    def events(self, timeout: Optional[float] = None) -> Iterator[WatchEvent]:
+        """
+        Yields events as they happen. Stops once no event happened for timeout
+        seconds, never if timeout is None.
+        """
+        try:
+            while True:
+                events = self.poll(timeout)
+                if len(events) == 0:
+                    return
+                yield from events
+        finally:
+            self.close()
+
+    def __del__(self) -> None:
+        self.close()
@@ -0,0 +1,84 @@
+import io
+import os
+import pickle
+
+import numpy as np
+
+import pytest
+
+from common.utils.archive import ALIGNMENT, ArchiveReader, ArchiveStorage, ArchiveWriter
+
+
+def test_archive(tmp_path):
+    path = str(tmp_path / "backend.archive")
+    source = tmp_path / "source"
+    source.write_bytes(b"file content")
+    array = np.random.random((7, 3))
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+
+    with ArchiveWriter(path) as writer:
+        writer.add("a", b"1", mtime=10.0)
+        writer.add("b/compressed", b"2" * 1000, codec="zlib")
+        writer.add_file("b/file", str(source))
+        writer.add("arrays/predictions.npy", buffer.getvalue())
+        writer.add("arrays/pickled.npy", pickle.dumps(array))
+        with pytest.raises(ValueError, match="Duplicate"):
+            writer.add("a", b"1")
+    assert sorted(os.listdir(str(tmp_path))) == ["backend.archive", "source"]
+
+    reader = ArchiveReader(path)
+    assert reader.names() == [
+        "a",
+        "arrays/pickled.npy",
+        "arrays/predictions.npy",
+        "b/compressed",
+        "b/file",
+    ]
+    assert reader.names("b/") == ["b/compressed", "b/file"]
+    assert "a" in reader and "c" not in reader
+    assert reader.read("a") == b"1"
+    assert reader.stat("a") == (1, 10.0)
+    assert reader.read("b/compressed") == b"2" * 1000
+    assert reader.is_compressed("b/compressed")
+    assert reader.stat("b/compressed").size < 1000
+    assert reader.read("b/file") == b"file content"
+    assert reader.stat("b/file").mtime == os.stat(str(source)).st_mtime
+    with pytest.raises(FileNotFoundError):
+        reader.read("c")
+
+    # Uncompressed arrays are aligned, read-only views of the archive
+    loaded = reader.load_array("arrays/predictions.npy")
+    np.testing.assert_array_equal(loaded, array)
+    assert not loaded.flags.writeable and not loaded.flags.owndata
+    assert loaded.ctypes.data % ALIGNMENT == 0
+    np.testing.assert_array_equal(reader.load_array("arrays/pickled.npy"), array)
+
+    copy = pickle.loads(pickle.dumps(reader))
+    assert copy.read("b/file") == b"file content"
+
+    storage = ArchiveStorage(reader)
+    assert storage.list_prefix("arrays/") == ["arrays/pickled.npy", "arrays/predictions.npy"]
+    assert storage.get("a") == b"1"
+    assert storage.exists("b/file") and not storage.exists("c")
+    with pytest.raises(ValueError, match="read-only"):
+        storage.put_atomic("a", b"2")
+    with pytest.raises(ValueError, match="read-only"):
+        storage.delete("a")
+
+
+def test_archive_writer_failure(tmp_path):
+    path = str(tmp_path / "backend.archive")
+    with pytest.raises(RuntimeError):
+        with ArchiveWriter(path) as writer:
+            writer.add("a", b"1")
+            raise RuntimeError()
+    # Incomplete archives never appear
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_archive_reader_rejects_other_files(tmp_path):
+    path = tmp_path / "other"
+    path.write_bytes(b"not an archive" * 10)
+    with pytest.raises(ValueError, match="not an archive"):
+        ArchiveReader(str(path))
@@ -0,0 +1,51 @@
+import pickle
+import threading
+
+import pytest
+
+from common.utils.async_writer import AsyncWriter
+
+
+def test_async_writer_bounds_pending_writes():
+    writer = AsyncWriter(max_pending=2)
+    release = threading.Event()
+    futures = [writer.submit(release.wait) for _ in range(2)]
+    assert writer.n_pending == 2
+
+    # A third submission blocks until one of the writes finished
+    submitted = threading.Event()
+
+    def submit():
+        futures.append(writer.submit(lambda: None))
+        submitted.set()
+
+    thread = threading.Thread(target=submit)
+    thread.start()
+    assert not submitted.wait(0.2)
+    release.set()
+    assert submitted.wait(5)
+    thread.join()
+
+    writer.flush()
+    assert all(future.done() for future in futures)
+    assert writer.n_pending == 0
+    writer.shutdown()
+
+
+def test_async_writer_flush_raises():
+    writer = AsyncWriter()
+
+    def fail():
+        raise OSError("disk full")
+
+    future = writer.submit(fail)
+    with pytest.raises(OSError, match="disk full"):
+        writer.flush()
+    assert isinstance(future.exception(), OSError)
+    # Errors are only reported once
+    writer.flush()
+
+    unpickled = pickle.loads(pickle.dumps(writer))
+    assert unpickled.max_pending == writer.max_pending
+    assert unpickled.n_pending == 0
+    writer.shutdown()
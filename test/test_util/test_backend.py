@@ -1,11 +1,25 @@
 # -*- encoding: utf-8 -*-
 import builtins
+import concurrent.futures
+import hashlib
+import json
+import os
+import pickle
+import time
 import unittest
 import unittest.mock
 
+import numpy as np
+
 import pytest
 
-from common.utils.backend import Backend
+from common.ensemble_building.abstract_ensemble import AbstractEnsemble
+from common.utils.backend import Backend, create
+from common.utils.ensemble_history import EnsembleRetentionPolicy
+from common.utils.out_of_band import supports_out_of_band
+from common.utils.run_metadata import CorruptArtifactError
+from common.utils.run_pruner import PrunePolicy
+from common.utils.storage import DirectoryObjectClient, InMemoryStorage, ObjectStoreStorage
 
 
 class BackendStub(Backend):
@@ -36,6 +50,18 @@ def backend_stub():
     return backend
 
 
+@pytest.fixture
+def skip_codec_detection():
+    # Reading the header of a model to detect its codec needs a real file,
+    # the mocked file handler is passed to pickle.load as it is
+    def load(fh, file_path, side_file=None):
+        return pickle.load(fh), 0
+
+    with unittest.mock.patch("common.utils.backend.load_out_of_band_with_size", load):
+        yield
+
+
+@pytest.mark.usefixtures("skip_codec_detection")
 @unittest.mock.patch("pickle.load")
 @unittest.mock.patch("os.path.exists")
 def test_load_model_by_seed_and_id(exists_mock, pickleLoadMock, backend_stub):
@@ -62,6 +88,7 @@ def test_load_model_by_seed_and_id(exists_mock, pickleLoadMock, backend_stub):
         assert expected_model == actual_model
 
 
+@pytest.mark.usefixtures("skip_codec_detection")
 @unittest.mock.patch("pickle.load")
 @unittest.mock.patch.object(builtins, "open")
 @unittest.mock.patch("os.path.exists")
@@ -77,3 +104,834 @@ def test_loads_models_by_identifiers(exists_mock, openMock, pickleLoadMock, back
 
     assert isinstance(actual_dict, dict)
     assert expected_dict == actual_dict
+
+
+@pytest.fixture
+def make_backend(tmp_path):
+    def _make_backend(output_directory=None, **options):
+        return create(
+            temporary_directory=str(tmp_path / "tmp"),
+            output_directory=output_directory,
+            prefix="auto-sklearn",
+            **options,
+        )
+
+    return _make_backend
+
+
+@pytest.fixture
+def backend(make_backend, tmp_path):
+    return make_backend(output_directory=str(tmp_path / "output"))
+
+
+def test_get_next_num_run_uses_run_index(backend):
+    assert backend.get_next_num_run(peek=True) == 1
+    backend.save_numrun_to_dir(1, 7, 0.0, "model", None, None, None, None)
+    assert backend.get_next_num_run(peek=True) == 7
+    assert backend.get_next_num_run() == 8
+    assert backend.list_runs() == [(1, 7, 0.0)]
+    assert backend.list_all_models(1) == [
+        os.path.join(backend.get_numrun_directory(1, 7, 0.0), "1.7.0.0.model")
+    ]
+    assert backend.list_all_models(2) == []
+
+    # Another backend only sees the runs through the index file
+    with unittest.mock.patch("glob.glob") as glob_mock:
+        other = Backend(backend.context, backend.prefix)
+        other.save_numrun_to_dir(1, 9, 0.0, None, None, None, None, None)
+        assert other.get_next_num_run(peek=True) == 9
+        assert backend.get_next_num_run(peek=True) == 9
+        glob_mock.assert_not_called()
+
+
+def test_run_index_integer_budget(backend):
+    backend.save_numrun_to_dir(1, 2, 0, "model", None, None, None, None)
+    model_file = os.path.join(backend.get_runs_directory(), "1_2_0", "1.2.0.model")
+    assert os.path.exists(model_file)
+    for rebuild in (False, True):
+        if rebuild:
+            os.remove(backend.get_run_index_filename())
+            backend = Backend(backend.context, backend.prefix)
+        # The identifiers lead back to the run directory of the integer budget
+        assert backend.list_runs() == [(1, 2, 0)]
+        assert "%s" % backend.list_runs()[0][2] == "0"
+        assert backend.list_all_models(1) == [model_file]
+        assert backend.load_model_by_seed_and_id_and_budget(*backend.list_runs()[0]) == "model"
+
+
+def test_load_predictions(backend):
+    predictions = np.random.random((20, 3))
+    backend.save_numrun_to_dir(1, 2, 0.0, None, None, predictions, None, predictions)
+
+    for subset in ("ensemble", "test"):
+        loaded = backend.load_predictions(subset, 1, 2, 0.0)
+        assert isinstance(loaded, np.memmap)
+        assert not loaded.flags.writeable
+        assert loaded.dtype == np.float32
+        np.testing.assert_array_almost_equal(loaded, predictions)
+
+        loaded = backend.load_predictions(subset, 1, 2, 0.0, mmap=False)
+        assert not isinstance(loaded, np.memmap)
+        np.testing.assert_array_almost_equal(loaded, predictions)
+
+    with pytest.raises(FileNotFoundError):
+        backend.load_predictions("valid", 1, 2, 0.0)
+
+
+def test_load_predictions_pickled(backend):
+    # Predictions used to be pickled, make sure these can still be read
+    predictions = np.random.random((20, 3)).astype(np.float32)
+    os.makedirs(backend.get_numrun_directory(1, 2, 0.0))
+    file_path = os.path.join(
+        backend.get_numrun_directory(1, 2, 0.0),
+        backend.get_prediction_filename("ensemble", 1, 2, 0.0),
+    )
+    with open(file_path, "wb") as fh:
+        pickle.dump(predictions, fh, -1)
+
+    np.testing.assert_array_equal(backend.load_predictions("ensemble", 1, 2, 0.0), predictions)
+
+
+def test_load_predictions_by_identifiers(make_backend):
+    backend = make_backend(consolidate_predictions=True)
+    assert backend.load_predictions_by_identifiers("ensemble", []).shape == (0,)
+    predictions = {num_run: np.random.random((20, 3)) for num_run in range(2, 5)}
+    for num_run, preds in predictions.items():
+        backend.save_numrun_to_dir(1, num_run, 0.0, None, None, preds, None, None)
+
+    identifiers = [(1, 4, 0.0), (1, 2, 0.0)]
+    expected = np.stack([predictions[4], predictions[2]])
+    with unittest.mock.patch.object(backend, "load_predictions") as load_predictions_mock:
+        np.testing.assert_array_almost_equal(
+            backend.load_predictions_by_identifiers("ensemble", identifiers), expected
+        )
+        load_predictions_mock.assert_not_called()
+
+    # Without a consolidated store, the predictions are read run by run
+    backend.consolidate_predictions = False
+    backend.save_numrun_to_dir(1, 5, 0.0, None, None, predictions[2], None, None)
+    np.testing.assert_array_almost_equal(
+        backend.load_predictions_by_identifiers("ensemble", [(1, 5, 0.0), (1, 2, 0.0)]),
+        np.stack([predictions[2], predictions[2]]),
+    )
+
+    # A run whose predictions do not fit into the store is saved nevertheless
+    backend.consolidate_predictions = True
+    other_shape = np.random.random((20, 4))
+    backend.save_numrun_to_dir(1, 6, 0.0, None, None, other_shape, None, None)
+    assert (1, 6, 0.0) in backend.list_runs()
+    assert (1, 6, 0.0) not in backend.get_prediction_store("ensemble")
+    np.testing.assert_array_almost_equal(
+        backend.load_predictions_by_identifiers("ensemble", [(1, 6, 0.0)])[0], other_shape
+    )
+    assert not any(name.startswith("tmp_run_") for name in os.listdir(backend.internals_directory))
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2, -1, -2, -1000])
+def test_load_models_by_identifiers_in_parallel(backend, n_jobs):
+    identifiers = [(1, num_run, 0.0) for num_run in range(2, 8)]
+    for seed, idx, budget in identifiers:
+        backend.save_numrun_to_dir(
+            seed, idx, budget, {"model": idx}, {"cv_model": idx}, None, None, None
+        )
+
+    models = backend.load_models_by_identifiers(identifiers, n_jobs=n_jobs)
+    assert list(models) == identifiers
+    assert all(models[identifier] == {"model": identifier[1]} for identifier in identifiers)
+
+    cv_models = backend.load_cv_models_by_identifiers(identifiers, n_jobs=n_jobs)
+    assert all(cv_models[identifier] == {"cv_model": identifier[1]} for identifier in identifiers)
+
+
+def test_iter_models_by_identifiers(backend):
+    identifiers = [(1, num_run, 0.0) for num_run in range(2, 5)]
+    for seed, idx, budget in identifiers:
+        backend.save_numrun_to_dir(seed, idx, budget, {"model": idx}, None, None, None, None)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        loaded = backend.iter_models_by_identifiers(identifiers, executor=executor)
+        assert sorted(identifier for identifier, _ in loaded) == identifiers
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        models = backend.load_models_by_identifiers(identifiers, executor=executor)
+        assert models == {identifier: {"model": identifier[1]} for identifier in identifiers}
+
+    with pytest.raises(FileNotFoundError):
+        dict(backend.iter_models_by_identifiers(identifiers, cv=True, n_jobs=2))
+
+    # Raised when called, not only once the models are iterated
+    with pytest.raises(ValueError, match="n_jobs must not be 0"):
+        backend.iter_models_by_identifiers(identifiers, n_jobs=0)
+
+
+def test_model_cache(make_backend):
+    backend = make_backend(model_cache_size=2**20)
+    backend.save_numrun_to_dir(1, 2, 0.0, {"model": 2}, {"cv_model": 2}, None, None, None)
+
+    model = backend.load_model_by_seed_and_id_and_budget(1, 2, 0.0)
+    assert backend.load_models_by_identifiers([(1, 2, 0.0)])[(1, 2, 0.0)] is model
+    assert backend.load_cv_model_by_seed_and_id_and_budget(1, 2, 0.0) == {"cv_model": 2}
+    assert backend.model_cache.stats["hits"] == 1
+    assert backend.model_cache.stats["misses"] == 2
+
+    # Workers start with an empty cache
+    assert len(pickle.loads(pickle.dumps(backend)).model_cache) == 0
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"compression": "zlib"},
+        pytest.param(
+            {"out_of_band_buffers": True},
+            marks=pytest.mark.skipif(
+                not supports_out_of_band(), reason="requires pickle protocol 5"
+            ),
+        ),
+    ],
+)
+def test_model_cache_size_of_small_files(make_backend, options):
+    backend = make_backend(model_cache_size=2**20, **options)
+    # The file of the model is much smaller than the model itself
+    model = {"weights": np.zeros((1000, 1000))}
+    backend.save_numrun_to_dir(1, 2, 0.0, model, None, None, None, None)
+    model_file = os.path.join(
+        backend.get_numrun_directory(1, 2, 0.0), backend.get_model_filename(1, 2, 0.0)
+    )
+    assert os.path.getsize(model_file) < 2**20
+
+    loaded = backend.load_model_by_seed_and_id_and_budget(1, 2, 0.0)
+    np.testing.assert_array_equal(loaded["weights"], model["weights"])
+    assert len(backend.model_cache) == 0
+
+    small_model = {"weights": np.zeros(1000)}
+    backend.save_numrun_to_dir(1, 3, 0.0, small_model, None, None, None, None)
+    backend.load_model_by_seed_and_id_and_budget(1, 3, 0.0)
+    assert len(backend.model_cache) == 1
+    assert backend.model_cache.stats["current_bytes"] >= small_model["weights"].nbytes
+
+
+def test_save_numrun_to_dir_asynchronous(backend):
+    predictions = np.random.random((20, 3))
+    with backend:
+        future = backend.save_numrun_to_dir(
+            1, 2, 0.0, {"model": 2}, None, predictions, None, None, asynchronous=True
+        )
+        # The caller is free to reuse its predictions
+        expected = predictions.copy()
+        predictions[:] = 0
+    assert future.done()
+    assert future.result() is None
+    assert backend.load_model_by_seed_and_id_and_budget(1, 2, 0.0) == {"model": 2}
+    np.testing.assert_array_almost_equal(backend.load_predictions("ensemble", 1, 2, 0.0), expected)
+
+    with unittest.mock.patch("tempfile.mkdtemp", side_effect=OSError("disk full")):
+        backend.save_numrun_to_dir(1, 3, 0.0, None, None, None, None, None, asynchronous=True)
+        with pytest.raises(OSError, match="disk full"):
+            backend.flush()
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib", "lzma"])
+def test_compressed_models(make_backend, compression):
+    backend = make_backend(compression=compression)
+    model = {"weights": np.zeros((1000, 100))}
+    backend.save_numrun_to_dir(1, 2, 0.0, model, model, None, None, None)
+
+    model_path = os.path.join(
+        backend.get_numrun_directory(1, 2, 0.0), backend.get_model_filename(1, 2, 0.0)
+    )
+    with open(model_path, "rb") as fh:
+        if compression == "none":
+            # Uncompressed models are plain pickles, starting with the PROTO opcode
+            assert fh.read(1) == pickle.PROTO
+        else:
+            assert fh.read(4) == b"AMLC"
+
+    # Models are loaded independently of the codec of the loading backend
+    other = Backend(backend.context, backend.prefix)
+    for loaded in (
+        other.load_model_by_seed_and_id_and_budget(1, 2, 0.0),
+        other.load_cv_model_by_seed_and_id_and_budget(1, 2, 0.0),
+    ):
+        np.testing.assert_array_equal(loaded["weights"], model["weights"])
+
+
+@pytest.mark.skipif(not supports_out_of_band(), reason="requires pickle protocol 5")
+def test_out_of_band_models(make_backend):
+    backend = make_backend(out_of_band_buffers=True)
+    model = {"weights": np.random.random((1000, 1000))}
+    backend.save_numrun_to_dir(1, 2, 0.0, model, None, None, None, None)
+    assert backend.get_model_filename(1, 2, 0.0) + ".buffers" in os.listdir(
+        backend.get_numrun_directory(1, 2, 0.0)
+    )
+
+    loaded = backend.load_model_by_seed_and_id_and_budget(1, 2, 0.0)
+    np.testing.assert_array_equal(loaded["weights"], model["weights"])
+    assert not loaded["weights"].flags.owndata
+
+
+def _save_predictions_as_txt_reference(predictions, precision):
+    # The original, value by value, implementation of save_predictions_as_txt
+    format_string = "{:.%dg} " % precision
+    lines = []
+    for row in predictions:
+        if not isinstance(row, np.ndarray) and not isinstance(row, list):
+            row = [row]
+        lines.append("".join(format_string.format(float(val)) for val in row) + "\n")
+    return "".join(lines)
+
+
+@pytest.mark.parametrize("shape", [(0, 3), (57,), (57, 1), (57, 4)])
+@pytest.mark.parametrize("precision", [0, 3, 17])
+def test_save_predictions_as_txt(backend, shape, precision):
+    predictions = np.random.standard_normal(shape) * 10.0 ** np.random.randint(-8, 8, shape)
+    if predictions.size > 4:
+        predictions.flat[:4] = [np.nan, np.inf, -np.inf, -0.0]
+
+    backend.save_predictions_as_txt(
+        predictions, "test", 3, precision, prefix="auto-sklearn", block_size=10
+    )
+    filepath = os.path.join(backend.output_directory, "auto-sklearn_test_3.predict")
+    with open(filepath) as fh:
+        assert fh.read() == _save_predictions_as_txt_reference(predictions, precision)
+    assert not os.path.exists(filepath + ".npy")
+
+    labels = np.random.randint(-1000, 1000, shape)
+    backend.save_predictions_as_txt(labels, "test", 3, precision, binary_sidecar=True)
+    filepath = os.path.join(backend.output_directory, "test_3.predict")
+    with open(filepath) as fh:
+        assert fh.read() == _save_predictions_as_txt_reference(labels, precision)
+    np.testing.assert_array_equal(np.load(filepath + ".npy"), labels)
+
+    # Plain lists are written like arrays
+    backend.save_predictions_as_txt(labels.tolist(), "test", 4, precision)
+    with open(os.path.join(backend.output_directory, "test_4.predict")) as fh:
+        assert fh.read() == _save_predictions_as_txt_reference(labels, precision)
+
+
+class _DummyEnsemble(AbstractEnsemble):
+    def __init__(self, identifiers, performance):
+        self.identifiers = identifiers
+        self.performance = performance
+
+    def fit(self, base_models_predictions, true_targets, model_identifiers):
+        return self
+
+    def predict(self, base_models_predictions):
+        return base_models_predictions
+
+    def get_models_with_weights(self, models):
+        return [(1.0 / len(self.identifiers), models[ident]) for ident in self.identifiers]
+
+    def get_selected_model_identifiers(self):
+        return self.identifiers
+
+    def get_validation_performance(self):
+        return self.performance
+
+
+def test_ensemble_history(make_backend, tmp_path):
+    backend = make_backend(
+        output_directory=str(tmp_path / "output"),
+        ensemble_checkpoint_interval=3,
+        ensemble_retention=EnsembleRetentionPolicy(keep_last=1),
+    )
+    for idx in range(8):
+        backend.save_ensemble(_DummyEnsemble([(1, idx, 10.0)], idx / 10), idx, 1)
+
+    # Only the latest ensemble and the last checkpoint are kept in full
+    assert sorted(os.listdir(backend.get_ensemble_dir())) == [
+        "1.0000000006.ensemble",
+        "1.0000000007.ensemble",
+    ]
+    assert backend.load_ensemble(1).identifiers == [(1, 7, 10.0)]
+    assert backend.load_ensemble(-1).identifiers == [(1, 7, 10.0)]
+    assert backend.load_ensemble_by_idx(1, 6).identifiers == [(1, 6, 10.0)]
+    assert backend.load_ensemble_by_idx(1, 3) is None
+
+    snapshot = backend.load_ensemble_snapshot(1, 3)
+    assert snapshot.identifiers == [(1, 3, 10.0)]
+    assert snapshot.weights == [1.0]
+    assert snapshot.validation_performance == 0.3
+    assert snapshot.checkpoint
+    assert [snapshot.idx for snapshot in backend.get_ensemble_history(1)] == list(range(8))
+
+
+def test_latest_ensemble_pointer(backend):
+    assert backend.get_ensemble_generation() == 0
+    backend.save_ensemble(_DummyEnsemble([(2, 5, 10.0)], 0.5), 5, 2)
+    backend.save_ensemble(_DummyEnsemble([(1, 3, 10.0)], 0.3), 3, 1)
+    assert backend.get_ensemble_generation() == 2
+    assert backend.get_ensemble_generation(2) == 1
+
+    # The latest ensembles are found without listing the ensemble directory
+    with unittest.mock.patch.object(backend.storage, "list_prefix", side_effect=AssertionError):
+        assert backend.load_ensemble(-1).identifiers == [(1, 3, 10.0)]
+        assert backend.load_ensemble(2).identifiers == [(2, 5, 10.0)]
+
+    # Invalid and stale pointers fall back to listing the directory
+    with open(backend.get_latest_ensemble_filename(), "w") as fh:
+        fh.write("{")
+    assert backend.load_ensemble(-1).identifiers == [(1, 3, 10.0)]
+    os.remove(backend.get_ensemble_filename(2, 5))
+    backend.save_ensemble(_DummyEnsemble([(2, 6, 10.0)], 0.6), 6, 2)
+    assert backend.get_ensemble_generation() == 1
+    os.remove(backend.get_ensemble_filename(2, 6))
+    assert backend.load_ensemble(-1).identifiers == [(1, 3, 10.0)]
+
+
+def test_load_ensemble_without_pointer_sorts_by_mtime(backend):
+    # Ensembles saved within the same second are ordered correctly
+    backend.save_ensemble(_DummyEnsemble([(2, 1, 10.0)], 0.1), 1, 2)
+    backend.save_ensemble(_DummyEnsemble([(1, 1, 10.0)], 0.1), 1, 1)
+    os.utime(backend.get_ensemble_filename(2, 1), ns=(10**18, 10**18))
+    os.utime(backend.get_ensemble_filename(1, 1), ns=(10**18 + 1000, 10**18 + 1000))
+    os.remove(backend.get_latest_ensemble_filename())
+    assert backend.load_ensemble(-1).identifiers == [(1, 1, 10.0)]
+
+
+def test_run_metadata(backend):
+    predictions = np.random.random((20, 3))
+    backend.save_numrun_to_dir(1, 2, 10.0, {"a": 1}, None, predictions, None, predictions[:5])
+    backend.save_numrun_to_dir(1, 3, 10.0, None, None, None, None, None)
+
+    metadata = backend.get_run_metadata(1, 2, 10.0)
+    assert metadata["has_model"] and not metadata["has_cv_model"]
+    assert metadata["predictions"] == {
+        "ensemble": {"shape": [20, 3], "dtype": "float32"},
+        "test": {"shape": [5, 3], "dtype": "float32"},
+    }
+    assert metadata["save_duration"] >= 0
+    run_dir = backend.get_numrun_directory(1, 2, 10.0)
+    for name, artifact in metadata["artifacts"].items():
+        assert artifact["size"] == os.path.getsize(os.path.join(run_dir, name))
+        with open(os.path.join(run_dir, name), "rb") as fh:
+            assert artifact["checksum"] == hashlib.blake2b(fh.read()).hexdigest()
+    assert sorted(metadata["artifacts"]) == [
+        "1.2.10.0.model",
+        "predictions_ensemble_1_2_10.0.npy",
+        "predictions_test_1_2_10.0.npy",
+    ]
+
+    # Scanning does not load any artifact
+    with unittest.mock.patch("pickle.load", side_effect=AssertionError), unittest.mock.patch(
+        "numpy.load", side_effect=AssertionError
+    ):
+        scanned = backend.scan_runs()
+    assert sorted(scanned) == [(1, 2, 10.0), (1, 3, 10.0)]
+    assert scanned[(1, 2, 10.0)] == metadata
+    assert scanned[(1, 3, 10.0)]["artifacts"] == {}
+    assert backend.scan_runs(seed=2) == {}
+
+    # Runs saved without metadata
+    os.remove(os.path.join(run_dir, backend.get_run_metadata_filename(1, 2, 10.0)))
+    assert backend.get_run_metadata(1, 2, 10.0) is None
+
+
+def test_prune_runs(backend):
+    backend.consolidate_predictions = True
+    predictions = np.zeros((10, 2))
+    for num_run in range(1, 6):
+        backend.save_numrun_to_dir(1, num_run, 0.0, {"a": 1}, None, predictions, None, None)
+    backend.save_ensemble(_DummyEnsemble([(1, 1, 0.0)], 0.5), 0, 1)
+
+    # Only dropping the models keeps all runs. The metadata stops listing a
+    # model before the model is deleted
+    policy = PrunePolicy(max_runs=3, max_bytes=0, artifacts="models")
+    remove = os.remove
+
+    def remove_listed(path):
+        name = os.path.basename(path)
+        metadata = backend.get_run_metadata(1, int(name.split(".")[1]), 0.0)
+        assert name not in metadata["artifacts"]
+        remove(path)
+
+    with unittest.mock.patch("os.remove", remove_listed):
+        assert backend.prune_runs(policy) == [(1, num_run, 0.0) for num_run in range(2, 6)]
+    assert backend.list_runs() == [(1, num_run, 0.0) for num_run in range(1, 6)]
+    assert backend.list_all_models(1) == [
+        os.path.join(backend.get_numrun_directory(1, 1, 0.0), "1.1.0.0.model")
+    ]
+    metadata = backend.get_run_metadata(1, 2, 0.0)
+    assert not metadata["has_model"]
+    assert metadata["pruned"] == ["1.2.0.0.model"]
+    assert sorted(metadata["artifacts"]) == ["predictions_ensemble_1_2_0.0.npy"]
+    assert backend.load_predictions("ensemble", 1, 2, 0.0).shape == (10, 2)
+    assert (1, 2, 0.0) in backend.get_prediction_store("ensemble")
+
+    # The ensemble member is kept, the oldest other runs are removed
+    assert backend.prune_runs(PrunePolicy(max_runs=3)) == [(1, 2, 0.0), (1, 3, 0.0)]
+    assert backend.list_runs() == [(1, 1, 0.0), (1, 4, 0.0), (1, 5, 0.0)]
+    assert sorted(os.listdir(backend.get_runs_directory())) == ["1_1_0.0", "1_4_0.0", "1_5_0.0"]
+    assert backend.get_prediction_store("ensemble").list_identifiers() == backend.list_runs()
+    internals = os.listdir(backend.internals_directory)
+    assert not any(name.startswith("tmp_prune_") for name in internals)
+    assert backend.get_next_num_run(peek=True) == 5
+
+    # Another backend does not see the removed runs
+    other = Backend(backend.context, backend.prefix)
+    assert other.list_runs() == [(1, 1, 0.0), (1, 4, 0.0), (1, 5, 0.0)]
+
+
+def test_start_pruning(backend):
+    for num_run in range(1, 4):
+        backend.save_numrun_to_dir(1, num_run, 0.0, None, None, None, None, None)
+    with backend:
+        backend.start_pruning(PrunePolicy(max_runs=1), interval=0.01)
+        # The backend can still be sent to other processes
+        assert pickle.loads(pickle.dumps(backend))._pruning_task is not None
+        for _ in range(500):
+            if backend.list_runs() == [(1, 3, 0.0)]:
+                break
+            time.sleep(0.01)
+    assert backend.list_runs() == [(1, 3, 0.0)]
+    assert backend._pruning_task is None
+
+
+def _get_next_num_runs(backend, n):
+    return [backend.get_next_num_run() for _ in range(n)]
+
+
+def test_get_next_num_run_across_processes(backend):
+    backend.save_numrun_to_dir(1, 1, 0.0, None, None, None, None, None)
+    with concurrent.futures.ProcessPoolExecutor(8) as executor:
+        futures = [executor.submit(_get_next_num_runs, backend, 25) for _ in range(8)]
+        num_runs = [num_run for future in futures for num_run in future.result()]
+    assert sorted(num_runs) == list(range(2, 202))
+    assert backend.get_next_num_run(peek=True) == 201
+    assert backend.get_next_num_run() == 202
+
+
+@pytest.mark.parametrize("storage_type", ["memory", "object_store"])
+def test_storage(make_backend, tmp_path, storage_type):
+    if storage_type == "memory":
+        storage = InMemoryStorage()
+    else:
+        storage = ObjectStoreStorage(DirectoryObjectClient(str(tmp_path / "bucket")))
+    backend = make_backend(storage=storage)
+
+    backend.save_start_time("1")
+    assert backend.load_start_time(1) <= time.time()
+    with pytest.raises(ValueError, match="already exist"):
+        backend.save_start_time("1")
+
+    targets = np.arange(10)
+    backend.save_targets_ensemble(targets)
+    np.testing.assert_array_equal(backend.load_targets_ensemble(), targets)
+    backend.save_datamanager({"data": 1})
+    assert backend.load_datamanager() == {"data": 1}
+
+    for idx in range(3):
+        backend.save_ensemble(_DummyEnsemble([(1, idx, 0.0)], 0.1), idx, 1)
+    assert backend.load_ensemble(1).identifiers == [(1, 2, 0.0)]
+    assert backend.load_ensemble_by_idx(1, 0).identifiers == [(1, 0, 0.0)]
+    # The latest pointers are kept in the storage, next to the ensembles
+    assert backend.get_ensemble_generation(1) == 3
+    storage.delete(backend._get_latest_ensemble_key(1))
+    assert backend.load_ensemble(1).identifiers == [(1, 2, 0.0)]
+
+    assert storage.list_prefix("ensembles/") == [
+        "ensembles/1.0000000000.ensemble",
+        "ensembles/1.0000000001.ensemble",
+        "ensembles/1.0000000002.ensemble",
+    ]
+    assert not os.path.exists(backend.get_ensemble_dir())
+    assert not os.path.exists(backend.get_latest_ensemble_filename())
+    assert not os.path.exists(backend._get_datamanager_pickle_filename())
+
+    # Other processes can only use the backend if they share the storage
+    if storage_type == "memory":
+        with pytest.raises(pickle.PicklingError, match="InMemoryStorage"):
+            pickle.dumps(backend)
+    else:
+        copy = pickle.loads(pickle.dumps(backend))
+        assert copy.load_ensemble(-1).identifiers == [(1, 2, 0.0)]
+
+
+def test_node_cache(make_backend, tmp_path):
+    backend = make_backend(cache_directory=str(tmp_path / "local"))
+    cache_directory = backend.context.cache_directory
+    assert cache_directory.startswith(str(tmp_path / "local"))
+
+    predictions = np.random.random((20, 3))
+    # Predictions, run metadata and targets are written through, without
+    # reading the shared copies back
+    with unittest.mock.patch.object(backend.node_cache, "get_path") as get_path:
+        backend.save_numrun_to_dir(1, 2, 0.0, None, None, predictions, None, None)
+        backend.save_targets_ensemble(np.arange(20))
+    assert get_path.call_count == 0
+    assert len(os.listdir(cache_directory)) == 3
+
+    loaded = backend.load_predictions("ensemble", 1, 2, 0.0)
+    assert loaded.filename.startswith(cache_directory)
+    np.testing.assert_array_almost_equal(loaded, predictions)
+    assert backend.get_run_metadata(1, 2, 0.0)["num_run"] == 2
+    np.testing.assert_array_equal(backend.load_targets_ensemble(), np.arange(20))
+    assert backend.node_cache.stats["hits"] == 3
+
+    # Evicted copies are read from the shared directory
+    backend.node_cache.clear()
+    with unittest.mock.patch.object(backend.node_cache, "get_path", return_value="/missing"):
+        np.testing.assert_array_almost_equal(
+            backend.load_predictions("ensemble", 1, 2, 0.0), predictions
+        )
+        assert backend.get_run_metadata(1, 2, 0.0)["num_run"] == 2
+    assert backend.get_run_metadata(1, 3, 0.0) is None
+
+    backend.context.delete_directories()
+    assert not os.path.exists(cache_directory)
+
+
+@pytest.mark.skipif(not supports_out_of_band(), reason="requires pickle protocol 5")
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_export_archive(make_backend, tmp_path, compression):
+    backend = make_backend(out_of_band_buffers=True)
+    predictions = np.random.random((20, 3))
+    model = {"weights": np.random.random((1000, 1000))}
+    backend.save_start_time("1")
+    backend.save_targets_ensemble(np.arange(20))
+    backend.save_numrun_to_dir(1, 2, 10.0, model, None, predictions, None, predictions[:5])
+    backend.save_numrun_to_dir(1, 3, 10.0, {"a": 3}, None, predictions + 1, None, None)
+    backend.save_ensemble(_DummyEnsemble([(1, 2, 10.0)], 0.2), 1, 1)
+    backend.save_ensemble(_DummyEnsemble([(1, 2, 10.0), (1, 3, 10.0)], 0.3), 2, 1)
+
+    path = backend.export_archive(str(tmp_path / "backend.archive"), compression=compression)
+    with Backend.open_archive(path) as archived:
+        assert archived.list_runs() == [(1, 2, 10.0), (1, 3, 10.0)]
+        assert archived.load_start_time(1) == backend.load_start_time(1)
+        np.testing.assert_array_equal(archived.load_targets_ensemble(), np.arange(20))
+
+        ensemble = archived.load_ensemble(1)
+        assert ensemble.identifiers == [(1, 2, 10.0), (1, 3, 10.0)]
+        assert archived.load_ensemble(-1).identifiers == ensemble.identifiers
+        assert archived.get_ensemble_generation() == 2
+        assert archived.load_ensemble_by_idx(1, 1).identifiers == [(1, 2, 10.0)]
+        assert [snapshot.idx for snapshot in archived.get_ensemble_history(1)] == [1, 2]
+
+        models = archived.load_models_by_identifiers(ensemble.identifiers)
+        np.testing.assert_array_equal(models[(1, 2, 10.0)]["weights"], model["weights"])
+        assert not models[(1, 2, 10.0)]["weights"].flags.owndata
+        assert models[(1, 3, 10.0)] == {"a": 3}
+
+        loaded = archived.load_predictions_by_identifiers("ensemble", ensemble.identifiers)
+        np.testing.assert_array_almost_equal(loaded, np.stack([predictions, predictions + 1]))
+        loaded = archived.load_predictions("test", 1, 2, 10.0)
+        np.testing.assert_array_almost_equal(loaded, predictions[:5])
+        assert not loaded.flags.writeable
+        assert archived.get_run_metadata(1, 2, 10.0) == backend.get_run_metadata(1, 2, 10.0)
+        assert archived.load_predictions_by_identifiers("ensemble", []).shape == (0,)
+
+        # The archive does not depend on the backend directory anymore
+        backend.context.delete_directories()
+        assert archived.load_model_by_seed_and_id_and_budget(1, 3, 10.0) == {"a": 3}
+
+        with pytest.raises(ValueError, match="read-only"):
+            archived.save_ensemble(ensemble, 3, 1)
+        with pytest.raises(ValueError, match="read-only"):
+            archived.get_next_num_run()
+        with pytest.raises(ValueError, match="read-only"):
+            archived.write_txt_file(str(tmp_path / "a.txt"), "a", "a")
+        with pytest.raises(ValueError, match="read-only"):
+            archived.run_index.list_entries()
+
+        # Checking never writes, only quarantining does
+        assert archived.fsck(quarantine=False) == {}
+        with pytest.raises(ValueError, match="read-only"):
+            archived.fsck()
+
+
+def test_export_archive_include(backend, tmp_path):
+    predictions = np.random.random((20, 3))
+    backend.save_numrun_to_dir(1, 2, 10.0, {"a": 2}, None, predictions, None, None)
+    backend.save_ensemble(_DummyEnsemble([(1, 2, 10.0)], 0.2), 1, 1)
+    with pytest.raises(ValueError, match="Unknown archive contents"):
+        backend.export_archive(str(tmp_path / "backend.archive"), include=["runs"])
+
+    path = backend.export_archive(str(tmp_path / "backend.archive"), include=["predictions"])
+    archived = Backend.open_archive(path)
+    assert archived.list_runs() == [(1, 2, 10.0)]
+    np.testing.assert_array_almost_equal(
+        archived.load_predictions("ensemble", 1, 2, 10.0), predictions
+    )
+    with pytest.raises(FileNotFoundError):
+        archived.load_model_by_seed_and_id_and_budget(1, 2, 10.0)
+    assert archived.get_run_metadata(1, 2, 10.0) is None
+    with pytest.warns(UserWarning, match="No ensemble found"):
+        assert archived.load_ensemble(1) is None
+    assert archived.fsck(quarantine=False) == {}
+    archived.close()
+
+
+def _corrupt(file_path, truncate=False):
+    with open(file_path, "r+b") as fh:
+        if truncate:
+            fh.truncate(os.path.getsize(file_path) // 2)
+        else:
+            fh.seek(-1, os.SEEK_END)
+            last = fh.read(1)
+            fh.seek(-1, os.SEEK_END)
+            fh.write(bytes([last[0] ^ 1]))
+
+
+@pytest.mark.parametrize("verify_on_load", ["size", "full"])
+def test_verify_on_load(make_backend, verify_on_load):
+    backend = make_backend(verify_on_load=verify_on_load, checksum_algorithm="blake2b")
+    predictions = np.random.random((20, 3))
+    backend.save_numrun_to_dir(1, 2, 10.0, {"a": 2}, None, predictions, None, None)
+    backend.save_ensemble(_DummyEnsemble([(1, 2, 10.0)], 0.2), 1, 1)
+    backend.save_targets_ensemble(np.arange(20))
+    run_directory = backend.get_numrun_directory(1, 2, 10.0)
+    model_path = os.path.join(run_directory, backend.get_model_filename(1, 2, 10.0))
+    predictions_path = os.path.join(
+        run_directory, backend.get_prediction_filename("ensemble", 1, 2, 10.0)
+    )
+    assert backend.get_run_metadata(1, 2, 10.0)["checksum_algorithm"] == "blake2b"
+    assert backend.load_model_by_seed_and_id_and_budget(1, 2, 10.0) == {"a": 2}
+    assert backend.get_ensemble_history(1)[0].size == os.path.getsize(
+        backend.get_ensemble_filename(1, 1)
+    )
+
+    # Flipped bits are only detected by hashing
+    _corrupt(model_path)
+    _corrupt(backend.get_ensemble_filename(1, 1))
+    if verify_on_load == "full":
+        with pytest.raises(CorruptArtifactError, match="checksum"):
+            backend.load_model_by_seed_and_id_and_budget(1, 2, 10.0)
+        with pytest.raises(CorruptArtifactError, match="checksum"):
+            backend.load_ensemble(1)
+
+    # Truncated files are already detected by their size
+    _corrupt(model_path, truncate=True)
+    _corrupt(predictions_path, truncate=True)
+    _corrupt(backend.get_ensemble_filename(1, 1), truncate=True)
+    _corrupt(backend._get_targets_ensemble_filename(), truncate=True)
+    with pytest.raises(CorruptArtifactError, match="partially written"):
+        backend.load_targets_ensemble()
+    with pytest.raises(CorruptArtifactError, match="partially written"):
+        backend.load_model_by_seed_and_id_and_budget(1, 2, 10.0)
+    with pytest.raises(CorruptArtifactError, match="partially written"):
+        backend.load_predictions("ensemble", 1, 2, 10.0)
+    with pytest.raises(CorruptArtifactError, match="partially written"):
+        backend.load_ensemble(1)
+    with pytest.raises(CorruptArtifactError, match="partially written"):
+        backend.load_ensemble_by_idx(1, 1)
+
+
+def test_fsck(backend):
+    predictions = np.random.random((20, 3))
+    for num_run in (2, 3, 4):
+        backend.save_numrun_to_dir(1, num_run, 10.0, {"a": num_run}, None, predictions, None, None)
+    backend.save_ensemble(_DummyEnsemble([(1, 2, 10.0)], 0.2), 1, 1)
+    backend.save_ensemble(_DummyEnsemble([(1, 3, 10.0)], 0.3), 2, 1)
+    assert backend.fsck() == {}
+
+    run_directory = backend.get_numrun_directory(1, 3, 10.0)
+    _corrupt(os.path.join(run_directory, backend.get_model_filename(1, 3, 10.0)))
+    _corrupt(backend.get_ensemble_filename(1, 2))
+    os.rename(
+        os.path.join(
+            backend.get_numrun_directory(1, 4, 10.0),
+            backend.get_prediction_filename("ensemble", 1, 4, 10.0),
+        ),
+        os.path.join(backend.get_numrun_directory(1, 4, 10.0), "moved"),
+    )
+    with pytest.warns(UserWarning, match="fsck found 1 corrupt"):
+        problems = backend.fsck(mode="size", quarantine=False)
+    assert problems == {
+        os.path.join("runs", "1_4_10.0"): [
+            "%s is missing"
+            % os.path.join(
+                backend.get_numrun_directory(1, 4, 10.0),
+                backend.get_prediction_filename("ensemble", 1, 4, 10.0),
+            )
+        ]
+    }
+
+    with pytest.warns(UserWarning, match="fsck found 3 corrupt runs and ensembles"):
+        problems = backend.fsck(n_jobs=2)
+    assert sorted(problems) == [
+        "ensembles/1.0000000002.ensemble",
+        os.path.join("runs", "1_3_10.0"),
+        os.path.join("runs", "1_4_10.0"),
+    ]
+    assert backend.list_runs() == [(1, 2, 10.0)]
+    assert len(os.listdir(backend.get_quarantine_directory())) == 3
+    assert not backend.ensemble_history.is_stored(1, 2)
+    assert backend.storage.exists("quarantine/ensembles/1.0000000002.ensemble")
+    assert backend.fsck() == {}
+    assert backend.fsck(n_jobs=-2) == {}
+    with pytest.raises(ValueError, match="n_jobs must not be 0"):
+        backend.fsck(n_jobs=0)
+
+
+def test_fsync(make_backend):
+    backend = make_backend(fsync=True)
+    with unittest.mock.patch("os.fsync", wraps=os.fsync) as fsync_mock:
+        backend.save_numrun_to_dir(1, 2, 10.0, {"a": 2}, None, np.zeros((3, 2)), None, None)
+        # Model, predictions, metadata, the temporary and the runs directory
+        assert fsync_mock.call_count == 5
+        fsync_mock.reset_mock()
+        backend.save_ensemble(_DummyEnsemble([(1, 2, 10.0)], 0.2), 1, 1)
+        # The ensemble and both latest pointers, each with its directory
+        assert fsync_mock.call_count == 6
+    assert backend.load_model_by_seed_and_id_and_budget(1, 2, 10.0) == {"a": 2}
+
+
+def test_targets_ensemble_digest(backend):
+    targets = np.random.random(100)
+    backend.save_targets_ensemble(targets)
+    digest_key = backend._get_targets_ensemble_digest_key()
+    digest = json.loads(backend.storage.get(digest_key))
+    assert digest["shape"] == [100] and digest["dtype"] == "float32"
+    assert digest["size"] == os.path.getsize(backend._get_targets_ensemble_filename())
+
+    # The same or fewer targets are recognized by the digest alone
+    get = backend.storage.get
+
+    def get_digest_only(key):
+        assert key != backend._get_targets_ensemble_key()
+        return get(key)
+
+    with unittest.mock.patch.object(backend.storage, "get", side_effect=get_digest_only):
+        with unittest.mock.patch.object(backend.storage, "put_atomic", side_effect=AssertionError):
+            backend.save_targets_ensemble(targets)
+            backend.save_targets_ensemble(targets[:50])
+
+    backend.save_targets_ensemble(targets + 1)
+    np.testing.assert_array_equal(backend.load_targets_ensemble(), (targets + 1).astype(np.float32))
+    loaded = backend.load_targets_ensemble(mmap=True)
+    assert isinstance(loaded, np.memmap) and not loaded.flags.writeable
+    np.testing.assert_array_equal(loaded, (targets + 1).astype(np.float32))
+
+    # Targets saved without digest are still compared by loading them
+    backend.storage.delete(digest_key)
+    backend.save_targets_ensemble(targets[:50])
+    assert not backend.storage.exists(digest_key)
+    backend.save_targets_ensemble(targets)
+    assert backend.storage.exists(digest_key)
+    np.testing.assert_array_equal(backend.load_targets_ensemble(), targets.astype(np.float32))
+
+
+def test_targets_ensemble_concurrent_save(make_backend):
+    backend = make_backend(verify_on_load="size")
+    backend.save_targets_ensemble(np.arange(20))
+
+    # A load between the two puts of a save sees the new targets with the
+    # old digest, and verifies them again once the digest was replaced
+    digest_key = backend._get_targets_ensemble_digest_key()
+    put_atomic = backend.storage.put_atomic
+    delayed = {}
+
+    def put_targets_only(key, data):
+        if key == digest_key:
+            delayed[key] = data
+        else:
+            put_atomic(key, data)
+
+    with unittest.mock.patch.object(backend.storage, "put_atomic", side_effect=put_targets_only):
+        backend.save_targets_ensemble(np.arange(40))
+    with unittest.mock.patch(
+        "time.sleep", side_effect=lambda delay: put_atomic(digest_key, delayed[digest_key])
+    ) as sleep_mock:
+        np.testing.assert_array_equal(backend.load_targets_ensemble(), np.arange(40))
+    assert sleep_mock.call_count == 1
@@ -0,0 +1,42 @@
+import io
+import pickle
+
+import numpy as np
+
+import pytest
+
+from common.utils.compression import (
+    available_codecs,
+    compressed_dump,
+    compressed_load,
+    read_codec,
+)
+
+
+@pytest.mark.parametrize("codec", available_codecs())
+def test_compressed_dump_and_load(codec):
+    obj = {"weights": np.zeros((1000, 100)), "name": "pipeline"}
+    fh = io.BytesIO()
+    compressed_dump(obj, fh, codec)
+
+    fh.seek(0)
+    assert read_codec(fh) == codec
+    fh.seek(0)
+    loaded = compressed_load(fh)
+    assert loaded["name"] == "pipeline"
+    np.testing.assert_array_equal(loaded["weights"], obj["weights"])
+
+    if codec != "none":
+        assert len(fh.getvalue()) < len(pickle.dumps(obj, -1)) / 10
+
+
+def test_compressed_load_plain_pickle():
+    fh = io.BytesIO(pickle.dumps([1, 2, 3], -1))
+    assert compressed_load(fh) == [1, 2, 3]
+
+
+def test_unknown_codec():
+    assert "zlib" in available_codecs()
+    assert "lzma" in available_codecs()
+    with pytest.raises(ValueError, match="Unknown or unavailable compression codec"):
+        compressed_dump([], io.BytesIO(), "brotli")
@@ -0,0 +1,57 @@
+from common.utils.ensemble_history import (
+    EnsembleHistory,
+    EnsembleRetentionPolicy,
+    EnsembleSnapshot,
+)
+
+
+def _snapshot(idx, checkpoint=True, performance=None, seed=1):
+    return EnsembleSnapshot(
+        seed=seed,
+        idx=idx,
+        identifiers=[(seed, idx, 10.0)],
+        weights=[1.0],
+        validation_performance=performance,
+        checkpoint=checkpoint,
+        time=float(idx),
+    )
+
+
+def test_ensemble_history_roundtrip(tmp_path):
+    path = str(tmp_path / "ensembles.history")
+    history = EnsembleHistory(path)
+    assert history.latest(1) is None
+    for idx in range(3):
+        history.add_snapshot(_snapshot(idx))
+    history.add_snapshot(_snapshot(0, seed=2))
+    history.mark_removed(1, 1)
+
+    # A second reader sees the same history
+    other = EnsembleHistory(path)
+    assert other.get(1, 1) == _snapshot(1)
+    assert not other.is_stored(1, 1)
+    assert other.is_stored(1, 2)
+    assert other.latest(1) == _snapshot(2)
+    assert [snapshot.idx for snapshot in other.list_snapshots(1)] == [0, 1, 2]
+    assert len(other.list_snapshots()) == 4
+
+    # Half-written lines are not read
+    with open(path, "ab") as fh:
+        fh.write(b'{"type": "snapsh')
+    assert other.latest(1) == _snapshot(2)
+
+
+def test_ensemble_history_select_removable(tmp_path):
+    history = EnsembleHistory(str(tmp_path / "ensembles.history"))
+    performances = [0.5, 0.9, 0.1, 0.7, 0.3, 0.2]
+    for idx, performance in enumerate(performances):
+        history.add_snapshot(_snapshot(idx, checkpoint=idx % 2 == 0, performance=performance))
+
+    # The latest ensemble and all checkpoints are kept by default
+    assert history.select_removable(1, EnsembleRetentionPolicy()) == [1, 3]
+    assert history.select_removable(1, EnsembleRetentionPolicy(keep_last=1)) == [0, 1, 2, 3]
+    assert history.select_removable(1, EnsembleRetentionPolicy(keep_best=1)) == [1, 2, 3, 4]
+    assert history.select_removable(
+        1, EnsembleRetentionPolicy(keep_best=1, greater_is_better=False)
+    ) == [0, 1, 3, 4]
+    assert history.select_removable(2, EnsembleRetentionPolicy()) == []
@@ -0,0 +1,134 @@
+import platform
+
+import pytest
+
+from common.utils.log_ring import HEAD_OFFSET, LogRing, POSITION, supports_log_rings
+
+
+pytestmark = pytest.mark.skipif(
+    not supports_log_rings(), reason="requires multiprocessing.shared_memory on x86"
+)
+
+
+def _read_all(ring):
+    payloads = []
+    n_frames = ring.read(lambda payload: payloads.append(bytes(payload)))
+    assert n_frames == len(payloads)
+    return payloads
+
+
+def test_log_ring():
+    producer = LogRing.create(512)
+    consumer = LogRing.attach(producer.name)
+    try:
+        assert producer.capacity == consumer.capacity == 512 - 192
+        assert producer.is_empty()
+        assert _read_all(consumer) == []
+
+        # The consumer waits after finding the ring empty
+        assert producer.write(b"first") is True
+        assert producer.write(b"second") is False
+        assert not producer.is_empty()
+        assert _read_all(consumer) == [b"first", b"second"]
+        assert producer.is_empty()
+
+        # Frames wrap around the end of the ring, in order
+        written = []
+        read = []
+        for i in range(50):
+            payload = b"%d" % i * (i % 7 + 1)
+            if producer.write(payload) is None:
+                read.extend(_read_all(consumer))
+                assert producer.write(payload) is not None
+            written.append(payload)
+        read.extend(_read_all(consumer))
+        assert read == written
+
+        # A full ring refuses frames until the consumer read it
+        payload = b"x" * 100
+        n_frames = 0
+        while producer.write(payload) is not None:
+            n_frames += 1
+        assert n_frames >= 2
+        assert _read_all(consumer) == [payload] * n_frames
+
+        # Fragments are passed on joined, once the last one was read
+        assert producer.write(b"x" * producer.max_payload_size, more=True) is not None
+        assert _read_all(consumer) == []
+        assert producer.write(b"y" * producer.max_payload_size, more=True) is not None
+        assert producer.write(b"z") is not None
+        assert _read_all(consumer) == [
+            b"x" * producer.max_payload_size + b"y" * producer.max_payload_size + b"z"
+        ]
+        with pytest.raises(ValueError, match="does not fit"):
+            producer.write(b"x" * (producer.max_payload_size + 1))
+    finally:
+        consumer.close()
+        producer.close()
+
+    # The producer removed the ring
+    with pytest.raises(FileNotFoundError):
+        LogRing.attach(producer.name)
+    with pytest.raises(ValueError, match="at least"):
+        LogRing.create(64)
+
+
+def test_log_ring_handle_error():
+    producer = LogRing.create(1024)
+    consumer = LogRing.attach(producer.name)
+    try:
+        producer.write(b"bad")
+        producer.write(b"good")
+
+        def handle(payload):
+            if payload == b"bad":
+                raise ValueError("bad frame")
+
+        # A frame which can not be handled is skipped nevertheless
+        with pytest.raises(ValueError, match="bad frame"):
+            consumer.read(handle)
+        assert _read_all(consumer) == [b"good"]
+    finally:
+        consumer.close()
+        producer.close()
+
+
+def test_log_ring_torn_position(monkeypatch):
+    producer = LogRing.create(1024)
+    consumer = LogRing.attach(producer.name)
+    try:
+        producer.write(b"first")
+        head = producer._head
+        # The producer is in the middle of storing the next head
+        sequence = producer._read(POSITION, HEAD_OFFSET)
+        POSITION.pack_into(producer._buf, HEAD_OFFSET, sequence + 1)
+        POSITION.pack_into(producer._buf, HEAD_OFFSET + POSITION.size, 2**40)
+        read = consumer._read
+        reads = []
+
+        def read_and_finish_store(format, offset):
+            reads.append(offset)
+            if len(reads) == 3:
+                POSITION.pack_into(producer._buf, HEAD_OFFSET + POSITION.size, head)
+                POSITION.pack_into(producer._buf, HEAD_OFFSET, sequence + 2)
+            return read(format, offset)
+
+        monkeypatch.setattr(consumer, "_read", read_and_finish_store)
+        assert _read_all(consumer) == [b"first"]
+    finally:
+        consumer.close()
+        producer.close()
+
+
+def test_log_ring_unordered_stores(monkeypatch):
+    ring = LogRing.create(1024)
+    try:
+        # Machines which may reorder stores do not use rings
+        monkeypatch.setattr(platform, "machine", lambda: "aarch64")
+        assert not supports_log_rings()
+        with pytest.raises(ValueError, match="x86"):
+            LogRing.create(1024)
+        with pytest.raises(ValueError, match="x86"):
+            LogRing.attach(ring.name)
+    finally:
+        ring.close()
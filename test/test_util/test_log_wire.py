@@ -0,0 +1,198 @@
+import logging
+import multiprocessing
+import pickle
+import socket
+import sys
+import threading
+
+import pytest
+
+from common.utils import log_wire
+from common.utils.log_ring import LogRing, supports_log_rings
+from common.utils.logging_ import BatchingSocketHandler
+
+
+def _make_dicts():
+    handler = BatchingSocketHandler("localhost", 0)
+    records = []
+    for i in range(3):
+        records.append(
+            logging.LogRecord("client", logging.INFO, __file__, 10, "message %d", (i,), None)
+        )
+    try:
+        raise ValueError("exception of the client")
+    except ValueError:
+        records.append(
+            logging.LogRecord(
+                "client", logging.ERROR, __file__, 20, "failed ☃ \udce4", None, sys.exc_info()
+            )
+        )
+    record = logging.LogRecord("other", logging.DEBUG, __file__, 30, "extra", None, None)
+    record.stack_info = "Stack (most recent call last)"
+    record.num_run = 7
+    records.append(record)
+    return [handler.make_dict(record) for record in records]
+
+
+def test_compact_encoding():
+    records = _make_dicts()
+    encoder = log_wire.CompactEncoder()
+    decoder = log_wire.CompactDecoder()
+    frame = encoder.encode(records)
+    assert log_wire.frame_kind(frame[4:]) == log_wire.RECORDS
+    assert log_wire.CompactDecoder().decode(memoryview(frame)[4:]) == records
+    assert decoder.decode(frame[4:]) == records
+
+    # The sites are only sent once
+    second = encoder.encode(records)
+    assert len(second) < len(frame)
+    assert decoder.decode(second[4:]) == records
+    assert len(second) < len(pickle.dumps(records, 4)) / 2
+
+    with pytest.raises(ValueError, match="out of order"):
+        decoder.decode(frame[4:])
+    # Records of a new connection cannot refer to sites of the old one
+    with pytest.raises(ValueError, match="unknown site"):
+        log_wire.CompactDecoder().decode(second[4:])
+    with pytest.raises(ValueError, match="Truncated"):
+        log_wire.CompactDecoder().decode(frame[4:-1])
+
+    # Sites beyond max_sites are sent with every record
+    encoder = log_wire.CompactEncoder(max_sites=1)
+    decoder = log_wire.CompactDecoder()
+    for _ in range(2):
+        assert decoder.decode(encoder.encode(records)[4:]) == records
+
+
+def test_log_wire_session():
+    records = _make_dicts()
+    session = log_wire.LogWireSession()
+    assert session.handle_frame(pickle.dumps(records[0], 1)) == ([records[0]], None)
+    assert session.handle_frame(pickle.dumps(records, 4)) == (records, None)
+    frame = log_wire.CompactEncoder().encode(records)
+    with pytest.raises(ValueError, match="did not negotiate"):
+        session.handle_frame(frame[4:])
+
+    hello = log_wire.control_frame(log_wire.HELLO, {"version": 1, "encodings": ["compact"]})
+    assert session.handle_frame(hello[4:]) == (
+        [],
+        log_wire.control_frame(log_wire.WELCOME, {"version": 1, "encoding": "compact"}),
+    )
+    assert session.handle_frame(frame[4:]) == (records, None)
+
+    # A newer version or a server without the compact encoding falls back to pickle
+    hello = log_wire.control_frame(log_wire.HELLO, {"version": 2, "encodings": ["compact"]})
+    assert b'"pickle"' in log_wire.LogWireSession().handle_frame(hello[4:])[1]
+    hello = log_wire.control_frame(log_wire.HELLO, {"version": 1, "encodings": ["compact"]})
+    assert b'"pickle"' in log_wire.LogWireSession(("pickle",)).handle_frame(hello[4:])[1]
+
+    with pytest.raises(ValueError, match="Unknown log frame kind"):
+        session.handle_frame(log_wire.CONTROL_PREFIX + b"?")
+
+
+def test_negotiate():
+    client, server = socket.socketpair()
+
+    def serve():
+        session = log_wire.LogWireSession()
+        _, reply = session.handle_frame(log_wire.recv_frame(server))
+        server.sendall(reply)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    assert log_wire.negotiate(client) == ("compact", {}, False)
+    thread.join(5)
+
+    # A server which does not negotiate closes the connection
+    server.close()
+    with pytest.raises(OSError):
+        log_wire.negotiate(client)
+    client.close()
+
+
+def test_client_levels():
+    logging.getLogger("test_client_levels").setLevel(logging.WARNING)
+    levels = log_wire.ClientLevels("test_client_levels")
+    assert levels.get_level("Client-a") == logging.WARNING
+    assert log_wire.ClientLevels().get_level("test_client_levels") == logging.WARNING
+
+    sent = []
+    session = log_wire.LogWireSession(levels=levels)
+    levels.subscribe(session, sent.append)
+    hello = log_wire.control_frame(
+        log_wire.HELLO, {"version": 1, "encodings": ["pickle"], "loggers": ["Client-a"]}
+    )
+    _, welcome = session.handle_frame(hello[4:])
+    assert log_wire.parse_control(welcome[4:])["levels"] == {"Client-a": logging.WARNING}
+
+    def set_levels(levels, key=bytes(multiprocessing.current_process().authkey)):
+        signature = log_wire.sign_levels(levels, key)
+        frame = log_wire.control_frame(
+            log_wire.SET_LEVELS, {"levels": levels, "signature": signature}
+        )
+        return session.handle_frame(frame[4:])
+
+    # Only the sessions of a changed logger are told
+    assert set_levels({"Client-b": logging.DEBUG}) == ([], None)
+    assert sent == []
+    set_levels({"Client-a": logging.DEBUG})
+    assert log_wire.frame_kind(sent[-1][4:]) == log_wire.LEVELS
+    assert log_wire.parse_control(sent[-1][4:]) == {"levels": {"Client-a": logging.DEBUG}}
+    assert levels.get_level("Client-a") == logging.DEBUG
+
+    # Removing the override restores the configured level
+    levels.set_levels({"Client-a": None})
+    assert log_wire.parse_control(sent[-1][4:]) == {"levels": {"Client-a": logging.WARNING}}
+
+    levels.unsubscribe(session)
+    levels.set_levels({"Client-a": logging.DEBUG})
+    assert len(sent) == 2
+
+    with pytest.raises(ValueError, match="Invalid log levels"):
+        set_levels({"Client-a": "DEBUG"})
+
+    # Only the process which started the log server may change levels
+    with pytest.raises(ValueError, match="started the log server"):
+        set_levels({"Client-a": logging.ERROR}, key=b"another process")
+    unsigned = log_wire.control_frame(log_wire.SET_LEVELS, {"levels": {"Client-a": logging.ERROR}})
+    with pytest.raises(ValueError, match="started the log server"):
+        session.handle_frame(unsigned[4:])
+    assert levels.get_level("Client-a") == logging.DEBUG
+    with pytest.raises(ValueError, match="does not publish levels"):
+        log_wire.LogWireSession().handle_frame(
+            log_wire.control_frame(log_wire.SET_LEVELS, {"levels": {}})[4:]
+        )
+
+
+@pytest.mark.skipif(
+    not supports_log_rings(), reason="requires multiprocessing.shared_memory on x86"
+)
+def test_log_wire_session_ring():
+    ring = LogRing.create(4096)
+    hello = log_wire.control_frame(
+        log_wire.HELLO, {"version": 1, "encodings": ["compact"], "ring": ring.name}
+    )
+    try:
+        # Only sessions accepting rings attach to them
+        _, welcome = log_wire.LogWireSession().handle_frame(hello[4:])
+        assert log_wire.parse_control(welcome[4:])["ring"] is False
+
+        session = log_wire.LogWireSession(accept_rings=True)
+        _, welcome = session.handle_frame(hello[4:])
+        assert log_wire.parse_control(welcome[4:])["ring"] is True
+        assert session.poll() == []
+
+        encoder = log_wire.CompactEncoder()
+        record_dicts = _make_dicts()
+        assert ring.write(memoryview(encoder.encode(record_dicts[:2]))[4:]) is True
+        assert ring.write(memoryview(encoder.encode(record_dicts[2:]))[4:]) is False
+        # The client notifies the session, which reads the ring
+        assert session.handle_frame(log_wire.NOTIFY_FRAME[4:]) == (record_dicts, None)
+
+        ring.write(log_wire.control_frame(log_wire.HELLO, {})[4:])
+        with pytest.raises(ValueError, match="only hold records"):
+            session.poll()
+        session.close()
+        assert session.ring is None
+    finally:
+        ring.close()
@@ -1,12 +1,21 @@
 import logging
 import logging.config
+import logging.handlers
+import multiprocessing
 import os
+import pickle
+import socket
+import sys
 import tempfile
+import threading
+import time
+
+import pytest
 
 import yaml
 
 
-from common.utils import logging_
+from common.utils import log_wire, logging_
 
 
 def test_setup_logger():
@@ -39,3 +48,408 @@ def test_setup_logger():
     with open(os.path.join(os.path.dirname(__file__), "test.log")) as fh:
         assert "test_setup_logger" in "".join(fh.readlines())
     os.remove(os.path.join(os.path.dirname(__file__), "test.log"))
+    # The default config also logs to distributed.log
+    os.remove(os.path.join(os.path.dirname(__file__), "distributed.log"))
+
+
+class _RecordCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.received = threading.Event()
+        self.expected = 0
+
+    def emit(self, record):
+        self.records.append(record)
+        if len(self.records) >= self.expected:
+            self.received.set()
+
+
+@pytest.fixture
+def collector():
+    collector = _RecordCollector()
+    logger = logging.getLogger("test_logging_receiver")
+    logger.addHandler(collector)
+    yield collector
+    logger.removeHandler(collector)
+
+
+def _make_record(message, level=logging.INFO):
+    return logging.LogRecord("client", level, __file__, 1, message, None, None)
+
+
+@pytest.mark.parametrize("buffer_size", [16, 2**16])
+def test_selector_log_record_receiver(collector, buffer_size):
+    event = threading.Event()
+    receiver = logging_.SelectorLogRecordReceiver(
+        port=0, logname="test_logging_receiver", event=event, buffer_size=buffer_size
+    )
+    server = threading.Thread(target=receiver.serve_until_stopped, daemon=True)
+    server.start()
+    try:
+        handlers = [
+            logging.handlers.SocketHandler("localhost", receiver.server_address[1])
+            for _ in range(3)
+        ]
+        collector.expected = 3 * 20
+        for i in range(20):
+            for j, handler in enumerate(handlers):
+                # Messages larger than the buffer need to grow it
+                handler.handle(_make_record("client %d message %d %s" % (j, i, "x" * (i * 100))))
+        assert collector.received.wait(5)
+        messages = [record.getMessage() for record in collector.records]
+        for j in range(3):
+            assert [m for m in messages if m.startswith("client %d " % j)] == [
+                "client %d message %d %s" % (j, i, "x" * (i * 100)) for i in range(20)
+            ]
+        for handler in handlers:
+            handler.close()
+
+        # The receiver stops right away once the event is set
+        start = time.time()
+        event.set()
+        server.join(5)
+        assert not server.is_alive()
+        assert time.time() - start < 0.5
+    finally:
+        event.set()
+
+
+def test_start_log_server_receiver_type():
+    with pytest.raises(ValueError, match="Unknown receiver_type"):
+        logging_.start_log_server(
+            "localhost", "test", threading.Event(), None, "x.log", None, "/tmp", "fork"
+        )
+
+
+def test_start_log_server_selector(tmp_path):
+    event = threading.Event()
+    port = multiprocessing.Value("l", 0)
+    server = threading.Thread(
+        target=logging_.start_log_server,
+        kwargs=dict(
+            host="localhost",
+            logname="test_start_log_server",
+            event=event,
+            port=port,
+            filename="test.log",
+            logging_config=None,
+            output_dir=str(tmp_path),
+            receiver_type="selector",
+        ),
+        daemon=True,
+    )
+    server.start()
+    try:
+        while port.value == 0:
+            time.sleep(0.01)
+        logger = logging_.get_named_client_logger("client", port=port.value)
+        logger.info("message from the client")
+        for handler in logger.logger.handlers:
+            handler.close()
+        deadline = time.time() + 5
+        while "message from the client" not in (tmp_path / "test.log").read_text():
+            assert time.time() < deadline
+            time.sleep(0.01)
+    finally:
+        event.set()
+        server.join(5)
+    assert not server.is_alive()
+
+
+def _start_receiver(receiver_type, event, host="localhost", port=0):
+    if receiver_type == "selector":
+        receiver = logging_.SelectorLogRecordReceiver(
+            host=host, port=port, logname="test_logging_receiver", event=event
+        )
+    else:
+        receiver = logging_.LogRecordSocketReceiver(
+            host=host, port=port, logname="test_logging_receiver", event=event
+        )
+        receiver.timeout = 0.1
+    server = threading.Thread(target=receiver.serve_until_stopped, daemon=True)
+    server.start()
+    return receiver
+
+
+@pytest.mark.parametrize("encoding", ["pickle", "compact"])
+@pytest.mark.parametrize("receiver_type", ["threading", "selector"])
+def test_batching_socket_handler(collector, receiver_type, encoding):
+    event = threading.Event()
+    try:
+        receiver = _start_receiver(receiver_type, event)
+        handler = logging_.BatchingSocketHandler(
+            "localhost",
+            receiver.server_address[1],
+            logging_.BatchingOptions(batch_size=32, flush_interval=0.01, encoding=encoding),
+        )
+        collector.expected = 100
+        for i in range(100):
+            handler.handle(_make_record("message %d" % i))
+        try:
+            raise ValueError("exception of the client")
+        except ValueError:
+            record = _make_record("message with exception", logging.ERROR)
+            record.exc_info = sys.exc_info()
+            handler.handle(record)
+        handler.flush()
+        assert handler.stats == {"sent": 101, "dropped": 0, "lost": 0}
+        assert (handler._encoder is not None) == (encoding == "compact")
+        assert collector.received.wait(5)
+        handler.close()
+
+        deadline = time.time() + 5
+        while len(collector.records) < 101:
+            assert time.time() < deadline
+            time.sleep(0.01)
+        assert [record.getMessage() for record in collector.records[:100]] == [
+            "message %d" % i for i in range(100)
+        ]
+        assert "exception of the client" in collector.records[100].exc_text
+    finally:
+        event.set()
+
+
+def test_batching_socket_handler_overflow(monkeypatch):
+    release = threading.Event()
+    sent = []
+
+    def _send(self, batch):
+        release.wait(5)
+        sent.extend(batch)
+
+    monkeypatch.setattr(logging_.BatchingSocketHandler, "_send", _send)
+    with pytest.raises(ValueError, match="Unknown overflow policy"):
+        logging_.BatchingSocketHandler("localhost", 0, logging_.BatchingOptions(overflow="x"))
+
+    handler = logging_.BatchingSocketHandler(
+        "localhost", 0, logging_.BatchingOptions(batch_size=1, max_queued=5)
+    )
+    for i in range(20):
+        handler.handle(_make_record("message %d" % i))
+    # One record is held by the sender thread, five are queued
+    assert handler.stats["dropped"] >= 14
+    release.set()
+    handler.close()
+    assert len(sent) + handler.stats["dropped"] == 20
+
+    release.clear()
+    handler = logging_.BatchingSocketHandler(
+        "localhost", 0, logging_.BatchingOptions(batch_size=1, max_queued=5, overflow="block")
+    )
+    threading.Timer(0.2, release.set).start()
+    start = time.time()
+    for i in range(20):
+        handler.handle(_make_record("message %d" % i))
+    assert time.time() - start > 0.1
+    handler.close()
+    assert handler.stats["dropped"] == 0
+
+
+def test_batching_socket_handler_pickle_fallback():
+    # A log server which only understands pickle frames closes the connection
+    # on the HELLO frame of the client
+    server = socket.socket()
+    server.bind(("localhost", 0))
+    server.listen()
+    received = []
+
+    def serve():
+        for _ in range(2):
+            connection, _ = server.accept()
+            with connection:
+                while True:
+                    try:
+                        payload = log_wire.recv_frame(connection)
+                        received.extend(pickle.loads(payload))
+                    except (ConnectionError, pickle.UnpicklingError):
+                        break
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    handler = logging_.BatchingSocketHandler("localhost", server.getsockname()[1])
+    handler.handle(_make_record("message"))
+    handler.close()
+    thread.join(5)
+    server.close()
+    assert handler.stats == {"sent": 1, "dropped": 0, "lost": 0}
+    assert [record["msg"] for record in received] == ["message"]
+
+
+def test_batching_socket_handler_unreachable():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+    handler = logging_.BatchingSocketHandler("localhost", port)
+    handler.handle(_make_record("message"))
+    handler.flush()
+    assert handler.stats == {"sent": 0, "dropped": 0, "lost": 1}
+    handler.close()
+
+
+def test_picklable_client_logger_batching():
+    options = logging_.BatchingOptions(batch_size=10)
+    logger = logging_.get_named_client_logger(
+        "test_picklable_client_logger_batching", port=12345, batching=options
+    )
+    logger = pickle.loads(pickle.dumps(logger))
+    assert logger.batching == options
+    handlers = [
+        handler for handler in logger.logger.handlers if getattr(handler, "port", None) == 12345
+    ]
+    assert len(handlers) == 1
+    assert isinstance(handlers[0], logging_.BatchingSocketHandler)
+    assert handlers[0].options == options
+    logger.logger.removeHandler(handlers[0])
+    handlers[0].close()
+
+
+def _wait_for(condition):
+    deadline = time.time() + 5
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("batching", [None, logging_.BatchingOptions(flush_interval=0.01)])
+@pytest.mark.parametrize("receiver_type", ["threading", "selector"])
+def test_client_log_levels(collector, receiver_type, batching):
+    server_logger = logging.getLogger("test_logging_receiver")
+    server_logger.setLevel(logging.WARNING)
+    name = "test_client_log_levels_%s_%s" % (receiver_type, batching is not None)
+    event = threading.Event()
+    try:
+        receiver = _start_receiver(receiver_type, event)
+        port = receiver.server_address[1]
+        logger = logging_.get_named_client_logger(name, port=port, batching=batching)
+        collector.expected = 2
+
+        # Until the server published the level, all records are sent
+        logger.debug("debug before connecting")
+        _wait_for(lambda: logger.logger.level == logging.WARNING)
+        logger.debug("debug dropped by the client")
+
+        logging_.set_client_log_level(name, "debug", port=port)
+        _wait_for(lambda: logger.logger.level == logging.DEBUG)
+        logger.debug("debug after changing the level")
+        # Unpickling the logger keeps the published level
+        logger = pickle.loads(pickle.dumps(logger))
+        assert logger.logger.level == logging.DEBUG
+
+        assert collector.received.wait(5)
+        assert [record.getMessage() for record in collector.records] == [
+            "debug before connecting",
+            "debug after changing the level",
+        ]
+        with pytest.raises(ValueError, match="Unknown level"):
+            logging_.set_client_log_level(name, "verbose", port=port)
+    finally:
+        event.set()
+        server_logger.setLevel(logging.NOTSET)
+        for handler in list(logger.logger.handlers):
+            logger.logger.removeHandler(handler)
+            handler.close()
+
+
+@pytest.mark.parametrize("batching", [None, logging_.BatchingOptions(flush_interval=0.01)])
+@pytest.mark.parametrize("receiver_type", ["threading", "selector"])
+def test_unix_socket(collector, tmp_path, receiver_type, batching):
+    path = str(tmp_path / "log.sock")
+    # A socket left behind by a log server which crashed is replaced
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.bind(path)
+    event = threading.Event()
+    name = "test_unix_socket_%s_%s" % (receiver_type, batching is not None)
+    logger = None
+    try:
+        _start_receiver(receiver_type, event, host=path, port=None)
+        logger = logging_.get_named_client_logger(name, host=path, port=None, batching=batching)
+        # The same server is not added twice
+        logger = logging_.get_named_client_logger(name, host=path, port=None, batching=batching)
+        assert len(logger.logger.handlers) == 1
+        assert logger.logger.handlers[0].address == path
+
+        collector.expected = 10
+        for i in range(10):
+            logger.info("message %d", i)
+        assert collector.received.wait(5)
+        assert [record.getMessage() for record in collector.records] == [
+            "message %d" % i for i in range(10)
+        ]
+        logging_.set_client_log_level(name, "error", host=path, port=None)
+        _wait_for(lambda: logger.logger.level == logging.ERROR)
+    finally:
+        event.set()
+        if logger is not None:
+            for handler in list(logger.logger.handlers):
+                logger.logger.removeHandler(handler)
+                handler.close()
+    _wait_for(lambda: not os.path.exists(path))
+
+
+@pytest.mark.skipif(not logging_.supports_log_rings(), reason="requires shared memory")
+@pytest.mark.parametrize("receiver_type", ["threading", "selector"])
+def test_batching_socket_handler_ring(collector, receiver_type):
+    event = threading.Event()
+    try:
+        receiver = _start_receiver(receiver_type, event)
+        options = logging_.BatchingOptions(batch_size=8, flush_interval=0.01, ring_size=4096)
+        handler = logging_.BatchingSocketHandler("localhost", receiver.server_address[1], options)
+        messages = ["message %d %s" % (i, "x" * (i % 10)) for i in range(200)]
+        # Batches too large for the ring are split into fragments
+        messages.insert(100, "large message " + "x" * 10000)
+        collector.expected = len(messages)
+        for message in messages:
+            handler.handle(_make_record(message))
+        handler.flush()
+        assert handler.stats == {"sent": len(messages), "dropped": 0, "lost": 0}
+        # Only the selector receiver reads rings
+        assert (handler._ring is not None) == (receiver_type == "selector")
+        assert collector.received.wait(5)
+        assert [record.getMessage() for record in collector.records] == messages
+
+        # The receiver reads the ring a last time when the connection is closed
+        collector.received.clear()
+        collector.expected += 1
+        handler.handle(_make_record("last message"))
+        handler.close()
+        assert collector.received.wait(5)
+        assert collector.records[-1].getMessage() == "last message"
+    finally:
+        event.set()
+
+
+def test_start_log_server_unix_socket(tmp_path):
+    event = threading.Event()
+    port = multiprocessing.Value("l", 0)
+    path = str(tmp_path / "log.sock")
+    server = threading.Thread(
+        target=logging_.start_log_server,
+        kwargs=dict(
+            host="localhost",
+            logname="test_start_log_server",
+            event=event,
+            port=port,
+            filename="test.log",
+            logging_config=None,
+            output_dir=str(tmp_path),
+            receiver_type="selector",
+            unix_socket=path,
+        ),
+        daemon=True,
+    )
+    server.start()
+    try:
+        while port.value == 0:
+            time.sleep(0.01)
+        assert port.value == -1
+        logger = logging_.get_named_client_logger("client", host=path, port=None)
+        logger.info("message over the unix socket")
+        for handler in logger.logger.handlers:
+            handler.close()
+        _wait_for(lambda: "message over the unix socket" in (tmp_path / "test.log").read_text())
+    finally:
+        event.set()
+        server.join(5)
+    assert not server.is_alive()
+    assert not os.path.exists(path)
@@ -0,0 +1,106 @@
+import os
+import pickle
+
+from common.utils.model_cache import LoadedModel, ModelCache
+
+
+def _dump(path, obj):
+    with open(path, "wb") as fh:
+        pickle.dump(obj, fh)
+    return os.path.getsize(path)
+
+
+def test_model_cache_hits_and_invalidation(tmp_path):
+    path = str(tmp_path / "model")
+    _dump(path, {"a": 1})
+    cache = ModelCache(max_bytes=10000)
+
+    first = cache.get("a", path)
+    assert first == {"a": 1}
+    assert cache.get("a", path) is first
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+    # Saving the model again invalidates the entry
+    _dump(path + ".new", {"a": 2})
+    os.rename(path + ".new", path)
+    assert cache.get("a", path) == {"a": 2}
+    assert cache.stats["invalidations"] == 1
+    assert cache.stats["misses"] == 2
+    assert len(cache) == 1
+
+
+def test_model_cache_side_files(tmp_path):
+    path = str(tmp_path / "model")
+    _dump(path, "model")
+    cache = ModelCache(max_bytes=10000)
+    side_file = path + ".buffers"
+
+    def load(file_path):
+        with open(side_file, "rb") as fh:
+            return fh.read()
+
+    with open(side_file, "wb") as fh:
+        fh.write(b"first")
+    assert cache.get("a", path, load, side_files=[side_file]) == b"first"
+    assert cache.get("a", path, load, side_files=[side_file]) == b"first"
+
+    # Only the side file changed
+    with open(side_file + ".new", "wb") as fh:
+        fh.write(b"second!")
+    os.rename(side_file + ".new", side_file)
+    assert cache.get("a", path, load, side_files=[side_file]) == b"second!"
+    assert cache.stats["invalidations"] == 1
+
+    os.remove(side_file)
+    assert cache.get("b", path, side_files=[side_file]) == "model"
+    assert cache.get("b", path, side_files=[side_file]) == "model"
+    assert cache.stats["hits"] == 2
+
+
+def test_model_cache_lru_eviction(tmp_path):
+    sizes = {}
+    for name in ("a", "b", "c"):
+        sizes[name] = _dump(str(tmp_path / name), name * 100)
+    cache = ModelCache(max_bytes=sizes["a"] + sizes["b"])
+
+    cache.get("a", str(tmp_path / "a"))
+    cache.get("b", str(tmp_path / "b"))
+    # Accessing a makes b the least recently used entry
+    cache.get("a", str(tmp_path / "a"))
+    cache.get("c", str(tmp_path / "c"))
+    assert cache.stats["evictions"] == 1
+    assert cache.stats["current_bytes"] == sizes["a"] + sizes["c"]
+
+    cache.get("a", str(tmp_path / "a"))
+    assert cache.stats["hits"] == 2
+    cache.get("b", str(tmp_path / "b"))
+    assert cache.stats["misses"] == 4
+
+    # Too large objects are not cached
+    small_cache = ModelCache(max_bytes=1)
+    small_cache.get("a", str(tmp_path / "a"))
+    assert len(small_cache) == 0
+
+
+def test_model_cache_is_empty_after_pickling(tmp_path):
+    path = str(tmp_path / "model")
+    _dump(path, "model")
+    cache = ModelCache(max_bytes=10000)
+    cache.get("a", path)
+
+    unpickled = pickle.loads(pickle.dumps(cache))
+    assert unpickled.max_bytes == 10000
+    assert len(unpickled) == 0
+    assert unpickled.stats["misses"] == 0
+
+
+def test_model_cache_loaded_size(tmp_path):
+    path = str(tmp_path / "model")
+    _dump(path, "model")
+    cache = ModelCache(max_bytes=10000)
+    # Load functions can report a size other than the one of the file
+    cache.get("a", path, lambda file_path: LoadedModel("model", 6000))
+    assert cache.stats["current_bytes"] == 6000
+    assert cache.get("b", path, lambda file_path: LoadedModel("model", 20000)) == "model"
+    assert len(cache) == 1
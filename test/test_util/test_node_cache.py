@@ -0,0 +1,88 @@
+import os
+import pickle
+import shutil
+
+import pytest
+
+from common.utils.node_cache import NodeLocalCache
+
+
+def _write(path, data):
+    with open(path, "wb") as fh:
+        fh.write(data)
+
+
+def test_node_cache_read_through(tmp_path):
+    shared = str(tmp_path / "shared")
+    _write(shared, b"a" * 10)
+    cache = NodeLocalCache(str(tmp_path / "cache"), max_bytes=100)
+
+    local = cache.get_path(shared)
+    assert local != shared
+    with open(local, "rb") as fh:
+        assert fh.read() == b"a" * 10
+    assert cache.get_path(shared) == local
+    assert cache.stats == {"hits": 1, "misses": 1, "evictions": 0}
+
+    # Changing the shared file invalidates the copy
+    _write(shared + ".new", b"b" * 20)
+    os.rename(shared + ".new", shared)
+    new_local = cache.get_path(shared)
+    with open(new_local, "rb") as fh:
+        assert fh.read() == b"b" * 20
+    assert os.listdir(str(tmp_path / "cache")) == [os.path.basename(new_local)]
+
+    with pytest.raises(FileNotFoundError):
+        cache.get_path(str(tmp_path / "missing"))
+
+
+def test_node_cache_write_through(tmp_path, monkeypatch):
+    shared = str(tmp_path / "shared")
+    _write(shared, b"a" * 10)
+    cache = NodeLocalCache(str(tmp_path / "cache"), max_bytes=100)
+
+    # The copy is stored from the data, the shared file is only stat'ed
+    with monkeypatch.context() as m:
+        m.setattr(shutil, "copyfileobj", None)
+        cache.put(shared, b"a" * 10)
+    local = cache.get_path(shared)
+    with open(local, "rb") as fh:
+        assert fh.read() == b"a" * 10
+    assert cache.stats == {"hits": 1, "misses": 0, "evictions": 0}
+
+    # Data which does not match the shared file, or is too large, is not stored
+    cache.clear()
+    cache.put(shared, b"b" * 20)
+    _write(shared, b"c" * 200)
+    cache.put(shared, b"c" * 200)
+    assert not os.path.exists(str(tmp_path / "cache"))
+
+    with pytest.raises(FileNotFoundError):
+        cache.put(str(tmp_path / "missing"), b"")
+
+
+def test_node_cache_eviction(tmp_path):
+    cache = NodeLocalCache(str(tmp_path / "cache"), max_bytes=25)
+    paths = {}
+    for name in ("a", "b", "c"):
+        paths[name] = str(tmp_path / name)
+        _write(paths[name], name.encode() * 10)
+    local_a = cache.get_path(paths["a"])
+    os.utime(local_a, ns=(0, 0))
+    local_b = cache.get_path(paths["b"])
+    os.utime(local_b, ns=(1, 1))
+    # a was used more recently than b
+    assert cache.get_path(paths["a"]) == local_a
+    local_c = cache.get_path(paths["c"])
+    assert sorted(os.listdir(str(tmp_path / "cache"))) == sorted(
+        [os.path.basename(local_a), os.path.basename(local_c)]
+    )
+    assert cache.stats["evictions"] == 1
+
+    # Files larger than the cache are read from the shared filesystem
+    _write(paths["a"], b"a" * 30)
+    assert cache.get_path(paths["a"]) == paths["a"]
+
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.directory == cache.directory
+    assert copy.stats["misses"] == 0
@@ -0,0 +1,56 @@
+import multiprocessing
+import pickle
+
+import pytest
+
+from common.utils.num_run_allocator import NumRunAllocator
+
+
+def _allocate(allocator, n):
+    return [allocator.allocate() for _ in range(n)]
+
+
+def test_num_run_allocator(tmp_path):
+    path = str(tmp_path / "num_run.counter")
+    allocator = NumRunAllocator(path)
+    other = NumRunAllocator(path)
+    assert allocator.peek() == 0
+    assert allocator.allocate() == 1
+    assert other.allocate() == 2
+    # Runs saved without allocation are skipped
+    assert allocator.allocate(floor=10) == 11
+    assert other.peek() == 11
+
+    # A corrupted counter falls back to the floor
+    with open(path, "w") as fh:
+        fh.write("garbage")
+    assert allocator.allocate(floor=11) == 12
+
+    with pytest.raises(ValueError, match="block_size"):
+        NumRunAllocator(path, block_size=0)
+
+
+def test_num_run_allocator_blocks(tmp_path):
+    path = str(tmp_path / "num_run.counter")
+    allocator = NumRunAllocator(path, block_size=10)
+    assert allocator.allocate() == 1
+    assert allocator.peek() == 10
+    # A copy does not hand out num_runs of the same block
+    copy = pickle.loads(pickle.dumps(allocator))
+    assert copy.allocate() == 11
+    assert allocator.allocate() == 2
+
+
+@pytest.mark.parametrize("block_size", [1, 7])
+def test_num_run_allocator_many_processes(tmp_path, block_size):
+    allocator = NumRunAllocator(str(tmp_path / "num_run.counter"), block_size=block_size)
+    n_processes, n_allocations = 16, 50
+    with multiprocessing.Pool(n_processes) as pool:
+        results = pool.starmap(_allocate, [(allocator, n_allocations)] * n_processes)
+
+    num_runs = [num_run for result in results for num_run in result]
+    assert len(set(num_runs)) == n_processes * n_allocations
+    for result in results:
+        assert result == sorted(result)
+    if block_size == 1:
+        assert sorted(num_runs) == list(range(1, n_processes * n_allocations + 1))
@@ -0,0 +1,57 @@
+import io
+import os
+
+import numpy as np
+
+import pytest
+
+from common.utils.compression import compressed_dump
+from common.utils.out_of_band import (
+    dump_out_of_band,
+    get_buffers_filename,
+    load_out_of_band,
+    supports_out_of_band,
+)
+
+
+pytestmark = pytest.mark.skipif(
+    not supports_out_of_band(), reason="requires pickle protocol 5 (Python >= 3.8)"
+)
+
+
+@pytest.mark.parametrize("codec", ["none", "zlib"])
+def test_out_of_band_roundtrip(tmp_path, codec):
+    large = np.random.random((500, 300))
+    small = np.arange(10)
+    path = str(tmp_path / "model")
+    dump_out_of_band({"large": large, "small": small}, path, codec=codec, min_buffer_size=1000)
+
+    # Only the large array lives in the side file
+    assert os.path.getsize(get_buffers_filename(path)) == large.nbytes
+    assert os.path.getsize(path) < large.nbytes / 10
+
+    with open(path, "rb") as fh:
+        loaded = load_out_of_band(fh, path)
+    np.testing.assert_array_equal(loaded["large"], large)
+    np.testing.assert_array_equal(loaded["small"], small)
+
+    # The large array is backed by the memory mapping, which is private
+    assert not loaded["large"].flags.owndata
+    assert loaded["large"].flags.writeable
+    loaded["large"][:] = 0
+    with open(path, "rb") as fh:
+        np.testing.assert_array_equal(load_out_of_band(fh, path)["large"], large)
+
+
+def test_out_of_band_without_large_buffers(tmp_path):
+    path = str(tmp_path / "model")
+    dump_out_of_band([1, 2, np.arange(3)], path)
+    assert not os.path.exists(get_buffers_filename(path))
+    with open(path, "rb") as fh:
+        assert load_out_of_band(fh, path)[:2] == [1, 2]
+
+    # Files written without out-of-band buffers are read as well
+    fh = io.BytesIO()
+    compressed_dump("model", fh, "lzma")
+    fh.seek(0)
+    assert load_out_of_band(fh, path) == "model"
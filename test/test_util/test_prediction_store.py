@@ -0,0 +1,52 @@
+import pickle
+
+import numpy as np
+
+import pytest
+
+from common.utils.prediction_store import PredictionStore
+
+
+def test_prediction_store_append_and_get(tmp_path):
+    store = PredictionStore(str(tmp_path / "ensemble"), initial_capacity=2)
+    predictions = [np.random.random((10, 3)).astype(np.float32) for _ in range(5)]
+    for num_run, preds in enumerate(predictions, start=1):
+        assert store.append((1, num_run, 0.0), preds) == num_run - 1
+
+    # Other processes see the rows through the row index
+    reader = PredictionStore(str(tmp_path / "ensemble"))
+    assert reader.list_identifiers() == [(1, num_run, 0.0) for num_run in range(1, 6)]
+    assert (1, 3, 0.0) in reader
+    assert (1, 6, 0.0) not in reader
+
+    # Consecutive rows are served as a view of the memory mapping
+    consecutive = reader.get([(1, 2, 0.0), (1, 3, 0.0), (1, 4, 0.0)])
+    assert consecutive.shape == (3, 10, 3)
+    assert not consecutive.flags.owndata
+    np.testing.assert_array_equal(consecutive, np.stack(predictions[1:4]))
+
+    gathered = reader.get([(1, 5, 0.0), (1, 1, 0.0)])
+    np.testing.assert_array_equal(gathered, np.stack([predictions[4], predictions[0]]))
+    assert reader.get([]).shape == (0, 10, 3)
+
+    # Rows appended after the first read are picked up
+    store.append((1, 6, 0.0), predictions[0])
+    np.testing.assert_array_equal(reader.get([(1, 6, 0.0)])[0], predictions[0])
+
+    with pytest.raises(KeyError):
+        reader.get([(1, 7, 0.0)])
+
+    # Removed runs are no longer served, their rows are not reused
+    store.remove((1, 2, 0.0))
+    store.remove((1, 7, 0.0))
+    assert (1, 2, 0.0) not in reader
+    with pytest.raises(KeyError):
+        reader.get([(1, 2, 0.0)])
+    assert store.append((1, 7, 0.0), predictions[1]) == 6
+    np.testing.assert_array_equal(reader.get([(1, 7, 0.0)])[0], predictions[1])
+    with pytest.raises(ValueError, match="can not be stored together"):
+        store.append((1, 7, 0.0), np.zeros((11, 3), dtype=np.float32))
+
+    # The memory mapping is not part of the pickled state
+    unpickled = pickle.loads(pickle.dumps(reader))
+    np.testing.assert_array_equal(unpickled.get([(1, 1, 0.0)])[0], predictions[0])
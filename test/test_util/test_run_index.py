@@ -0,0 +1,105 @@
+import os
+import threading
+
+from common.utils.run_index import RunIndex, parse_run_dir
+
+
+def test_parse_run_dir():
+    assert parse_run_dir("1_2_0.0") == (1, 2, 0.0)
+    assert parse_run_dir("1_20_33.33333") == (1, 20, 33.33333)
+    # Integer budgets stay integers, so that the directory name can be rebuilt
+    assert parse_run_dir("1_2_0") == (1, 2, 0)
+    assert isinstance(parse_run_dir("1_2_0")[2], int)
+    assert isinstance(parse_run_dir("1_2_0.0")[2], float)
+    assert parse_run_dir("tmpabc") is None
+    assert parse_run_dir("1_2") is None
+
+
+def test_run_index_append_and_refresh(tmp_path):
+    runs = tmp_path / "runs"
+    runs.mkdir()
+    index_path = str(tmp_path / "runs.index")
+    writer = RunIndex(str(runs), index_path)
+    reader = RunIndex(str(runs), index_path)
+
+    # A missing index is rebuilt from the runs directory
+    assert reader.list_runs() == []
+    assert os.path.exists(index_path)
+
+    writer.append(RunIndex.make_entry(1, 2, 0.0, {"1.2.0.0.model": 10}, mtime=0.0))
+    writer.append(RunIndex.make_entry(1, 3, 0.0, {}, mtime=0.0))
+    assert reader.list_runs() == [(1, 2, 0.0), (1, 3, 0.0)]
+    assert reader.get_max_num_run() == 3
+    assert reader.get(1, 2, 0.0)["artifacts"] == {"1.2.0.0.model": 10}
+
+    # Later entries supersede earlier ones
+    writer.append(RunIndex.make_entry(1, 2, 0.0, {}, mtime=1.0))
+    assert reader.get(1, 2, 0.0)["artifacts"] == {}
+
+    # Tombstones remove runs, but their num_run stays taken
+    writer.append(RunIndex.make_tombstone(1, 3, 0.0))
+    assert reader.list_runs() == [(1, 2, 0.0)]
+    assert reader.get(1, 3, 0.0) is None
+    assert reader.get_max_num_run() == 3
+
+    # Runs appended out of order are listed in order, also per seed
+    writer.append(RunIndex.make_entry(2, 5, 0.0, {}, mtime=0.0))
+    writer.append(RunIndex.make_entry(1, 4, 0.0, {}, mtime=0.0))
+    writer.append(RunIndex.make_entry(0, 6, 0.0, {}, mtime=0.0))
+    assert reader.list_runs() == [(0, 6, 0.0), (1, 2, 0.0), (1, 4, 0.0), (2, 5, 0.0)]
+    assert reader.list_runs(1) == [(1, 2, 0.0), (1, 4, 0.0)]
+    assert reader.list_runs(3) == []
+    writer.append(RunIndex.make_tombstone(1, 4, 0.0))
+    writer.append(RunIndex.make_tombstone(2, 5, 0.0))
+    writer.append(RunIndex.make_tombstone(0, 6, 0.0))
+    assert reader.list_runs() == [(1, 2, 0.0)]
+
+    # A partially written line is not consumed
+    with open(index_path, "a") as fh:
+        fh.write('{"seed": 1')
+    assert reader.list_runs() == [(1, 2, 0.0)]
+
+
+def test_run_index_rebuild_when_stale(tmp_path):
+    runs = tmp_path / "runs"
+    (runs / "1_5_0.0").mkdir(parents=True)
+    (runs / "1_5_0.0" / "1.5.0.0.model").write_bytes(b"abc")
+    index_path = str(tmp_path / "runs.index")
+    index = RunIndex(str(runs), index_path)
+    assert index.list_runs() == [(1, 5, 0.0)]
+    assert index.get(1, 5, 0.0)["artifacts"] == {"1.5.0.0.model": 3}
+
+    # The runs directory changed after the index was last written
+    (runs / "1_6_0.0").mkdir()
+    os.utime(index_path, (0, 0))
+    assert index.list_runs() == [(1, 5, 0.0), (1, 6, 0.0)]
+
+
+def test_run_index_append_during_rebuild(tmp_path, monkeypatch):
+    runs = tmp_path / "runs"
+    runs.mkdir()
+    index_path = str(tmp_path / "runs.index")
+    index = RunIndex(str(runs), index_path)
+    scandir = os.scandir
+    writers = []
+
+    def publish():
+        (runs / "1_2_0.0").mkdir()
+        RunIndex(str(runs), index_path).append(RunIndex.make_entry(1, 2, 0.0, {}, mtime=0.0))
+
+    def scandir_and_publish(path):
+        # A run is published after the rebuild listed the runs directory
+        entries = scandir(path)
+        if len(writers) == 0:
+            writers.append(threading.Thread(target=publish))
+            writers[0].start()
+            writers[0].join(0.2)
+            # The writer waits until the new index is in place
+            assert writers[0].is_alive()
+        return entries
+
+    monkeypatch.setattr(os, "scandir", scandir_and_publish)
+    index.rebuild()
+    monkeypatch.undo()
+    writers[0].join()
+    assert RunIndex(str(runs), index_path).list_runs() == [(1, 2, 0.0)]
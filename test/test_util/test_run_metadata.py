@@ -0,0 +1,83 @@
+import hashlib
+
+import numpy as np
+
+import pytest
+
+from common.utils.run_metadata import (
+    CorruptArtifactError,
+    HashingWriter,
+    array_metadata,
+    available_checksum_algorithms,
+    check_checksum_algorithm,
+    checksum,
+    file_checksum,
+    read_run_metadata,
+    verify_artifact,
+    verify_data,
+    write_run_metadata,
+)
+
+
+def test_hashing_writer(tmp_path):
+    path = str(tmp_path / "artifact")
+    with open(path, "wb") as fh:
+        writer = HashingWriter(fh, "blake2b")
+        np.save(writer, np.arange(100000), allow_pickle=False)
+    with open(path, "rb") as fh:
+        expected = hashlib.blake2b(fh.read()).hexdigest()
+    assert writer.hexdigest() == expected
+    assert file_checksum(path, "blake2b", chunk_size=1000) == expected
+
+
+@pytest.mark.parametrize("algorithm", available_checksum_algorithms())
+def test_checksum_algorithms(tmp_path, algorithm):
+    path = str(tmp_path / "artifact")
+    with open(path, "wb") as fh:
+        writer = HashingWriter(fh, algorithm)
+        writer.write(b"abc" * 1000)
+    assert writer.hexdigest() == file_checksum(path, algorithm)
+    assert writer.hexdigest() == checksum(b"abc" * 1000, algorithm)
+    assert (writer.hexdigest() is None) == (algorithm == "none")
+    with pytest.raises(ValueError, match="Unknown or unavailable checksum algorithm"):
+        check_checksum_algorithm("crc0")
+
+
+def test_verify_artifact(tmp_path):
+    path = str(tmp_path / "artifact")
+    with open(path, "wb") as fh:
+        fh.write(b"abc" * 1000)
+    expected = {"size": 3000, "checksum": file_checksum(path, "blake2b")}
+    verify_artifact(path, expected, "blake2b", "full")
+    verify_data(b"abc" * 1000, expected, "blake2b", "full")
+
+    # Same size, different content is only detected by the full mode
+    with open(path, "r+b") as fh:
+        fh.write(b"x")
+    verify_artifact(path, expected, "blake2b", "size")
+    with pytest.raises(CorruptArtifactError, match="checksum"):
+        verify_artifact(path, expected, "blake2b", "full")
+    with pytest.raises(CorruptArtifactError, match="checksum of ensemble"):
+        verify_data(b"x" + b"abc" * 1000, dict(expected, size=3001), "blake2b", name="ensemble")
+    # Checksums of unavailable algorithms can not be compared
+    verify_artifact(path, expected, "unknown", "full")
+
+    with open(path, "r+b") as fh:
+        fh.truncate(100)
+    with pytest.raises(CorruptArtifactError, match="partially written"):
+        verify_artifact(path, expected, "blake2b", "size")
+    with pytest.raises(CorruptArtifactError, match="missing"):
+        verify_artifact(str(tmp_path / "missing"), expected, "blake2b", "size")
+    with pytest.raises(ValueError, match="Unknown verify mode"):
+        verify_artifact(path, expected, "blake2b", "fast")
+
+
+def test_run_metadata_roundtrip(tmp_path):
+    path = str(tmp_path / "metadata.json")
+    assert read_run_metadata(path) is None
+    metadata = {"predictions": {"test": array_metadata(np.zeros((3, 2), dtype=np.float32))}}
+    write_run_metadata(path, metadata)
+    assert read_run_metadata(path) == {
+        "predictions": {"test": {"shape": [3, 2], "dtype": "float32"}}
+    }
+    assert [p.name for p in tmp_path.iterdir()] == ["metadata.json"]
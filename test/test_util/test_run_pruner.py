@@ -0,0 +1,80 @@
+import pickle
+import threading
+
+import pytest
+
+from common.utils.run_pruner import PeriodicTask, PrunePolicy, select_runs_to_prune
+
+
+def _entry(num_run, mtime, model_size=100, prediction_size=10):
+    return {
+        "seed": 1,
+        "num_run": num_run,
+        "budget": 0.0,
+        "artifacts": {
+            "1.%d.0.0.model" % num_run: model_size,
+            "predictions_ensemble_1_%d_0.0.npy" % num_run: prediction_size,
+        },
+        "mtime": mtime,
+    }
+
+
+ENTRIES = [_entry(num_run, mtime=float(num_run)) for num_run in range(1, 6)]
+
+
+def test_select_runs_to_prune_order():
+    # Never used runs go first, then the ones used the longest time ago
+    last_used = {(1, 1, 0.0): 10.0, (1, 2, 0.0): 5.0}
+    selected = select_runs_to_prune(
+        ENTRIES, PrunePolicy(max_runs=2), protected={(1, 3, 0.0)}, last_used=last_used, now=10
+    )
+    assert [identifier for identifier, _ in selected] == [(1, 4, 0.0), (1, 5, 0.0), (1, 2, 0.0)]
+    assert selected[0][1] == ["1.4.0.0.model", "predictions_ensemble_1_4_0.0.npy"]
+
+
+def test_select_runs_to_prune_limits():
+    # 5 runs of 110 bytes
+    assert select_runs_to_prune(ENTRIES, PrunePolicy(max_bytes=550), set(), {}, now=10) == []
+    selected = select_runs_to_prune(ENTRIES, PrunePolicy(max_bytes=400), set(), {}, now=10)
+    assert [identifier[1] for identifier, _ in selected] == [1, 2]
+
+    # Deleting only models frees 100 bytes per run, but never reduces the number of runs
+    policy = PrunePolicy(max_bytes=300, max_runs=1, artifacts="models")
+    selected = select_runs_to_prune(ENTRIES, policy, set(), {}, now=10)
+    assert selected == [
+        ((1, 1, 0.0), ["1.1.0.0.model"]),
+        ((1, 2, 0.0), ["1.2.0.0.model"]),
+        ((1, 3, 0.0), ["1.3.0.0.model"]),
+    ]
+
+    # Recently published runs are kept
+    selected = select_runs_to_prune(ENTRIES, PrunePolicy(max_runs=0, min_age=7), set(), {}, now=10)
+    assert [identifier[1] for identifier, _ in selected] == [1, 2, 3]
+
+    with pytest.raises(ValueError, match="Unknown artifacts"):
+        select_runs_to_prune(ENTRIES, PrunePolicy(artifacts="cv_models"), set(), {})
+
+
+def test_periodic_task():
+    called = threading.Event()
+    errors = []
+
+    def function():
+        called.set()
+        raise ValueError("failed")
+
+    task = PeriodicTask(function, interval=0.01, on_error=errors.append)
+    task.start()
+    assert task.running
+    assert called.wait(5)
+    task.stop()
+    assert not task.running
+    assert isinstance(errors[0], ValueError)
+
+    # A copy is transferred stopped
+    task = PeriodicTask(print, interval=1)
+    task.start()
+    copy = pickle.loads(pickle.dumps(task))
+    assert not copy.running
+    assert copy.interval == 1
+    task.stop()
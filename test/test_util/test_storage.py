@@ -0,0 +1,84 @@
+import os
+import pickle
+
+import pytest
+
+from common.utils.storage import (
+    DirectoryObjectClient,
+    InMemoryStorage,
+    LocalStorage,
+    ObjectStoreStorage,
+)
+
+
+@pytest.fixture(params=["local", "memory", "object_store"])
+def storage(request, tmp_path):
+    if request.param == "local":
+        return LocalStorage(str(tmp_path / "root"))
+    if request.param == "memory":
+        return InMemoryStorage()
+    return ObjectStoreStorage(DirectoryObjectClient(str(tmp_path / "bucket")), prefix="backend/")
+
+
+def test_storage(storage):
+    assert storage.list_prefix("") == []
+    assert not storage.exists("a")
+    with pytest.raises(FileNotFoundError):
+        storage.get("a")
+    with pytest.raises(FileNotFoundError):
+        storage.stat("a")
+
+    storage.put_atomic("a", b"1")
+    storage.put_atomic("ensembles/1.1.ensemble", b"22")
+    storage.put_atomic("ensembles/10.1.ensemble", b"333")
+    storage.put_atomic("a", b"4444")
+
+    assert storage.get("a") == b"4444"
+    assert storage.stat("a").size == 4
+    assert storage.exists("ensembles/1.1.ensemble")
+    # Keys below another "/" are not listed
+    assert storage.list_prefix("") == ["a"]
+    assert storage.list_prefix("ensembles/") == [
+        "ensembles/1.1.ensemble",
+        "ensembles/10.1.ensemble",
+    ]
+    assert storage.list_prefix("ensembles/1.") == ["ensembles/1.1.ensemble"]
+    assert storage.list_prefix("missing/") == []
+
+    storage.delete("a")
+    storage.delete("a")
+    assert not storage.exists("a")
+
+
+def test_local_storage_lists_one_directory(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path))
+    storage.put_atomic("start_time_1", b"1")
+    storage.put_atomic("runs/1_2_0.0/start_time_2", b"2")
+    scandir = os.scandir
+    listed = []
+
+    def record_scandir(path):
+        listed.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", record_scandir)
+    assert storage.list_prefix("start_time_") == ["start_time_1"]
+    assert len(listed) == 1
+
+
+def test_local_storage_paths(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.put_atomic("ensembles/1.1.ensemble", b"data")
+    path = storage.local_path("ensembles/1.1.ensemble")
+    assert path == str(tmp_path / "ensembles" / "1.1.ensemble")
+    assert (tmp_path / "ensembles" / "1.1.ensemble").read_bytes() == b"data"
+    assert InMemoryStorage().local_path("a") is None
+
+
+def test_in_memory_storage_pickle():
+    storage = InMemoryStorage()
+    storage.put_atomic("a", b"1")
+    copy = pickle.loads(pickle.dumps(storage))
+    copy.put_atomic("b", b"2")
+    assert copy.get("a") == b"1"
+    assert storage.list_prefix("") == ["a"]
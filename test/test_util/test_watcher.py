@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+from common.ensemble_building.abstract_ensemble import AbstractEnsemble
+from common.utils import watcher
+from common.utils.backend import create
+from common.utils.storage import InMemoryStorage
+from common.utils.watcher import WatchEvent
+
+
+class _Ensemble(AbstractEnsemble):
+    def fit(self, base_models_predictions, true_targets, model_identifiers):
+        return self
+
+    def predict(self, base_models_predictions):
+        return base_models_predictions
+
+    def get_models_with_weights(self, models):
+        return []
+
+    def get_selected_model_identifiers(self):
+        return []
+
+    def get_validation_performance(self):
+        return 0.0
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def watch_mode(request, monkeypatch):
+    if request.param == "polling":
+        monkeypatch.setattr(watcher, "_inotify_watch", lambda directory, mask: None)
+    return request.param
+
+
+@pytest.fixture
+def backend(watch_mode, tmp_path):
+    return create(
+        temporary_directory=str(tmp_path / "tmp"),
+        output_directory=None,
+        prefix="auto-sklearn",
+    )
+
+
+def test_watch_ensembles_in_storage(watch_mode, tmp_path):
+    # The ensembles and their pointers are not written to the internals directory
+    backend = create(
+        temporary_directory=str(tmp_path / "tmp"),
+        output_directory=None,
+        prefix="auto-sklearn",
+        storage=InMemoryStorage(),
+    )
+    watch = backend.watch(kind="ensembles", poll_interval=0.01)
+    # Saved while the watcher waits for a change
+    timer = threading.Timer(0.1, backend.save_ensemble, (_Ensemble(), 0, 1))
+    timer.start()
+    assert watch.poll(timeout=5) == [WatchEvent("ensembles", 1, 0, None)]
+    timer.join()
+    watch.close()
+
+
+def test_watch_runs_and_ensembles(backend, watch_mode):
+    backend.save_numrun_to_dir(1, 1, 0.0, None, None, None, None, None)
+    backend.save_ensemble(_Ensemble(), 0, 1)
+    watch = backend.watch(poll_interval=0.01)
+    assert watch.uses_inotify == (watch_mode == "inotify")
+    assert watch.poll() == []
+
+    backend.save_numrun_to_dir(1, 2, 10.0, None, None, None, None, None)
+    assert watch.poll(timeout=5) == [WatchEvent("runs", 1, 2, 10.0)]
+    backend.save_ensemble(_Ensemble(), 1, 1)
+    assert watch.poll(timeout=5) == [WatchEvent("ensembles", 1, 1, None)]
+    assert watch.poll(timeout=0.05) == []
+
+    existing = backend.watch(kind="runs", include_existing=True)
+    assert existing.poll() == [WatchEvent("runs", 1, 1, 0.0), WatchEvent("runs", 1, 2, 10.0)]
+    existing.close()
+    watch.close()
+
+    with pytest.raises(ValueError, match="Unknown kind"):
+        backend.watch(kind="models")
+
+
+def test_watch_iterates_over_concurrent_saves(backend):
+    watch = backend.watch(kind="runs", poll_interval=0.01)
+
+    def save():
+        for num_run in range(2, 7):
+            backend.save_numrun_to_dir(1, num_run, 0.0, None, None, None, None, None)
+
+    thread = threading.Thread(target=save)
+    thread.start()
+    events = list(watch.events(timeout=1))
+    thread.join()
+    assert events == [WatchEvent("runs", 1, num_run, 0.0) for num_run in range(2, 7)]